@@ -0,0 +1,194 @@
+"""
+接口准入控制
+
+限制某个接口同时处理的请求数，超出的请求进入有界等待队列；
+队列已满或等待超时的请求立即以 503 + Retry-After 拒绝，
+避免请求在 worker 中无限堆积直至全部超时。
+
+AdmissionLimiter 供同步 worker 线程使用；AsyncAdmissionLimiter 供 ASGI 入口使用，
+排队的请求以 Future 在事件循环中等待，不占用任何线程。
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class Overloaded(Exception):
+    """准入被拒绝，retry_after 为建议的重试间隔（秒）"""
+
+    def __init__(self, retry_after):
+        super().__init__('server overloaded')
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout=1.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._completed = 0
+        self._rejected_full = 0
+        self._rejected_timeout = 0
+        self._waiting_peak = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._service_time_total = 0.0
+
+    def _retry_after(self):
+        """按平均处理时间估算排在队尾的请求需要等待多久"""
+        avg_service = self._service_time_total / self._completed if self._completed else 1.0
+        backlog = (self._active + self._waiting) / max(1, self.max_concurrent)
+        return max(1, math.ceil(avg_service * backlog))
+
+    def acquire(self):
+        with self._cond:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                self._admitted += 1
+                return
+            if self._waiting >= self.max_queue:
+                self._rejected_full += 1
+                raise Overloaded(self._retry_after())
+
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            self._waiting += 1
+            self._waiting_peak = max(self._waiting_peak, self._waiting)
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected_timeout += 1
+                        raise Overloaded(self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - started
+            self._active += 1
+            self._admitted += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+    def release(self, service_time=0.0):
+        with self._cond:
+            self._active -= 1
+            self._completed += 1
+            self._service_time_total += service_time
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        """with limiter.slot(): ...，被拒绝时抛出 Overloaded"""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self):
+        with self._cond:
+            admitted = self._admitted
+            completed = self._completed
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'active': self._active,
+                'queue_depth': self._waiting,
+                'queue_depth_peak': self._waiting_peak,
+                'admitted': admitted,
+                'rejected_queue_full': self._rejected_full,
+                'rejected_timeout': self._rejected_timeout,
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / admitted, 3) if admitted else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'service_time_avg_ms': round(self._service_time_total * 1000 / completed, 3) if completed else 0.0,
+            }
+
+
+class AsyncAdmissionLimiter(AdmissionLimiter):
+    """
+    协程版本，统计项与 AdmissionLimiter 相同；acquire / release 只能在同一个事件循环中调用。
+    释放时名额直接交给队首的等待者，新到的请求不会插队
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout=1.0):
+        super().__init__(name, max_concurrent, max_queue, queue_timeout)
+        self._waiters = deque()
+
+    async def acquire(self):
+        with self._cond:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._admitted += 1
+                return
+            if self._waiting >= self.max_queue:
+                self._rejected_full += 1
+                raise Overloaded(self._retry_after())
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._waiting += 1
+            self._waiting_peak = max(self._waiting_peak, self._waiting)
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # 客户端断开：已分到的名额要还回去
+            if self._abandon(waiter):
+                self._hand_off()
+            raise
+        if self._abandon(waiter):
+            waited = time.monotonic() - started
+            with self._cond:
+                self._admitted += 1
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            return
+        with self._cond:
+            self._rejected_timeout += 1
+            raise Overloaded(self._retry_after())
+
+    def _abandon(self, waiter):
+        """结束等待，返回是否已分到名额"""
+        with self._cond:
+            self._waiting -= 1
+            if waiter.done():
+                return True
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self, service_time=0.0):
+        with self._cond:
+            self._completed += 1
+            self._service_time_total += service_time
+            self._hand_off()
+
+    def _hand_off(self):
+        with self._cond:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    # 名额直接转给等待者，_active 不变
+                    waiter.set_result(None)
+                    return
+            self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """async with limiter.slot(): ...，被拒绝时抛出 Overloaded"""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
@@ -1,16 +1,38 @@
 from datetime import datetime, timedelta
+import csv
 import os
-from uuid import uuid4
-from flask import Flask, request, jsonify, send_from_directory, abort
+import re
+import time
+from flask import Flask, Response, g, has_request_context, request, jsonify, send_from_directory, abort
 from flask_cors import CORS  # 导入CORS
 import tempfile
 import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pymysql
 from dotenv import load_dotenv
 
+from admission import AdmissionLimiter, Overloaded
+from cache import MISSING, make_cache, make_generation
+from chunked_upload import UploadError, UploadSessions
+from counts import TableCounts
+from db_pool import ConnectionPool
+from export import EXPORTS, stream_export
+from file_store import ContentStore
+import hashing
+from hashing import HashingBusy, hash_password, hash_passwords, needs_rehash, verify_password
+from json_provider import FastJSONProvider
+from jwt_cache import JwtCache
+import metrics as prom
+from pagination import InvalidCursor, build_page, decode_cursor, seek_clause
+from profiler import Profiler
+from rbac_index import RbacIndex
+from thumbnails import ThumbnailService
+from user_import import UserImporter, iter_rows
+
 import jwt
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+from urllib.parse import urlencode
 
 # Modified to load from project root .env
 load_dotenv(os.path.join(os.path.dirname(__file__), '../../.env'))
@@ -22,8 +44,12 @@ JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-123456')
 JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 24))
 
 app = Flask(__name__)
+# orjson（未安装时为标准库）序列化，datetime / Decimal / bytes 统一编码，路由无需逐行格式化
+app.json = FastJSONProvider(app)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+# 由 nginx / Apache 前置时开启，文件内容交给前端服务器通过 X-Sendfile 发送
+app.config['USE_X_SENDFILE'] = os.getenv('use_x_sendfile', '').lower() in ('1', 'true')
 api_base_url = os.getenv('NEXT_PUBLIC_API_BASE_URL', 'http://localhost:5000')
 # 初始化CORS，允许所有来源
 CORS(app, resources={
@@ -32,14 +58,66 @@ CORS(app, resources={
     r"/api/*": {"origins": "*"}
 })
 
+# --- 指标：/metrics 以 Prometheus 文本格式输出 ---
+# 多 worker 部署时设置 metrics_dir，各 worker 的数据合并输出
+metrics = prom.Registry(
+    os.getenv('metrics_dir') or None,
+    flush_interval=float(os.getenv('metrics_flush_interval', 5)),
+)
+# 请求数即 http_request_duration_seconds_count
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', '请求处理耗时（到返回响应头为止）', ['endpoint', 'method', 'status'])
+http_requests_in_flight = metrics.gauge('http_requests_in_flight', '正在处理的请求数', ['endpoint'])
+db_query_duration = metrics.histogram(
+    'db_query_duration_seconds', 'SQL 语句执行耗时，query 为 "<动作> <表>"', ['endpoint', 'query'])
+db_query_rows = metrics.counter('db_query_rows_total', 'SQL 语句返回或影响的行数', ['endpoint', 'query'])
+db_connect_duration = metrics.histogram('db_connect_duration_seconds', '建立数据库连接耗时')
+upload_bytes = metrics.counter('upload_bytes_total', '上传接收的字节数', ['endpoint'])
+upload_throughput = metrics.histogram(
+    'upload_throughput_bytes_per_second', '单次上传请求的接收速度', ['endpoint'],
+    buckets=[2 ** n for n in range(16, 31, 2)])  # 64KB/s ~ 1GB/s
+
+def metrics_endpoint():
+    """指标中的 endpoint 标签：请求内为路由函数名，后台线程中为 background"""
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+def request_elapsed():
+    return time.perf_counter() - g.request_started
+
+def record_upload(endpoint, nbytes, seconds):
+    upload_bytes.inc((endpoint,), nbytes)
+    if seconds > 0:
+        upload_throughput.observe((endpoint,), nbytes / seconds)
+
+# --- 请求剖析：按需（X-Profile 口令）或自动采样超过阈值的慢请求，结果写出为折叠栈与耗时拆分 ---
+profiler = Profiler(
+    os.getenv('profiler_dir', os.path.join(UPLOAD_FOLDER, 'agent_chat_profiles')),
+    token=os.getenv('profiler_token') or None,
+    slow_threshold=float(os.getenv('profiler_slow_threshold_ms', 0)) / 1000,
+    interval=float(os.getenv('profiler_interval_ms', 5)) / 1000,
+    max_files=int(os.getenv('profiler_max_files', 200)),
+)
+
+# 已校验 token 的解码结果缓存，命中时跳过签名校验，exp 仍逐次精确检查。
+# 用于 /api/user_assistants 按 token 中的权限直接返回的路径（ASGI 版本共用）
+jwt_cache = JwtCache(
+    JWT_SECRET_KEY,
+    ["HS256"],
+    maxsize=int(os.getenv('jwt_cache_size', 10000)),
+)
+
+def get_bearer_token():
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.split(" ")[1]
+    return None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(" ")[1]
+        token = get_bearer_token()
         
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
@@ -56,85 +134,244 @@ def token_required(f):
     
     return decorated
 
+# 登录 / 重置密码的准入控制：同时处理数与等待队列有上限，超出时快速返回 503
+def make_limiter(name, default_concurrent):
+    return AdmissionLimiter(
+        name,
+        max_concurrent=int(os.getenv(f'{name}_max_concurrent', default_concurrent)),
+        max_queue=int(os.getenv(f'{name}_max_queue', default_concurrent * 4)),
+        queue_timeout=float(os.getenv(f'{name}_queue_timeout', 1)),
+    )
+
+admission_limiters = {
+    'login': make_limiter('login', hashing.HASH_WORKERS * 2),
+    'reset_password': make_limiter('reset_password', hashing.HASH_WORKERS),
+}
+
+def admission_controlled(name):
+    limiter = admission_limiters[name]
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                with limiter.slot():
+                    return f(*args, **kwargs)
+            except Overloaded as e:
+                return busy_response(e.retry_after)
+        return decorated
+    return decorator
+
+def token_permissions(claims):
+    """
+    返回 token 中携带的权限 {'v', 'roles', 'apps'}；
+    签发后授权关系有变化（版本号不一致）或未携带时返回 None，调用方应重新查询
+    """
+    rbac = claims.get('rbac')
+    if rbac and rbac.get('v') is not None and rbac['v'] == rbac_index.version:
+        return rbac
+    return None
+
+# 用户角色 / 可用助手查询，WSGI 与 ASGI（asgi_app.py）两套实现共用
+USER_ROLES_SQL = """
+    SELECT r.id, r.name FROM user_roles ur
+    INNER JOIN roles r ON ur.role_id = r.id
+    WHERE ur.user_id = %s
+    ORDER BY r.id
+"""
+USER_APPS_SQL = """
+    SELECT DISTINCT ai.id, ai.ASSISTANT_ID, ai.name, ai.description, ai.icon_url
+    FROM user_roles ur
+    INNER JOIN role_apps ra ON ur.role_id = ra.role_id
+    INNER JOIN assistant_info ai ON ra.app_id = ai.id
+    WHERE ur.user_id = %s AND ai.in_use="ACTIVE"
+    ORDER BY ai.id
+"""
+
+def format_assistant_rows(rows):
+    """将助手查询结果整理为接口返回结构，没有结果时为 None"""
+    assistants = [{
+        "ASSISTANT_ID": row['ASSISTANT_ID'],
+        "name": row['name'],
+        "description": row['description'],
+        "icon_url": row['icon_url']
+    } for row in rows]
+    return assistants or None
+
+def load_user_permissions(user_id):
+    """返回 (roles, app_ids, assistants)；索引就绪时不访问数据库"""
+    if rbac_index.ready:
+        app_ids = rbac_index.app_ids_for_user(user_id)
+        return rbac_index.roles_for_user(user_id), app_ids, rbac_index.assistants_for_apps(app_ids)
+
+    with db_pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute(USER_ROLES_SQL, (user_id,))
+        roles = [{'id': r['id'], 'name': r['name']} for r in cursor.fetchall()]
+        cursor.execute(USER_APPS_SQL, (user_id,))
+        rows = cursor.fetchall()
+    return roles, [row['id'] for row in rows], format_assistant_rows(rows)
+
+LOGIN_USER_SQL = "SELECT id, username, password_hash, real_name, email FROM Login_users WHERE username = %s"
+
+def login_result(user, permissions=None, rbac_version=None, generation=None):
+    """
+    组装登录成功的返回数据并签发 token
+    permissions: load_user_permissions 的结果，?embed=permissions 时传入，
+    generation 为读取权限前的 rbac_index.generation
+    """
+    payload = {
+        'user_id': user['id'],
+        'username': user['username'],
+        'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+    }
+    user_data = {
+        'id': user['id'],
+        'username': user['username'],
+        'real_name': user['real_name'],
+        'email': user['email']
+    }
+    result = {'user': user_data}
+
+    if permissions is not None:
+        roles, app_ids, assistants = permissions
+        user_data['roles'] = roles
+        result['assistants'] = assistants
+        store_user_assistants(user['username'], assistants, generation)
+        if rbac_version is not None:
+            payload['rbac'] = {
+                'v': rbac_version,
+                'roles': [r['id'] for r in roles],
+                'apps': app_ids
+            }
+            result['rbac_version'] = rbac_version
+
+    result['token'] = jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256")
+    return result
+
+def busy_response(retry_after=1):
+    """服务繁忙时快速返回 503，提示客户端稍后重试"""
+    response = jsonify({'message': 'Server busy, please retry later'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+def upgrade_password_hash(user_id, password):
+    """登录成功且存储的哈希参数已过时，用当前配置重新计算（失败不影响登录）"""
+    try:
+        new_password_hash = hash_password(password)
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute("UPDATE Login_users SET password_hash = %s WHERE id = %s", (new_password_hash, user_id))
+            connection.commit()
+    except Exception as e:
+        print(f"Rehash error: {e}")
+
 @app.route('/api/login', methods=['POST'])
+@admission_controlled('login')
 def login():
     data = request.get_json()
     if not data or not data.get('username') or not data.get('password'):
         return jsonify({'message': 'Invalid request'}), 400
     
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            sql = "SELECT id, username, password_hash, real_name, email FROM Login_users WHERE username = %s"
-            cursor.execute(sql, (data['username'],))
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(LOGIN_USER_SQL, (data['username'],))
             user = cursor.fetchone()
             
-            if user and check_password_hash(user['password_hash'], data['password']):
-                token = jwt.encode({
-                    'user_id': user['id'],
-                    'username': user['username'],
-                    'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
-                }, JWT_SECRET_KEY, algorithm="HS256")
-                
-                return jsonify({
-                    'token': token,
-                    'user': {
-                        'id': user['id'],
-                        'username': user['username'],
-                        'real_name': user['real_name'],
-                        'email': user['email']
-                    }
-                }), 200
-            else:
-                return jsonify({'message': 'Invalid username or password'}), 401
+        # 密码校验在进程池中执行，此时已归还数据库连接
+        if user and verify_password(user['password_hash'], data['password']):
+            if needs_rehash(user['password_hash']):
+                upgrade_password_hash(user['id'], data['password'])
+
+            permissions = rbac_version = generation = None
+            # ?embed=permissions：同时返回角色和可用助手，省去登录后的 user_assistants 请求
+            if request.args.get('embed') == 'permissions':
+                # 先取版本号再读权限，期间若有变更，token 中的版本号偏旧只会导致重新查询
+                generation = rbac_index.generation
+                rbac_version = rbac_index.version
+                permissions = load_user_permissions(user['id'])
+            return jsonify(login_result(user, permissions, rbac_version, generation)), 200
+        else:
+            return jsonify({'message': 'Invalid username or password'}), 401
+    except HashingBusy:
+        return busy_response()
     except Exception as e:
         print(f"Login error: {e}")
         return jsonify({'message': 'Internal server error'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/api/reset-password', methods=['POST'])
+@admission_controlled('reset_password')
 def reset_password():
     data = request.get_json()
     if not data or not data.get('username') or not data.get('email') or not data.get('new_password'):
         return jsonify({'message': 'Missing required fields'}), 400
     
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 校验用户名和邮箱是否匹配
             sql = "SELECT id FROM Login_users WHERE username = %s AND email = %s"
             cursor.execute(sql, (data['username'], data['email']))
             user = cursor.fetchone()
             
-            if not user:
-                return jsonify({'message': 'Username and email do not match'}), 404
-            
-            # 更新密码
-            new_password_hash = generate_password_hash(data['new_password'])
+        if not user:
+            return jsonify({'message': 'Username and email do not match'}), 404
+        
+        # 更新密码（哈希计算期间不占用数据库连接）
+        new_password_hash = hash_password(data['new_password'])
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             update_sql = "UPDATE Login_users SET password_hash = %s WHERE id = %s"
             cursor.execute(update_sql, (new_password_hash, user['id']))
             connection.commit()
-            
-            return jsonify({'message': 'Password reset successful'}), 200
+        
+        return jsonify({'message': 'Password reset successful'}), 200
+    except HashingBusy:
+        return busy_response()
     except Exception as e:
         print(f"Reset password error: {e}")
         return jsonify({'message': 'Internal server error'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 # 如果你想允许所有路由跨域，可以直接这样写：
 # CORS(app)
 
-def get_unique_filename(original_filename):
-    """生成一个唯一的临时文件名，保留原始扩展名"""
-    ext = os.path.splitext(original_filename)[1].lower()
-    unique_filename = f"{uuid4().hex}{ext}"
-    return unique_filename
+# 上传文件按内容 SHA-256 寻址存储，相同内容只存一份。
+# 默认永久保留（与改为内容寻址之前一致）；设置 upload_store_ttl（秒）或 upload_store_quota_bytes
+# 后由后台按 TTL / 配额清理，会话中引用的文件同样可能被删除
+content_store = ContentStore(
+    os.getenv('upload_store_dir', os.path.join(UPLOAD_FOLDER, 'agent_chat_files')),
+    ttl=float(os.getenv('upload_store_ttl', 0)),
+    quota_bytes=int(os.getenv('upload_store_quota_bytes', 0)),
+    sweep_interval=float(os.getenv('upload_store_sweep_interval', 600)),
+)
+
+# 图片 / PDF 缩略图：上传后后台生成，未生成时在首次请求时生成
+thumbnails = ThumbnailService(
+    content_store,
+    os.getenv('thumbnail_dir', os.path.join(content_store.root, '.thumbnails')),
+    sizes=[int(s) for s in os.getenv('thumbnail_sizes', '128,256,512').split(',')],
+    fmt=os.getenv('thumbnail_format', 'webp'),
+    workers=int(os.getenv('thumbnail_workers', 2)),
+)
+content_store.add_remove_listener(thumbnails.discard)
+
+
+def files_cache_control(ttl, quota_bytes, max_age=24 * 3600):
+    """/files 响应的 (max-age, Cache-Control)
+
+    内容寻址的文件名永不改变，不清理文件时允许浏览器和代理永久缓存。
+    开启 TTL / 配额清理后文件可能被删除（之后 URL 返回 404），而访问时间只在请求到达
+    本服务时更新，因此缓存时间缩短且不标记 immutable：仍在使用的文件会定期重新验证，
+    304 请求同样刷新访问时间，不会因为一直命中缓存而被当作未访问清理掉
+    """
+    if ttl > 0 or quota_bytes > 0:
+        if ttl > 0:
+            max_age = min(max_age, int(ttl))
+        return max_age, f'public, max-age={max_age}'
+    max_age = 365 * 24 * 3600
+    return max_age, f'public, max-age={max_age}, immutable'
+
+
+FILES_MAX_AGE, FILES_CACHE_CONTROL = files_cache_control(
+    content_store.ttl, content_store.quota_bytes, int(os.getenv('upload_cache_max_age', 24 * 3600)))
+
+def get_file_ext(original_filename):
+    return os.path.splitext(original_filename)[1].lower()
 
 def get_file_mime_type(original_filename):
     """根据文件扩展名猜测MIME类型"""
@@ -152,50 +389,596 @@ def upload_file():
         return jsonify({'error': '未选择文件'}), 400
 
     if file:
-        filename = get_unique_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        file.save(filepath)
-
-        # 获取文件的MIME类型
-        file_mime_type = get_file_mime_type(file.filename)
-        
-        # 获取文件大小 (单位: 字节)
-        file_size_bytes = os.path.getsize(filepath)
+        # 边读边写边计算 SHA-256，内容已存在时只增加引用计数
+        filename, file_size_bytes, deduplicated, ref_token = content_store.ingest(
+            file.stream, get_file_ext(file.filename)
+        )
+        record_upload('upload_file', file_size_bytes, request_elapsed())
+        if not deduplicated:
+            thumbnails.enqueue(filename)
+        return uploaded_file_response(file.filename, filename, file_size_bytes, deduplicated, ref_token)
+
+def uploaded_file_info(original_filename, filename, file_size_bytes, deduplicated=False, ref_token=None):
+    # 获取文件的MIME类型
+    file_mime_type = get_file_mime_type(original_filename)
+
+    # 构造返回给客户端的访问URL
+    file_url = f"{api_base_url}/files/{filename}"
+
+    return {
+        "file_type": file_mime_type,
+        "filename": original_filename,
+        "url": file_url,
+        "size": file_size_bytes,
+        "deduplicated": deduplicated,
+        # 本次上传产生的引用，DELETE /files/<filename> 时通过 X-File-Token 出示
+        "ref_token": ref_token
+    }
+
+def uploaded_file_response(original_filename, filename, file_size_bytes, deduplicated=False, ref_token=None,
+                           status=201):
+    # 返回指定格式的JSON
+    return jsonify(uploaded_file_info(original_filename, filename, file_size_bytes, deduplicated, ref_token)), status
+
+# --- 批量上传：一次 multipart 请求包含多个文件，各文件并行写入存储 ---
+UPLOAD_BATCH_MAX_FILES = int(os.getenv('upload_batch_max_files', 20))
+UPLOAD_BATCH_WORKERS = int(os.getenv('upload_batch_workers', 4))
+_upload_executor = None
+_upload_executor_pid = None
+_upload_executor_lock = threading.Lock()
+
+def get_upload_executor():
+    """懒加载线程池；fork 出的子进程会创建自己的线程池"""
+    global _upload_executor, _upload_executor_pid
+    with _upload_executor_lock:
+        if _upload_executor is None or _upload_executor_pid != os.getpid():
+            _upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_BATCH_WORKERS, thread_name_prefix='upload-batch')
+            _upload_executor_pid = os.getpid()
+        return _upload_executor
+
+def store_upload(file):
+    """单个文件入库，返回结果 dict；失败时只影响该文件"""
+    if not file.filename:
+        return {'filename': file.filename, 'error': '未选择文件'}
+    try:
+        filename, file_size_bytes, deduplicated, ref_token = content_store.ingest(
+            file.stream, get_file_ext(file.filename)
+        )
+    except Exception as e:
+        print(f"Batch upload error for {file.filename}: {e}")
+        return {'filename': file.filename, 'error': '文件保存失败'}
+    if not deduplicated:
+        thumbnails.enqueue(filename)
+    return uploaded_file_info(file.filename, filename, file_size_bytes, deduplicated, ref_token)
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    multipart 中可包含多个名为 "files" 的字段，返回与上传顺序一致的结果列表，
+    每项为与 /upload 相同的文件信息，失败的文件只包含 filename 和 error
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': '没有找到名为 "files" 的字段'}), 400
+    if len(files) > UPLOAD_BATCH_MAX_FILES:
+        return jsonify({'error': f'单次最多上传 {UPLOAD_BATCH_MAX_FILES} 个文件'}), 413
+
+    # Werkzeug 已先把整个 multipart 请求体解析到临时文件，这里并行的只是
+    # 各文件从临时文件到存储的哈希计算和复制（hashlib 与文件 IO 会释放 GIL）
+    results = list(get_upload_executor().map(store_upload, files))
+    succeeded = sum(1 for r in results if 'error' not in r)
+    record_upload('upload_batch', sum(r['size'] for r in results if 'error' not in r), request_elapsed())
+    return jsonify({
+        'files': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded
+    }), 201 if succeeded else 400
+
+@app.errorhandler(413)
+def request_too_large(e):
+    # 超过 MAX_CONTENT_LENGTH 时返回 JSON 而不是 HTML 错误页，前端据此改为逐个上传
+    return jsonify({'error': f'请求体超过 {MAX_CONTENT_LENGTH // (1024 * 1024)}MB 上限'}), 413
+
+# --- 分块上传：init → PUT 分块 → complete，支持断点续传，不受 MAX_CONTENT_LENGTH 限制 ---
+upload_sessions = UploadSessions(
+    os.path.join(UPLOAD_FOLDER, '.chunked_uploads'),
+    max_size=int(os.getenv('upload_max_size', 1024 * 1024 * 1024)),
+    # 单个分块仍是一次请求，需小于 MAX_CONTENT_LENGTH
+    chunk_size=min(int(os.getenv('upload_chunk_size', 8 * 1024 * 1024)), MAX_CONTENT_LENGTH),
+    session_ttl=float(os.getenv('upload_session_ttl', 24 * 3600)),
+)
+
+def upload_error_response(e):
+    body = {'error': e.message}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status
+
+@app.route('/upload/chunked', methods=['POST'])
+def init_chunked_upload():
+    """
+    请求体: {"filename": "a.pdf", "size": 123456, "sha256": "可选，整个文件的校验和"}
+    提供 sha256 且内容已存在时直接返回文件信息（秒传），无需上传分块
+    """
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '').strip()
+    if not filename:
+        return jsonify({'error': '缺少文件名'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': '缺少文件大小'}), 400
+    sha256 = str(data.get('sha256') or '').strip().lower()
+    if len(sha256) == 64:
+        existing = content_store.add_ref(sha256, get_file_ext(filename))
+        if existing is not None:
+            name, file_size_bytes, ref_token = existing
+            return uploaded_file_response(filename, name, file_size_bytes, True, ref_token, status=200)
+    try:
+        return jsonify(upload_sessions.init(filename, size, sha256 or None)), 201
+    except UploadError as e:
+        return upload_error_response(e)
 
-        # 构造返回给客户端的访问URL
-        file_url = f"{api_base_url}/files/{filename}"
+@app.route('/upload/chunked/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """查询已接收的偏移量，断线后从该位置续传"""
+    try:
+        return jsonify(upload_sessions.status(upload_id)), 200
+    except UploadError as e:
+        return upload_error_response(e)
 
-        # 返回指定格式的JSON
-        return jsonify({
-            "file_type": file_mime_type,
-            "filename": file.filename,
-            "url": file_url,
-            "size": file_size_bytes
-        }), 201
+@app.route('/upload/chunked/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    请求体为分块的原始字节，?offset= 为分块在文件中的起始位置，
+    可选请求头 X-Chunk-Sha256 为分块的 SHA-256
+    """
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': '缺少 offset 参数'}), 400
+    length = request.content_length
+    if length is None:
+        return jsonify({'error': '缺少 Content-Length'}), 411
+    try:
+        new_offset = upload_sessions.write_chunk(
+            upload_id, offset, request.stream, length, request.headers.get('X-Chunk-Sha256')
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+    record_upload('put_chunked_upload', length, request_elapsed())
+    return jsonify({'upload_id': upload_id, 'offset': new_offset}), 200
+
+@app.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    try:
+        meta = upload_sessions.status(upload_id)
+        ext = get_file_ext(meta['filename'])
+        meta, (filename, file_size_bytes, deduplicated, ref_token) = upload_sessions.complete(
+            upload_id, lambda part_path: content_store.ingest_file(part_path, ext)
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+    if not deduplicated:
+        thumbnails.enqueue(filename)
+    return uploaded_file_response(meta['filename'], filename, file_size_bytes, deduplicated, ref_token)
+
+@app.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    try:
+        upload_sessions.abort(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'upload_id': upload_id, 'aborted': True}), 200
 
 @app.route('/files/<filename>')
 def download_file(filename):
     try:
         if '..' in filename or '/' in filename or '\\' in filename:
              abort(404)
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=False)
+        # send_file 按 If-None-Match / If-Modified-Since 返回 304，按 Range 返回 206；
+        # 完整文件以 wsgi.file_wrapper 输出，gunicorn 等服务器会用 sendfile 零拷贝发送
+        store_path = content_store.path(filename)
+        if os.path.isfile(store_path):
+            content_store.touch(filename)
+            # 文件名即内容哈希，直接用作强 ETag
+            response = send_from_directory(os.path.dirname(store_path), filename, as_attachment=False,
+                                           etag=os.path.splitext(filename)[0],
+                                           max_age=FILES_MAX_AGE)
+            response.headers['Cache-Control'] = FILES_CACHE_CONTROL
+            return response
+        # 兼容改为内容寻址存储之前上传的随机文件名：可缓存，但每次需用 ETag 重新验证
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=False)
+        response.headers['Cache-Control'] = 'public, no-cache'
+        return response
     except FileNotFoundError:
         abort(404)
 
+@app.route('/files/<filename>/thumbnail')
+def download_thumbnail(filename):
+    """?size=256 返回缩略图，尺寸向上取到配置的档位之一"""
+    if '..' in filename or '/' in filename or '\\' in filename:
+        abort(404)
+    if not os.path.isfile(content_store.path(filename)):
+        abort(404)
+    # 会话中通常只显示缩略图，同样算作原文件的一次访问
+    content_store.touch(filename)
+    if not thumbnails.supported(filename):
+        return jsonify({'error': '该文件类型不支持缩略图'}), 415
+    try:
+        size = thumbnails.snap_size(int(request.args.get('size', 256)))
+    except ValueError:
+        return jsonify({'error': 'size 必须是整数'}), 400
+
+    thumb_path = thumbnails.get(filename, size)
+    if thumb_path is None:
+        return jsonify({'error': '缩略图生成失败'}), 500
+    # 原文件内容不变，缩略图与原文件使用相同的缓存策略
+    response = send_from_directory(os.path.dirname(thumb_path), os.path.basename(thumb_path),
+                                   mimetype=thumbnails.mimetype, etag=f"{os.path.splitext(filename)[0]}-{size}",
+                                   max_age=FILES_MAX_AGE)
+    response.headers['Cache-Control'] = FILES_CACHE_CONTROL
+    return response
+
+@app.route('/files/<filename>', methods=['DELETE'])
+def release_file(filename):
+    """
+    释放一次引用（如会话被删除），最后一个引用释放时删除文件；
+    请求头 X-File-Token 为上传时返回的 ref_token，每个令牌只能释放它自己的那一次引用
+    """
+    ref_token = request.headers.get('X-File-Token')
+    if not ref_token:
+        return jsonify({'error': '缺少 X-File-Token'}), 401
+    remaining = content_store.release(filename, ref_token)
+    if remaining is None:
+        # 文件不存在与令牌无效不作区分，避免探测
+        return jsonify({'error': '文件或引用不存在'}), 404
+    return jsonify({'filename': filename, 'references': remaining}), 200
+
+def db_settings():
+    """数据库连接参数，从环境变量获取，或使用默认值"""
+    return {
+        'host': os.getenv('mysql_host', 'localhost'),
+        'port': int(os.getenv('mysql_port', 3306)),
+        'user': os.getenv('mysql_user', 'root'),
+        'password': os.getenv('mysql_pwd', '123456'),
+        'database': os.getenv('db_name', 'temp_base'),
+        'charset': 'utf8mb4',
+    }
+
+QUERY_VERB_RE = re.compile(r'^\s*(\w+)')
+QUERY_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+`?(\w+)', re.IGNORECASE)
+# 动作和主表都在语句开头，只解析这一段；executemany 拼出的多行 INSERT 可能长达数 MB
+QUERY_NAME_HEAD = 1024
+
+def query_name(sql):
+    """SQL 归类为 "<动作> <表>"（如 "SELECT Login_users"），取值个数有限，可用作指标标签"""
+    head = sql[:QUERY_NAME_HEAD]
+    if isinstance(head, (bytes, bytearray)):
+        # executemany 把批量 INSERT 以 bytearray 交给 execute
+        head = head.decode('utf-8', errors='ignore')
+    verb = QUERY_VERB_RE.match(head)
+    table = QUERY_TABLE_RE.search(head)
+    name = verb.group(1).upper() if verb else 'UNKNOWN'
+    return f"{name} {table.group(1)}" if table else name
+
+class InstrumentedCursor(pymysql.cursors.DictCursor):
+    """返回字典格式的结果，并记录每条语句的耗时和行数"""
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            elapsed = time.perf_counter() - started
+            labels = (metrics_endpoint(), query_name(query))
+            db_query_duration.observe(labels, elapsed)
+            profiler.record_query(labels[1], elapsed)
+            if self.rowcount and self.rowcount > 0:
+                db_query_rows.inc(labels, self.rowcount)
+
 def get_db_connection():
     """建立数据库连接"""
+    started = time.perf_counter()
     connection = pymysql.connect(
-        host=os.getenv('mysql_host', 'localhost'),  # 从环境变量获取，或使用默认值
-        user=os.getenv('mysql_user', 'root'),
-        password=os.getenv('mysql_pwd', '123456'),
-        database=os.getenv('db_name', 'temp_base'),
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor # 返回字典格式的结果
+        **db_settings(),
+        cursorclass=InstrumentedCursor
     )
+    db_connect_duration.observe((), time.perf_counter() - started)
     return connection
 
+# 数据库连接池：所有路由通过 `with db_pool.connection() as connection:` 借用连接
+db_pool = ConnectionPool(
+    get_db_connection,
+    max_size=int(os.getenv('db_pool_max_size', 10)),
+    min_idle=int(os.getenv('db_pool_min_idle', 0)),
+    checkout_timeout=float(os.getenv('db_pool_checkout_timeout', 5)),
+    max_idle_time=float(os.getenv('db_pool_max_idle_time', 300)),
+    max_lifetime=float(os.getenv('db_pool_max_lifetime', 3600)),
+    health_check_interval=float(os.getenv('db_pool_health_check_interval', 30)),
+)
+
+# 用户可用助手缓存：key 为用户名，由管理端写接口精确失效
+user_assistants_cache = make_cache(
+    'user_assistants',
+    maxsize=int(os.getenv('user_assistants_cache_size', 10000)),
+    ttl=float(os.getenv('user_assistants_cache_ttl', 300)),
+    redis_url=os.getenv('cache_redis_url'),
+)
+
+def invalidate_user_assistants(usernames):
+    """使指定用户的助手缓存失效；涉及用户过多时直接清空"""
+    usernames = list(usernames)
+    maxsize = getattr(user_assistants_cache, 'maxsize', None)
+    if maxsize is not None and len(usernames) > maxsize:
+        user_assistants_cache.clear()
+    else:
+        user_assistants_cache.delete_many(usernames)
+
+def usernames_by_user(cursor, user_id):
+    cursor.execute("SELECT username FROM Login_users WHERE id = %s", (user_id,))
+    return [r['username'] for r in cursor.fetchall()]
+
+def usernames_by_roles_query(role_ids):
+    """返回 (sql, params)，role_ids 为空时返回 None"""
+    role_ids = sorted(role_ids)
+    if not role_ids:
+        return None
+    placeholders = ', '.join(['%s'] * len(role_ids))
+    return f"""
+        SELECT DISTINCT lu.username FROM Login_users lu
+        INNER JOIN user_roles ur ON lu.id = ur.user_id
+        WHERE ur.role_id IN ({placeholders})
+        """, role_ids
+
+def usernames_by_roles(cursor, role_ids):
+    query = usernames_by_roles_query(role_ids)
+    if query is None:
+        return []
+    cursor.execute(*query)
+    return [r['username'] for r in cursor.fetchall()]
+
+def usernames_by_role(cursor, role_id):
+    return usernames_by_roles(cursor, [role_id])
+
+USERNAMES_BY_APP_SQL = """
+    SELECT DISTINCT lu.username FROM Login_users lu
+    INNER JOIN user_roles ur ON lu.id = ur.user_id
+    INNER JOIN role_apps ra ON ur.role_id = ra.role_id
+    WHERE ra.app_id = %s
+"""
+
+def usernames_by_app(cursor, app_id):
+    cursor.execute(USERNAMES_BY_APP_SQL, (app_id,))
+    return [r['username'] for r in cursor.fetchall()]
+
+# RBAC 物化索引：用户 → 角色 → 应用，加载完成前相关查询回退到 SQL。
+# 写接口提交后把共享的写入代数加一，其他 worker 据此发现自己的索引和进程内缓存已过期；
+# 同一主机上的 worker 通过 rbac_generation_file 共享，多台主机需配置 cache_redis_url。
+# 共享代数在 rbac_generation_check_interval 秒内只读取一次，其他 worker 的写入最多晚这么久生效
+rbac_index = RbacIndex(
+    db_pool.connection,
+    reconcile_interval=float(os.getenv('rbac_reconcile_interval', 60)),
+    generation_check_interval=float(os.getenv('rbac_generation_check_interval', 0.25)),
+    generation=make_generation(
+        'rbac',
+        os.getenv('rbac_generation_file', os.path.join(UPLOAD_FOLDER, 'agent_chat_rbac_generation')),
+        redis_url=os.getenv('cache_redis_url'),
+    ),
+)
+
+_user_assistants_cache_generation = None
+
+def sync_user_assistants_cache(generation):
+    """进程内缓存收不到其他 worker 的精确失效，写入代数变化时整体清空"""
+    global _user_assistants_cache_generation
+    if not user_assistants_cache.shared and generation != _user_assistants_cache_generation:
+        user_assistants_cache.clear()
+        _user_assistants_cache_generation = generation
+
+def cached_user_assistants(username, generation):
+    """读取用户助手缓存，generation 为请求开始时读取的 rbac_index.generation（为 None 时不使用缓存）"""
+    if generation is None:
+        return MISSING
+    sync_user_assistants_cache(generation)
+    return user_assistants_cache.get(username)
+
+def store_user_assistants(username, assistants, generation):
+    """写入用户助手缓存；计算期间有写入（代数已变化）时不写，避免覆盖写入方刚做的失效"""
+    if generation is not None and rbac_index.generation == generation:
+        sync_user_assistants_cache(generation)
+        user_assistants_cache.set(username, assistants)
+
+# 分页列表总数缓存：写接口增减，后台定期校正
+table_counts = TableCounts(
+    db_pool.connection,
+    ['Login_users', 'roles', 'assistant_info'],
+    refresh_interval=float(os.getenv('count_refresh_interval', 300)),
+)
+
+# --- 后台任务 ---
+_background_pid = None
+_background_lock = threading.Lock()
+
+def prefill_db_pool():
+    """按 db_pool_min_idle 预先建立连接，首批请求不必等待建连"""
+    try:
+        db_pool.prefill()
+    except Exception as e:
+        print(f"DB pool prefill error: {e}")
+
+def start_background_tasks():
+    """启动后台线程，每个进程只启动一次（fork 出的子进程会重新启动自己的线程）"""
+    global _background_pid
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+        if db_pool.min_idle > 0:
+            threading.Thread(target=prefill_db_pool, name='db-pool-prefill', daemon=True).start()
+        rbac_index.start()
+        table_counts.start()
+        content_store.start()
+        metrics.start()
+
+@app.before_request
+def ensure_background_tasks():
+    if _background_pid != os.getpid():
+        start_background_tasks()
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.metrics_endpoint = metrics_endpoint()
+    http_requests_in_flight.inc((g.metrics_endpoint,))
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        http_request_duration.observe(
+            (g.metrics_endpoint, request.method, str(response.status_code)), time.perf_counter() - started
+        )
+    return response
+
+@app.before_request
+def start_request_profile():
+    if profiler.enabled:
+        forced = profiler.requested(request.headers.get('X-Profile') or request.args.get('_profile'))
+        g.profile = profiler.begin(forced)
+
+def profiled_path():
+    """写入剖析结果的请求路径，去掉其中的 _profile 口令（结果可通过 /api/admin/profiles 读取）"""
+    query = [(k, v) for k, v in request.args.items(multi=True) if k != '_profile']
+    return f"{request.path}?{urlencode(query)}" if query else request.path
+
+@app.after_request
+def finish_request_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    name, summary = profiler.end(
+        profile, endpoint=metrics_endpoint(), method=request.method,
+        path=profiled_path(), status=response.status_code
+    )
+    if profile.forced:
+        # 浏览器开发者工具的 Timing 面板可直接显示
+        response.headers['Server-Timing'] = f"db;dur={summary['db_ms']}, app;dur={summary['python_ms']}"
+        if name:
+            response.headers['X-Profile-Id'] = name
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # teardown 在异常时同样执行，保证 in-flight 计数不泄漏
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        http_requests_in_flight.dec((endpoint,))
+    # after_request 未执行（如其中抛出异常）时停止采样
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.cancel(profile)
+
+def create_app(warm=True):
+    """
+    应用工厂（供 serve.py / WSGI 服务器使用）
+    warm=True 时在当前进程预先加载 RBAC 索引和表计数：在 master 中调用后再 fork，
+    子进程以写时复制方式共享这些数据，不必各自全量加载；
+    预热用过的数据库连接随即关闭，子进程不会继承打开的连接
+    """
+    if warm:
+        try:
+            rbac_index.load()
+            table_counts.refresh()
+        except Exception as e:
+            print(f"Warm-up error (workers will load on start): {e}")
+        finally:
+            db_pool.close_all()
+    return app
+
+# 已有 stats() 的组件在输出时读取当前值
+metrics.callback_gauge(
+    'db_pool_connections', '数据库连接池连接数', ['state'],
+    lambda: {(state,): value for state, value in db_pool.stats().items() if state in ('in_use', 'idle', 'waiting')})
+
+def admission_samples():
+    samples = {}
+    for name, limiter in admission_limiters.items():
+        stats = limiter.stats()
+        samples[(name, 'active')] = stats['active']
+        samples[(name, 'queued')] = stats['queue_depth']
+    return samples
+
+metrics.callback_gauge(
+    'admission_requests', '准入控制中的请求数（active 正在处理，queued 排队中）', ['name', 'state'],
+    admission_samples)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 抓取接口"""
+    return Response(metrics.render(), content_type=prom.CONTENT_TYPE)
+
+def profiler_token_required(f):
+    """
+    剖析结果包含请求路径和查询参数，读取时需要携带与按需剖析相同的口令
+    （X-Profile 请求头或 ?_profile=）；未配置 profiler_token 时不允许读取
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        value = request.headers.get('X-Profile') or request.args.get('_profile')
+        if not value:
+            return jsonify({'success': False, 'message': '缺少剖析口令'}), 401
+        if not profiler.requested(value):
+            return jsonify({'success': False, 'message': '剖析口令无效'}), 403
+        return f(*args, **kwargs)
+    return decorated
 
+@app.route('/api/admin/profiles', methods=['GET'])
+@profiler_token_required
+def list_profiles():
+    """已保存的请求剖析结果（耗时拆分），最新的在前"""
+    return jsonify({'success': True, 'data': profiler.list()})
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+@profiler_token_required
+def download_profile(name):
+    """?format=collapsed（默认，火焰图输入）或 json（耗时拆分）"""
+    fmt = request.args.get('format', 'collapsed')
+    if fmt not in ('collapsed', 'json') or '..' in name or '/' in name or '\\' in name:
+        abort(404)
+    return send_from_directory(profiler.directory, f'{name}.{fmt}', as_attachment=fmt == 'collapsed',
+                               mimetype='text/plain' if fmt == 'collapsed' else 'application/json')
+
+@app.route('/api/admin/stats', methods=['GET'])
+def get_server_stats():
+    """服务运行状态（连接池等）"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'db_pool': db_pool.stats(),
+            'user_assistants_cache': user_assistants_cache.stats(),
+            'rbac_index': rbac_index.stats(),
+            'table_counts': table_counts.stats(),
+            'password_hashing': hashing.stats(),
+            'jwt_cache': jwt_cache.stats(),
+            'file_store': content_store.stats(),
+            'thumbnails': thumbnails.stats(),
+            'profiler': profiler.stats(),
+            'admission': {name: limiter.stats() for name, limiter in admission_limiters.items()}
+        }
+    })
+
+
+# SQL 查询语句：关联 login_users, user_roles, role_apps, assistant_info
+USERNAME_ASSISTANTS_SQL = """
+    SELECT DISTINCT ai.id, ai.ASSISTANT_ID, ai.name, ai.description, ai.icon_url
+    FROM Login_users lu
+    INNER JOIN user_roles ur on lu.id=ur.user_id
+    INNER JOIN role_apps ra on ur.role_id=ra.role_id
+    INNER JOIN assistant_info ai ON ra.app_id = ai.id
+    WHERE lu.username = %s AND ai.in_use="ACTIVE"
+    ORDER BY ai.id
+"""
 
 @app.route('/api/user_assistants', methods=['GET'])
 def get_user_assistants():
@@ -207,186 +990,228 @@ def get_user_assistants():
     if not user_id:
         return jsonify({'error': 'Missing user_id parameter'}), 400
 
-    connection = None
-    try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # SQL 查询语句：关联 login_users, user_assistants, assistant_info
-            sql = """
-            SELECT DISTINCT ai.id,
-                ai.ASSISTANT_ID,
-                ai.name AS assistant_name,
-                ai.description AS assistant_description,
-                ai.icon_url
-            FROM Login_users lu
-            INNER JOIN user_roles ur on lu.id=ur.user_id
-            INNER JOIN role_apps ra on ur.role_id=ra.role_id
-            INNER JOIN assistant_info ai ON ra.app_id = ai.id
-            WHERE lu.username = %s AND ai.in_use="ACTIVE"
-            ORDER BY ai.id;
-            """
-            cursor.execute(sql, (user_id,))
-            results = cursor.fetchall()
-
-            # 如果没有找到结果
-            if not results:
-                return jsonify({'assistants':None}), 200
-
-            # 构造返回数据
-            assistants_list = []
-            for row in results:
-                assistant_data = {
-                    "ASSISTANT_ID": row['ASSISTANT_ID'],
-                    "name": row['assistant_name'],
-                    "description": row['assistant_description'],
-                    "icon_url": row['icon_url']
-                }
-                assistants_list.append(assistant_data)
-
-            # print(assistants_list)
-
-            return jsonify({'assistants': assistants_list}), 200
+    # 携带本人 token 且其中的权限版本仍是最新时，直接按 token 里的应用 id 返回
+    token = get_bearer_token()
+    if token and rbac_index.ready:
+        try:
+            claims = jwt_cache.decode(token)
+        except jwt.InvalidTokenError:
+            claims = None
+        if claims and claims.get('username') == user_id:
+            rbac = token_permissions(claims)
+            if rbac is not None:
+                return jsonify({'assistants': rbac_index.assistants_for_apps(rbac['apps'])}), 200
+
+    generation = rbac_index.generation
+    cached = cached_user_assistants(user_id, generation)
+    if cached is not MISSING:
+        return jsonify({'assistants': cached}), 200
+
+    # 索引未就绪，或用户名只在数据库排序规则下才能匹配（如重音差异）时查询数据库
+    assistants_list = rbac_index.assistants_for_username(user_id) if rbac_index.ready else MISSING
+    if assistants_list is MISSING:
+        try:
+            with db_pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(USERNAME_ASSISTANTS_SQL, (user_id,))
+                assistants_list = format_assistant_rows(cursor.fetchall())
+        except pymysql.MySQLError as e:
+            print(f"Database error: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+    store_user_assistants(user_id, assistants_list, generation)
+    return jsonify({'assistants': assistants_list}), 200
+
+# 游标分页的排序键；created_at 允许为 NULL（按最小值处理），需要 (created_at, id) 索引，见 pagination.py
+USERS_SORT_KEYS = ['created_at', 'id']
+NULLABLE_SORT_KEYS = ('created_at',)
+
+def format_user_row(row):
+    """将用户查询结果整理为接口返回结构"""
+    user_data = {
+        'id': row['id'],
+        'username': row['username'],
+        'real_name': row['real_name'],
+        'email': row['email'],
+        'created_at': row['created_at'],
+        'roles': []
+    }
+
+    # 解析角色字符串 "1:管理员|2:普通用户" → [{'id': 1, 'name': '管理员'}, ...]
+    if row['roles_str']:
+        roles_list = []
+        for role_str in row['roles_str'].split('|'):
+            if ':' in role_str:
+                role_id, role_name = role_str.split(':', 1)
+                roles_list.append({
+                    'id': int(role_id),
+                    'name': role_name
+                })
+        user_data['roles'] = roles_list
+    return user_data
 
-    except pymysql.MySQLError as e:
-        print(f"Database error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
-    finally:
-        if connection:
-            connection.close()
+def users_page_query(key_values, direction, limit, offset=0):
+    """
+    返回 (sql, params)：先在 Login_users 上定位一页用户，再关联角色做聚合，
+    GROUP_CONCAT 只处理当前页的用户而不是所有被跳过的行
+    """
+    where_sql, params, order_sql = seek_clause(USERS_SORT_KEYS, key_values, direction,
+                                               nullable=NULLABLE_SORT_KEYS)
+    _, _, outer_order_sql = seek_clause(USERS_SORT_KEYS, [], direction, alias='u')
+    sql = f"""
+    SELECT 
+        u.id, u.username, u.real_name, u.email, u.created_at,
+        GROUP_CONCAT(DISTINCT CONCAT(r.id, ':', r.name) SEPARATOR '|') as roles_str
+    FROM (
+        SELECT id, username, real_name, email, created_at
+        FROM Login_users
+        WHERE {where_sql}
+        ORDER BY {order_sql}
+        LIMIT %s OFFSET %s
+    ) u
+    LEFT JOIN user_roles ur ON u.id = ur.user_id
+    LEFT JOIN roles r ON ur.role_id = r.id
+    GROUP BY u.id, u.username, u.real_name, u.email, u.created_at
+    ORDER BY {outer_order_sql}
+    """
+    return sql, params + [limit, offset]
+
+def query_users_page(cursor, key_values, direction, limit, offset=0):
+    cursor.execute(*users_page_query(key_values, direction, limit, offset))
+    return cursor.fetchall()
+
+def exact_count_requested(args=None):
+    """exact_count=1 时执行精确 COUNT(*)，否则使用缓存的估算总数；args 默认为 request.args"""
+    args = request.args if args is None else args
+    return args.get('exact_count', '').lower() in ('1', 'true', 'yes')
+
+def page_pagination(page, per_page, total_count, is_exact):
+    return {
+        'current_page': page,
+        'per_page': per_page,
+        'total': total_count,
+        'total_estimate': total_count,
+        'total_exact': is_exact,
+        'pages': (total_count + per_page - 1) // per_page
+    }
+
+def cursor_pagination_requested(args=None):
+    """传了 cursor 参数（第一页可传空值或 mode=cursor）时使用游标分页"""
+    args = request.args if args is None else args
+    return 'cursor' in args or args.get('mode') == 'cursor'
+
+def parse_cursor_arg(scope, key_count, args=None):
+    """返回 (direction, key_values, had_cursor)，游标无效时抛出 InvalidCursor"""
+    args = request.args if args is None else args
+    token = args.get('cursor')
+    if not token:
+        return 'next', [], False
+    direction, key_values = decode_cursor(token, scope, key_count)
+    return direction, key_values, True
 
 @app.route('/api/admin/users', methods=['GET'])
 def get_users():
     """
     查询用户列表 (支持分页), 包含用户角色信息
+    默认按页码分页；传 cursor 时按 (created_at, id) 游标分页
     """
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = max(1, request.args.get('per_page', 10, type=int))
     
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # 计算总数
-            count_sql = "SELECT COUNT(*) as total FROM Login_users"
-            cursor.execute(count_sql)
-            total_count = cursor.fetchone()['total']
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            if cursor_pagination_requested():
+                try:
+                    direction, key_values, had_cursor = parse_cursor_arg('users', len(USERS_SORT_KEYS))
+                except InvalidCursor:
+                    return jsonify({'success': False, 'message': '无效的分页游标'}), 400
+
+                rows = query_users_page(cursor, key_values, direction, per_page + 1)
+                rows, pagination = build_page(
+                    rows, per_page, 'users', direction, had_cursor,
+                    key=lambda r: [r['created_at'], r['id']]
+                )
+                pagination['total_estimate'] = table_counts.estimate('Login_users')
+                return jsonify({
+                    'success': True,
+                    'data': {
+                        'users': [format_user_row(row) for row in rows],
+                        'pagination': pagination
+                    }
+                }), 200
+
+            # 总数（默认使用缓存的估算值）
+            total_count, is_exact = table_counts.total(cursor, 'Login_users', exact=exact_count_requested())
 
             offset = (page - 1) * per_page
 
             # 查询用户列表及角色（使用 GROUP_CONCAT 聚合角色信息，避免 N+1 查询）
-            sql = """
-            SELECT 
-                u.id, u.username, u.real_name, u.email, u.created_at,
-                GROUP_CONCAT(DISTINCT CONCAT(r.id, ':', r.name) SEPARATOR '|') as roles_str
-            FROM Login_users u
-            LEFT JOIN user_roles ur ON u.id = ur.user_id
-            LEFT JOIN roles r ON ur.role_id = r.id
-            GROUP BY u.id
-            ORDER BY u.created_at DESC
-            LIMIT %s OFFSET %s
-            """
-            cursor.execute(sql, (per_page, offset))
-            rows = cursor.fetchall()
+            rows = query_users_page(cursor, [], 'next', per_page, offset)
 
             # 处理角色数据（将聚合字符串解析为数组）
-            users = []
-            for row in rows:
-                user_data = {
-                    'id': row['id'],
-                    'username': row['username'],
-                    'real_name': row['real_name'],
-                    'email': row['email'],
-                    'created_at': row['created_at'].strftime('%Y-%m-%d %H:%M:%S') if row['created_at'] else None,
-                    'roles': []
-                }
-                
-                # 解析角色字符串 "1:管理员|2:普通用户" → [{'id': 1, 'name': '管理员'}, ...]
-                if row['roles_str']:
-                    roles_list = []
-                    for role_str in row['roles_str'].split('|'):
-                        if ':' in role_str:
-                            role_id, role_name = role_str.split(':', 1)
-                            roles_list.append({
-                                'id': int(role_id),
-                                'name': role_name
-                            })
-                    user_data['roles'] = roles_list
-                
-                users.append(user_data)
-
-            total_pages = (total_count + per_page - 1) // per_page
+            users = [format_user_row(row) for row in rows]
 
             return jsonify({
                 'success': True,
                 'data': {
                     'users': users,
-                    'pagination': {
-                        'current_page': page,
-                        'per_page': per_page,
-                        'total': total_count,
-                        'pages': total_pages
-                    }
+                    'pagination': page_pagination(page, per_page, total_count, is_exact)
                 }
             }), 200
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/api/admin/roles', methods=['GET'])
 def get_roles():
-    """获取角色列表（分页）"""
+    """获取角色列表（分页，传 cursor 时按 id 游标分页）"""
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = max(1, request.args.get('per_page', 10, type=int))
     
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # 计算总数
-            cursor.execute("SELECT COUNT(*) as total FROM roles")
-            total_count = cursor.fetchone()['total']
-            
-            offset = (page - 1) * per_page
-            
-            # 查询角色列表
-            sql = """
-                SELECT id, name, created_at 
-                FROM roles 
-                ORDER BY id ASC
-                LIMIT %s OFFSET %s
-            """
-            cursor.execute(sql, (per_page, offset))
-            roles = cursor.fetchall()
-            
-            # 格式化日期
-            for role in roles:
-                if role['created_at']:
-                    role['created_at'] = role['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-            
-            total_pages = (total_count + per_page - 1) // per_page
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            if cursor_pagination_requested():
+                try:
+                    direction, key_values, had_cursor = parse_cursor_arg('roles', 1)
+                except InvalidCursor:
+                    return jsonify({"success": False, "message": "无效的分页游标"}), 400
+
+                where_sql, params, order_sql = seek_clause(['id'], key_values, direction, descending=False)
+                cursor.execute(
+                    f"SELECT id, name, created_at FROM roles WHERE {where_sql} ORDER BY {order_sql} LIMIT %s",
+                    params + [per_page + 1]
+                )
+                roles, pagination = build_page(
+                    cursor.fetchall(), per_page, 'roles', direction, had_cursor,
+                    key=lambda r: [r['id']]
+                )
+                pagination['total_estimate'] = table_counts.estimate('roles')
+            else:
+                # 总数（默认使用缓存的估算值）
+                total_count, is_exact = table_counts.total(cursor, 'roles', exact=exact_count_requested())
+                
+                offset = (page - 1) * per_page
+                
+                # 查询角色列表
+                sql = """
+                    SELECT id, name, created_at 
+                    FROM roles 
+                    ORDER BY id ASC
+                    LIMIT %s OFFSET %s
+                """
+                cursor.execute(sql, (per_page, offset))
+                roles = cursor.fetchall()
+                pagination = page_pagination(page, per_page, total_count, is_exact)
             
             return jsonify({
                 "success": True,
                 "data": {
                     "roles": roles,
-                    "pagination": {
-                        "current_page": page,
-                        "per_page": per_page,
-                        "total": total_count,
-                        "pages": total_pages
-                    }
+                    "pagination": pagination
                 }
             })
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/api/admin/roles', methods=['POST'])
 def create_role():
@@ -396,11 +1221,8 @@ def create_role():
         return jsonify({"success": False, "message": "角色名称不能为空"}), 400
     
     name = data['name'].strip()
-    connection = None
-    
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查角色名是否已存在
             cursor.execute("SELECT id FROM roles WHERE name = %s", (name,))
             if cursor.fetchone():
@@ -411,23 +1233,20 @@ def create_role():
             connection.commit()
             
             role_id = cursor.lastrowid
+            rbac_index.put_role(role_id, name)
+            table_counts.adjust('roles', 1)
             return jsonify({
                 "success": True,
                 "message": "角色创建成功",
                 "data": {
                     "id": role_id,
                     "name": name,
-                    "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    "created_at": datetime.now()
                 }
             }), 201
     except Exception as e:
         print(f"Database error: {e}")
-        if connection:
-            connection.rollback()
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/api/admin/roles/<int:role_id>', methods=['PUT'])
 def update_role(role_id):
@@ -437,11 +1256,8 @@ def update_role(role_id):
         return jsonify({"success": False, "message": "角色名称不能为空"}), 400
     
     name = data['name'].strip()
-    connection = None
-    
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查角色是否存在
             cursor.execute("SELECT id FROM roles WHERE id = %s", (role_id,))
             if not cursor.fetchone():
@@ -455,6 +1271,7 @@ def update_role(role_id):
             # 更新角色
             cursor.execute("UPDATE roles SET name = %s WHERE id = %s", (name, role_id))
             connection.commit()
+            rbac_index.put_role(role_id, name)
             
             return jsonify({
                 "success": True,
@@ -462,28 +1279,27 @@ def update_role(role_id):
             })
     except Exception as e:
         print(f"Database error: {e}")
-        if connection:
-            connection.rollback()
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/api/admin/roles/<int:role_id>', methods=['DELETE'])
 def delete_role(role_id):
     """删除角色"""
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查角色是否存在
             cursor.execute("SELECT id FROM roles WHERE id = %s", (role_id,))
             if not cursor.fetchone():
                 return jsonify({"success": False, "message": "角色不存在"}), 404
             
+            # 级联删除前记录受影响的用户
+            affected_users = usernames_by_role(cursor, role_id)
+
             # 删除角色（关联表会自动级联删除）
             cursor.execute("DELETE FROM roles WHERE id = %s", (role_id,))
             connection.commit()
+            rbac_index.remove_role(role_id)
+            table_counts.adjust('roles', -1)
+            invalidate_user_assistants(affected_users)
             
             return jsonify({
                 "success": True,
@@ -491,12 +1307,7 @@ def delete_role(role_id):
             })
     except Exception as e:
         print(f"Database error: {e}")
-        if connection:
-            connection.rollback()
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 
 # ==================== 权限管理 API ====================
@@ -504,10 +1315,19 @@ def delete_role(role_id):
 @app.route('/api/admin/roles/<int:role_id>/permissions', methods=['GET'])
 def get_role_permissions(role_id):
     """获取角色的应用权限（已授权的APP ID列表）"""
-    connection = None
+    if rbac_index.ready:
+        if not rbac_index.role_exists(role_id):
+            return jsonify({"success": False, "message": "角色不存在"}), 404
+        return jsonify({
+            "success": True,
+            "data": {
+                "role_id": role_id,
+                "authorized_app_ids": rbac_index.apps_for_role(role_id)
+            }
+        })
+
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 验证角色存在
             cursor.execute("SELECT id FROM roles WHERE id = %s", (role_id,))
             if not cursor.fetchone():
@@ -531,9 +1351,6 @@ def get_role_permissions(role_id):
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 
 @app.route('/api/admin/role_apps', methods=['POST'])
@@ -543,13 +1360,14 @@ def add_role_permission():
     if not data or not data.get('role_id') or not data.get('app_id'):
         return jsonify({"success": False, "message": "角色ID和应用ID不能为空"}), 400
     
-    role_id = data['role_id']
-    app_id = data['app_id']
-    connection = None
-    
+    # 先校验再写入：提交后才发现 id 无效会在已修改数据库后返回 500
+    try:
+        role_id = int(data['role_id'])
+        app_id = int(data['app_id'])
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "角色ID和应用ID必须是整数"}), 400
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查是否已存在
             cursor.execute(
                 "SELECT id FROM role_apps WHERE role_id = %s AND app_id = %s",
@@ -567,6 +1385,8 @@ def add_role_permission():
                 (role_id, app_id)
             )
             connection.commit()
+            rbac_index.grant(role_id, app_id)
+            invalidate_user_assistants(usernames_by_role(cursor, role_id))
             
             return jsonify({
                 "success": True,
@@ -574,12 +1394,7 @@ def add_role_permission():
             })
     except Exception as e:
         print(f"Database error: {e}")
-        if connection:
-            connection.rollback()
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 @app.route('/api/admin/role_apps', methods=['DELETE'])
 def remove_role_permission():
@@ -588,18 +1403,21 @@ def remove_role_permission():
     if not data or not data.get('role_id') or not data.get('app_id'):
         return jsonify({"success": False, "message": "角色ID和应用ID不能为空"}), 400
     
-    role_id = data['role_id']
-    app_id = data['app_id']
-    connection = None
-    
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        role_id = int(data['role_id'])
+        app_id = int(data['app_id'])
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "角色ID和应用ID必须是整数"}), 400
+    try:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             cursor.execute(
                 "DELETE FROM role_apps WHERE role_id = %s AND app_id = %s",
                 (role_id, app_id)
             )
             connection.commit()
+            if cursor.rowcount:
+                rbac_index.revoke(role_id, app_id)
+                invalidate_user_assistants(usernames_by_role(cursor, role_id))
             
             return jsonify({
                 "success": True,
@@ -607,64 +1425,210 @@ def remove_role_permission():
             })
     except Exception as e:
         print(f"Database error: {e}")
-        if connection:
-            connection.rollback()
         return jsonify({"success": False, "message": "数据库错误"}), 500
-    finally:
-        if connection:
-            connection.close()
 
 
 
+def parse_id_list(values):
+    """把请求中的 ID 列表转换为去重后的整数集合，格式不对时返回 None"""
+    if not isinstance(values, list):
+        return None
+    try:
+        return {int(v) for v in values}
+    except (TypeError, ValueError):
+        return None
+
+INSERT_ROLE_APPS_SQL = "INSERT IGNORE INTO role_apps (role_id, app_id) VALUES (%s, %s)"
+
+def insert_role_apps(cursor, pairs):
+    """多行 INSERT IGNORE，一次往返写入全部 (role_id, app_id)"""
+    if pairs:
+        cursor.executemany(INSERT_ROLE_APPS_SQL, sorted(pairs))
+
+def delete_role_apps_query(pairs):
+    """单条 DELETE ... IN 删除全部 (role_id, app_id)，返回 (sql, params)"""
+    pairs = sorted(pairs)
+    placeholders = ', '.join(['(%s, %s)'] * len(pairs))
+    return (f"DELETE FROM role_apps WHERE (role_id, app_id) IN ({placeholders})",
+            [v for pair in pairs for v in pair])
+
+def delete_role_apps(cursor, pairs):
+    if pairs:
+        cursor.execute(*delete_role_apps_query(pairs))
+
+@app.route('/api/admin/roles/<int:role_id>/permissions', methods=['PUT'])
+def set_role_permissions(role_id):
+    """按完整的应用ID列表设置角色授权，只增删有差异的部分"""
+    data = request.get_json()
+    app_ids = parse_id_list(data.get('app_ids')) if data else None
+    if app_ids is None:
+        return jsonify({"success": False, "message": "app_ids 必须是应用ID列表"}), 400
+
+    try:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            # 验证角色存在
+            cursor.execute("SELECT id FROM roles WHERE id = %s", (role_id,))
+            if not cursor.fetchone():
+                return jsonify({"success": False, "message": "角色不存在"}), 404
+
+            cursor.execute("SELECT app_id FROM role_apps WHERE role_id = %s", (role_id,))
+            existing = {r['app_id'] for r in cursor.fetchall()}
+
+            added = {(role_id, a) for a in app_ids - existing}
+            removed = {(role_id, a) for a in existing - app_ids}
+            if added or removed:
+                insert_role_apps(cursor, added)
+                delete_role_apps(cursor, removed)
+                connection.commit()
+                rbac_index.apply_role_apps(added, removed)
+                invalidate_user_assistants(usernames_by_role(cursor, role_id))
+
+            return jsonify({
+                "success": True,
+                "message": "授权更新成功",
+                "data": {
+                    "role_id": role_id,
+                    "added": sorted(a for _, a in added),
+                    "removed": sorted(a for _, a in removed)
+                }
+            })
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "数据库错误"}), 500
+
+@app.route('/api/admin/role_apps/batch', methods=['POST'])
+def batch_role_permissions():
+    """
+    批量授权 / 取消授权，在一个事务中完成
+    请求体: {"grant": [{"role_id": 1, "app_id": 2}, ...], "revoke": [...]}
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"success": False, "message": "请求数据不能为空"}), 400
+
+    try:
+        grant = {(int(p['role_id']), int(p['app_id'])) for p in data.get('grant', [])}
+        revoke = {(int(p['role_id']), int(p['app_id'])) for p in data.get('revoke', [])}
+    except (TypeError, ValueError, KeyError):
+        return jsonify({"success": False, "message": "grant / revoke 必须是 role_id 和 app_id 组成的列表"}), 400
+    if grant & revoke:
+        return jsonify({"success": False, "message": "同一授权不能同时添加和取消"}), 400
+
+    role_ids = {r for r, _ in grant | revoke}
+    if not role_ids:
+        return jsonify({"success": True, "message": "没有需要更新的授权", "data": {"added": [], "removed": []}})
+
+    try:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            # 一次查出涉及角色的现有授权，计算实际需要增删的部分
+            placeholders = ', '.join(['%s'] * len(role_ids))
+            cursor.execute(
+                f"SELECT role_id, app_id FROM role_apps WHERE role_id IN ({placeholders})",
+                sorted(role_ids)
+            )
+            existing = {(r['role_id'], r['app_id']) for r in cursor.fetchall()}
+
+            added = grant - existing
+            removed = revoke & existing
+            if added or removed:
+                insert_role_apps(cursor, added)
+                delete_role_apps(cursor, removed)
+                connection.commit()
+                rbac_index.apply_role_apps(added, removed)
+                invalidate_user_assistants(usernames_by_roles(cursor, {r for r, _ in added | removed}))
+
+            return jsonify({
+                "success": True,
+                "message": "批量授权更新成功",
+                "data": {
+                    "added": [{"role_id": r, "app_id": a} for r, a in sorted(added)],
+                    "removed": [{"role_id": r, "app_id": a} for r, a in sorted(removed)]
+                }
+            })
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "数据库错误"}), 500
+
+
 # 获取用户角色
 @app.route('/api/admin/users/<int:user_id>/roles', methods=['GET'])
 def get_user_roles(user_id):
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            sql = """
-                SELECT r.id, r.name 
-                FROM roles r
-                INNER JOIN user_roles ur ON r.id = ur.role_id
-                WHERE ur.user_id = %s
-            """
-            cursor.execute(sql, (user_id,))
-            roles = cursor.fetchall()
-            return jsonify({'success': True, 'data': {'roles': roles}})
-    finally:
-        connection.close()
+    if rbac_index.ready:
+        return jsonify({'success': True, 'data': {'roles': rbac_index.roles_for_user(user_id)}})
+
+    with db_pool.connection() as connection, connection.cursor() as cursor:
+        sql = """
+            SELECT r.id, r.name 
+            FROM roles r
+            INNER JOIN user_roles ur ON r.id = ur.role_id
+            WHERE ur.user_id = %s
+        """
+        cursor.execute(sql, (user_id,))
+        roles = cursor.fetchall()
+        return jsonify({'success': True, 'data': {'roles': roles}})
+
+INSERT_USER_ROLES_SQL = "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)"
+
+def insert_user_roles(cursor, user_id, role_ids):
+    """多行 INSERT，一次往返写入用户的全部新角色"""
+    if role_ids:
+        cursor.executemany(INSERT_USER_ROLES_SQL, [(user_id, role_id) for role_id in sorted(role_ids)])
+
+def delete_user_roles_query(user_id, role_ids):
+    role_ids = sorted(role_ids)
+    placeholders = ', '.join(['%s'] * len(role_ids))
+    return (f"DELETE FROM user_roles WHERE user_id = %s AND role_id IN ({placeholders})",
+            [user_id] + role_ids)
+
+def delete_user_roles(cursor, user_id, role_ids):
+    if role_ids:
+        cursor.execute(*delete_user_roles_query(user_id, role_ids))
 
 # 更新用户角色（批量）
 @app.route('/api/admin/users/<int:user_id>/roles', methods=['PUT'])
 def update_user_roles(user_id):
+    """只增删与现有角色不同的部分，角色未变化时只需一次查询"""
     data = request.get_json()
-    role_ids = data.get('role_ids', [])
+    role_ids = parse_id_list(data.get('role_ids', [])) if data else None
+    if role_ids is None:
+        return jsonify({'success': False, 'message': 'role_ids 必须是角色ID列表'}), 400
     
-    connection = get_db_connection()
     try:
-        with connection.cursor() as cursor:
-            # 验证用户存在
-            cursor.execute("SELECT id FROM Login_users WHERE id = %s", (user_id,))
-            if not cursor.fetchone():
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            # 一次查询同时验证用户存在并取出现有角色
+            cursor.execute(
+                """
+                SELECT u.username, ur.role_id
+                FROM Login_users u
+                LEFT JOIN user_roles ur ON u.id = ur.user_id
+                WHERE u.id = %s
+                """,
+                (user_id,)
+            )
+            rows = cursor.fetchall()
+            if not rows:
                 return jsonify({'success': False, 'message': '用户不存在'}), 404
+
+            existing = {r['role_id'] for r in rows if r['role_id'] is not None}
+            added = role_ids - existing
+            removed = existing - role_ids
             
-            # 删除旧的角色关联
-            cursor.execute("DELETE FROM user_roles WHERE user_id = %s", (user_id,))
-            
-            # 插入新的角色关联
-            for role_id in role_ids:
-                cursor.execute(
-                    "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
-                    (user_id, role_id)
-                )
-            
-            connection.commit()
-            return jsonify({'success': True, 'message': '角色更新成功'})
+            if added or removed:
+                delete_user_roles(cursor, user_id, removed)
+                insert_user_roles(cursor, user_id, added)
+                connection.commit()
+                rbac_index.set_user_roles(user_id, role_ids)
+                invalidate_user_assistants([rows[0]['username']])
+
+            return jsonify({
+                'success': True,
+                'message': '角色更新成功',
+                'data': {'added': sorted(added), 'removed': sorted(removed)}
+            })
     except Exception as e:
-        connection.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        connection.close()
+
+USER_EXISTS_SQL = "SELECT id FROM Login_users WHERE username = %s OR email = %s"
 
 # 修改创建用户接口，支持角色分配
 @app.route('/api/admin/users', methods=['POST'])
@@ -674,24 +1638,30 @@ def create_user():
     real_name = data.get('real_name')
     email = data.get('email')
     password = data.get('password', 'DefaultPassword123!')
-    role_ids = data.get('role_ids', [])
+    role_ids = parse_id_list(data.get('role_ids', []))
     
     if not all([username, real_name, email]):
         return jsonify({'success': False, 'message': '必填字段不能为空'}), 400
+    if role_ids is None:
+        return jsonify({'success': False, 'message': 'role_ids 必须是角色ID列表'}), 400
     
-    connection = get_db_connection()
     try:
-        with connection.cursor() as cursor:
-            # 检查用户名/邮箱是否存在
-            cursor.execute(
-                "SELECT id FROM Login_users WHERE username = %s OR email = %s",
-                (username, email)
-            )
+        # 先检查用户名/邮箱是否存在，重复提交不必计算哈希、占用哈希队列
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(USER_EXISTS_SQL, (username, email))
+            if cursor.fetchone():
+                return jsonify({'success': False, 'message': '用户名或邮箱已存在'}), 400
+
+        # 哈希计算在进程池中执行，不占用数据库连接
+        password_hash = hash_password(password)
+
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            # 哈希计算期间可能已有相同用户名/邮箱的用户被创建，插入前再检查一次
+            cursor.execute(USER_EXISTS_SQL, (username, email))
             if cursor.fetchone():
                 return jsonify({'success': False, 'message': '用户名或邮箱已存在'}), 400
             
             # 创建用户
-            password_hash = generate_password_hash(password)
             cursor.execute(
                 "INSERT INTO Login_users (username, real_name, email, password_hash) VALUES (%s, %s, %s, %s)",
                 (username, real_name, email, password_hash)
@@ -699,23 +1669,74 @@ def create_user():
             user_id = cursor.lastrowid
             
             # 分配角色
-            for role_id in role_ids:
-                cursor.execute(
-                    "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
-                    (user_id, role_id)
-                )
+            insert_user_roles(cursor, user_id, role_ids)
             
             connection.commit()
+            rbac_index.put_user(user_id, username, role_ids)
+            table_counts.adjust('Login_users', 1)
+            invalidate_user_assistants([username])
             return jsonify({
                 'success': True,
                 'message': '创建成功',
-                'data': {'id': user_id, 'username': username}
+                'data': {'id': user_id, 'username': username, 'role_ids': sorted(role_ids)}
             }), 201
+    except HashingBusy:
+        return busy_response()
     except Exception as e:
-        connection.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        connection.close()
+
+
+@app.route('/api/admin/users/import', methods=['POST'])
+def import_users():
+    """
+    批量导入用户，请求体为 CSV 或 JSONL（?format=csv|jsonl，缺省时按 Content-Type 判断）
+    返回每一行的导入结果
+    """
+    fmt = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'format 只支持 csv 或 jsonl'}), 400
+
+    try:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM roles")
+            valid_role_ids = {r['id'] for r in cursor.fetchall()}
+    except pymysql.MySQLError as e:
+        print(f"Database error: {e}")
+        return jsonify({'success': False, 'message': '数据库错误'}), 500
+
+    importer = UserImporter(
+        db_pool.connection,
+        hash_passwords,
+        valid_role_ids,
+        batch_size=int(os.getenv('user_import_batch_size', 500)),
+    )
+    format_error = None
+    try:
+        importer.run(iter_rows(request.stream, fmt))
+    except UnicodeDecodeError:
+        format_error = '请求体必须是 UTF-8 编码'
+    except csv.Error as e:
+        format_error = f'CSV 格式错误: {e}'
+
+    # 出错前已提交的批次同样要更新索引和计数
+    for user_id, username, role_ids in importer.created:
+        rbac_index.put_user(user_id, username, role_ids)
+    table_counts.adjust('Login_users', len(importer.created))
+    invalidate_user_assistants([username for _, username, _ in importer.created])
+
+    results = importer.results
+    summary = {'created': 0, 'skipped': 0, 'error': 0}
+    for r in results:
+        summary[r['status']] += 1
+    data = {'summary': summary, 'results': results}
+    if format_error is not None:
+        # 解析到出错位置为止：之前的批次已导入，之后的行未处理
+        return jsonify({'success': False, 'message': format_error, 'data': data}), 400
+    return jsonify({
+        'success': True,
+        'message': '导入完成',
+        'data': data
+    })
 
 
 @app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
@@ -735,12 +1756,10 @@ def update_user(user_id):
     if not updates:
         return jsonify({'success': False, 'message': '没有提供有效的更新字段'}), 400
 
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查用户是否存在
-            check_sql = "SELECT id FROM Login_users WHERE id = %s"
+            check_sql = "SELECT id, username FROM Login_users WHERE id = %s"
             cursor.execute(check_sql, (user_id,))
             existing_user = cursor.fetchone()
             if not existing_user:
@@ -771,15 +1790,17 @@ def update_user(user_id):
             if cursor.rowcount == 0:
                 return jsonify({'success': False, 'message': '用户未找到或未更新'}), 404
 
+            if 'username' in updates:
+                rbac_index.put_user(user_id, updates['username'])
+
+            # 用户名是缓存 key，改名后新旧用户名都需要失效
+            invalidate_user_assistants({existing_user['username'], updates.get('username', existing_user['username'])})
+
             return jsonify({'success': True, 'message': '用户信息更新成功'})
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
-        connection.rollback()
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 # 删除用户
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
@@ -787,12 +1808,10 @@ def delete_user(user_id):
     """
     删除用户
     """
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查用户是否存在
-            check_sql = "SELECT id FROM Login_users WHERE id = %s"
+            check_sql = "SELECT id, username FROM Login_users WHERE id = %s"
             cursor.execute(check_sql, (user_id,))
             existing_user = cursor.fetchone()
             if not existing_user:
@@ -802,6 +1821,9 @@ def delete_user(user_id):
             delete_sql = "DELETE FROM Login_users WHERE id = %s"
             cursor.execute(delete_sql, (user_id,))
             connection.commit()
+            rbac_index.remove_user(user_id)
+            table_counts.adjust('Login_users', -cursor.rowcount)
+            invalidate_user_assistants([existing_user['username']])
 
             if cursor.rowcount == 0:
                 return jsonify({'success': False, 'message': '删除失败'}), 400
@@ -810,30 +1832,79 @@ def delete_user(user_id):
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
-        connection.rollback()
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 # app.py 或 api.py (在之前的代码基础上添加)
 
+@app.route('/api/admin/export/<kind>', methods=['GET'])
+def export_data(kind):
+    """
+    流式导出 users（含角色）/ roles / assistants，?format=ndjson|csv
+    客户端接受 gzip 时返回压缩内容
+    """
+    if kind not in EXPORTS:
+        return jsonify({'success': False, 'message': '不支持的导出类型'}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'format 只支持 ndjson 或 csv'}), 400
+
+    use_gzip = 'gzip' in request.accept_encodings
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    response = Response(
+        stream_export(db_pool.connection, kind, fmt, gzip=use_gzip),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 # 获取助手列表
 @app.route('/api/admin/assistants', methods=['GET'])
 def get_assistants():
     """
     查询助手列表 (支持分页)
+    默认按页码分页；传 cursor 时按 (created_at, id) 游标分页
     """
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = max(1, request.args.get('per_page', 10, type=int))
 
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # 计算总数
-            count_sql = "SELECT COUNT(*) as total FROM assistant_info"
-            cursor.execute(count_sql)
-            total_count = cursor.fetchone()['total']
+        with db_pool.connection() as connection, connection.cursor() as cursor:
+            if cursor_pagination_requested():
+                try:
+                    direction, key_values, had_cursor = parse_cursor_arg('assistants', 2)
+                except InvalidCursor:
+                    return jsonify({'success': False, 'message': '无效的分页游标'}), 400
+
+                where_sql, params, order_sql = seek_clause(['created_at', 'id'], key_values, direction,
+                                                           nullable=NULLABLE_SORT_KEYS)
+                cursor.execute(
+                    f"""
+                    SELECT id, ASSISTANT_ID, name, description, icon_url, in_use, created_at
+                    FROM assistant_info
+                    WHERE {where_sql}
+                    ORDER BY {order_sql}
+                    LIMIT %s
+                    """,
+                    params + [per_page + 1]
+                )
+                assistants, pagination = build_page(
+                    cursor.fetchall(), per_page, 'assistants', direction, had_cursor,
+                    key=lambda r: [r['created_at'], r['id']]
+                )
+                pagination['total_estimate'] = table_counts.estimate('assistant_info')
+                return jsonify({
+                    'success': True,
+                    'data': {
+                        'assistants': assistants,
+                        'pagination': pagination
+                    }
+                }), 200
+
+            # 总数（默认使用缓存的估算值）
+            total_count, is_exact = table_counts.total(cursor, 'assistant_info', exact=exact_count_requested())
 
             offset = (page - 1) * per_page
 
@@ -841,33 +1912,23 @@ def get_assistants():
             sql = """
             SELECT id, ASSISTANT_ID, name, description, icon_url, in_use, created_at
             FROM assistant_info
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, id DESC
             LIMIT %s OFFSET %s
             """
             cursor.execute(sql, (per_page, offset))
             assistants = cursor.fetchall()
 
-            total_pages = (total_count + per_page - 1) // per_page
-
             return jsonify({
                 'success': True,
                 'data': {
                     'assistants': assistants,
-                    'pagination': {
-                        'current_page': page,
-                        'per_page': per_page,
-                        'total': total_count,
-                        'pages': total_pages
-                    }
+                    'pagination': page_pagination(page, per_page, total_count, is_exact)
                 }
             }), 200
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 # 创建助手
 @app.route('/api/admin/assistants', methods=['POST'])
@@ -886,10 +1947,8 @@ def create_assistant():
     icon_url = data.get('icon_url')
     in_use = data.get('in_use', 'active') # 默认设置为 active
 
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查 ASSISTANT_ID 是否已存在
             check_sql = "SELECT id FROM assistant_info WHERE ASSISTANT_ID = %s"
             cursor.execute(check_sql, (assistant_id,))
@@ -906,6 +1965,15 @@ def create_assistant():
             connection.commit()
 
             assistant_id_inserted = cursor.lastrowid
+            rbac_index.put_assistant({
+                'id': assistant_id_inserted,
+                'ASSISTANT_ID': assistant_id,
+                'name': name,
+                'description': description,
+                'icon_url': icon_url,
+                'in_use': in_use
+            })
+            table_counts.adjust('assistant_info', 1)
 
             return jsonify({
                 'success': True,
@@ -917,17 +1985,13 @@ def create_assistant():
                     'description': description,
                     'icon_url': icon_url,
                     'in_use': in_use,
-                    'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    'created_at': datetime.now()
                 }
             }), 201
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
-        connection.rollback()
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 # 修改助手信息
 @app.route('/api/admin/assistants/<int:assistant_id>', methods=['PUT'])
@@ -947,10 +2011,8 @@ def update_assistant(assistant_id):
     if not updates:
         return jsonify({'success': False, 'message': '没有提供有效的更新字段'}), 400
 
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查助手是否存在
             check_sql = "SELECT id FROM assistant_info WHERE id = %s"
             cursor.execute(check_sql, (assistant_id,))
@@ -977,15 +2039,20 @@ def update_assistant(assistant_id):
             if cursor.rowcount == 0:
                 return jsonify({'success': False, 'message': '助手未找到或未更新'}), 404
 
+            cursor.execute(
+                "SELECT id, ASSISTANT_ID, name, description, icon_url, in_use FROM assistant_info WHERE id = %s",
+                (assistant_id,)
+            )
+            row = cursor.fetchone()
+            if row:
+                rbac_index.put_assistant(row)
+            invalidate_user_assistants(usernames_by_app(cursor, assistant_id))
+
             return jsonify({'success': True, 'message': '助手信息更新成功'})
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
-        connection.rollback()
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 
 
@@ -995,10 +2062,8 @@ def delete_assistant(assistant_id):
     """
     删除助手
     """
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with db_pool.connection() as connection, connection.cursor() as cursor:
             # 检查助手是否存在
             check_sql = "SELECT id FROM assistant_info WHERE id = %s"
             cursor.execute(check_sql, (assistant_id,))
@@ -1006,10 +2071,16 @@ def delete_assistant(assistant_id):
             if not existing_assistant:
                 return jsonify({'success': False, 'message': '助手不存在'}), 404
 
+            # 级联删除前记录受影响的用户
+            affected_users = usernames_by_app(cursor, assistant_id)
+
             # 删除助手
             delete_sql = "DELETE FROM assistant_info WHERE id = %s"
             cursor.execute(delete_sql, (assistant_id,))
             connection.commit()
+            rbac_index.remove_assistant(assistant_id)
+            table_counts.adjust('assistant_info', -cursor.rowcount)
+            invalidate_user_assistants(affected_users)
 
             if cursor.rowcount == 0:
                 return jsonify({'success': False, 'message': '删除失败'}), 400
@@ -1018,16 +2089,13 @@ def delete_assistant(assistant_id):
 
     except pymysql.MySQLError as e:
         print(f"Database error: {e}")
-        connection.rollback()
         return jsonify({'success': False, 'message': '数据库错误'}), 500
-    finally:
-        if connection:
-            connection.close()
 
 # 注意：确保在文件顶部已经导入了 datetime
 # from datetime import datetime
 
 if __name__ == '__main__':
+    # 开发服务器；生产环境使用 python serve.py（多进程 gunicorn）
     print(f"临时文件将被存储在: {UPLOAD_FOLDER}")
     print("CORS is enabled for /upload and /files/* routes.")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=os.getenv('flask_debug', '1') == '1', host='0.0.0.0', port=5000)
\ No newline at end of file
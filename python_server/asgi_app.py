@@ -0,0 +1,1146 @@
+"""
+ASGI 入口（Starlette + aiomysql）
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+    python asgi_app.py                   # 同上，参数读取 server_bind / server_workers
+
+I/O 密集的接口在事件循环中以协程处理，等待数据库或文件时不占用线程：
+- /api/login、/api/reset-password：aiomysql 连接池查询，准入排队在事件循环中等待，
+  密码哈希仍在 hashing 的进程池中计算
+- /api/user_assistants：命中 token / 缓存 / RBAC 索引时不访问数据库，否则 aiomysql 查询
+- /api/admin 下用户、角色、授权、助手的增删改查：aiomysql 查询，写操作在显式事务中执行
+- /upload：multipart 解析与写入存储均不阻塞事件循环
+- GET / DELETE /files/<filename>：文件以异步方式分块读取发送，支持 Range、ETag 304
+
+请求与 SQL 指标和 Flask 路由记录在同一个 app.metrics 中，/metrics 由 Flask 应用输出。
+
+其余接口（分块 / 批量上传、缩略图、用户导入、导出、/metrics、/api/admin/stats 等）由同一进程内的
+Flask 应用处理，二者共享 RBAC 索引、缓存、JWT 缓存、文件存储和表计数，
+URL 与 JSON 格式与 app.py 完全一致，前端 py-api 代理无需改动。
+
+数据库连接参数与 app.py 相同（mysql_host / mysql_port / mysql_user / mysql_pwd / db_name），
+指向本地的 MySQL 兼容服务（MariaDB、TiDB 等）即可测试，表结构见 bench/schema.sql。
+"""
+import os
+import time
+from datetime import datetime
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import aiomysql
+import jwt
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route, Router
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # 可选依赖：未安装时使用 Starlette 自带的实现
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+try:
+    import uvicorn
+except ImportError:  # 可选依赖：也可以用 hypercorn 等其他 ASGI 服务器运行
+    uvicorn = None
+
+import app as wsgi
+from admission import AsyncAdmissionLimiter, Overloaded
+from cache import MISSING
+from pagination import InvalidCursor, build_page, seek_clause
+from hashing import HashingBusy, hash_password, needs_rehash, verify_password
+from json_provider import dumps_bytes
+from serve import share_hash_workers
+
+db = None  # aiomysql 连接池，在 lifespan 中创建
+routes = []
+path_methods = {}  # 路径 -> 已注册的方法，用于预检响应
+# 当前请求的路由函数名，用作指标的 endpoint 标签
+current_endpoint = ContextVar('current_endpoint', default='background')
+
+
+# --- 数据库 ---
+async def create_db_pool():
+    settings = wsgi.db_settings()
+    settings['db'] = settings.pop('database')
+    return await aiomysql.create_pool(
+        **settings,
+        minsize=int(os.getenv('async_db_pool_min_size', 1)),
+        maxsize=int(os.getenv('async_db_pool_max_size', 50)),
+        pool_recycle=int(os.getenv('db_pool_max_lifetime', 3600)),
+        # 只读查询不必显式提交，连接归还时也不会留下未结束的事务
+        autocommit=True,
+    )
+
+class TimedCursor:
+    """包装 aiomysql 游标，execute / executemany 记录耗时和行数，指标与 app.InstrumentedCursor 相同"""
+    __slots__ = ('_cursor',)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def _timed(self, method, sql, args):
+        started = time.perf_counter()
+        try:
+            return await method(sql, args)
+        finally:
+            labels = (current_endpoint.get(), wsgi.query_name(sql))
+            wsgi.db_query_duration.observe(labels, time.perf_counter() - started)
+            if self._cursor.rowcount and self._cursor.rowcount > 0:
+                wsgi.db_query_rows.inc(labels, self._cursor.rowcount)
+
+    async def execute(self, sql, args=()):
+        return await self._timed(self._cursor.execute, sql, args)
+
+    async def executemany(self, sql, args):
+        return await self._timed(self._cursor.executemany, sql, args)
+
+    async def fetchone(self):
+        return await self._cursor.fetchone()
+
+    async def fetchall(self):
+        return await self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+@asynccontextmanager
+async def transaction():
+    """
+    async with transaction() as (connection, cursor): ...
+    显式开启事务，与 Flask 版本一样由调用方 commit；未提交或出错时回滚
+    """
+    async with db.acquire() as connection:
+        await connection.begin()
+        try:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                yield connection, TimedCursor(cursor)
+        finally:
+            # 连接池不接收仍处于事务中的连接
+            if connection.get_transaction_status():
+                try:
+                    await connection.rollback()
+                except aiomysql.MySQLError:
+                    connection.close()
+
+async def fetchone(sql, args=()):
+    async with db.acquire() as connection, connection.cursor(aiomysql.DictCursor) as cursor:
+        cursor = TimedCursor(cursor)
+        await cursor.execute(sql, args)
+        return await cursor.fetchone()
+
+async def fetchall(sql, args=()):
+    async with db.acquire() as connection, connection.cursor(aiomysql.DictCursor) as cursor:
+        cursor = TimedCursor(cursor)
+        await cursor.execute(sql, args)
+        return await cursor.fetchall()
+
+async def execute(sql, args=()):
+    async with db.acquire() as connection, connection.cursor() as cursor:
+        cursor = TimedCursor(cursor)
+        await cursor.execute(sql, args)
+        return cursor.rowcount
+
+
+# --- 响应与路由 ---
+def json_response(obj, status=200, headers=None):
+    return Response(dumps_bytes(obj), status_code=status, headers=headers, media_type='application/json')
+
+def busy_response(retry_after=1):
+    return json_response({'message': 'Server busy, please retry later'}, 503, {'Retry-After': str(retry_after)})
+
+def preflight_response(request, methods):
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': ', '.join(sorted(methods)),
+        'Access-Control-Max-Age': '600',
+    }
+    requested_headers = request.headers.get('access-control-request-headers')
+    if requested_headers:
+        headers['Access-Control-Allow-Headers'] = requested_headers
+    return Response(status_code=204, headers=headers)
+
+def route(path, methods):
+    """
+    注册异步路由；与 app.py 中的 CORS 配置一致，允许所有来源，并记录与 Flask 路由相同的请求指标。
+    同一路径按方法分别注册时，预检请求由第一个路由响应，返回该路径上的全部方法
+    """
+    path_methods.setdefault(path, set()).update(methods)
+
+    def decorator(endpoint):
+        name = endpoint.__name__
+
+        async def handle(request):
+            if request.method == 'OPTIONS':
+                return preflight_response(request, path_methods[path])
+            started = time.perf_counter()
+            current_endpoint.set(name)
+            wsgi.http_requests_in_flight.inc((name,))
+            try:
+                response = await endpoint(request)
+            finally:
+                wsgi.http_requests_in_flight.dec((name,))
+            wsgi.http_request_duration.observe(
+                (name, request.method, str(response.status_code)), time.perf_counter() - started
+            )
+            response.headers.setdefault('Access-Control-Allow-Origin', '*')
+            return response
+        routes.append(Route(path, handle, methods=[*methods, 'OPTIONS']))
+        return endpoint
+    return decorator
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+def async_limiter(name):
+    """
+    与 app.admission_limiters 中同名的限制器参数相同，排队的请求在事件循环中等待，不占用线程池。
+    替换进 app.admission_limiters，/api/admin/stats 和 /metrics 中的准入统计即为异步接口的数据
+    """
+    limiter = wsgi.admission_limiters[name]
+    async_version = AsyncAdmissionLimiter(name, limiter.max_concurrent, limiter.max_queue, limiter.queue_timeout)
+    wsgi.admission_limiters[name] = async_version
+    return async_version
+
+admission_limiters = {name: async_limiter(name) for name in ('login', 'reset_password')}
+
+def admitted(name):
+    """async with admitted('login'): ...，与 app.admission_controlled 相同，被拒绝时抛出 Overloaded"""
+    return admission_limiters[name].slot()
+
+
+# --- 登录 ---
+async def upgrade_password_hash(user_id, password):
+    """登录成功且存储的哈希参数已过时，用当前配置重新计算（失败不影响登录）"""
+    try:
+        new_password_hash = await run_in_threadpool(hash_password, password)
+        await execute("UPDATE Login_users SET password_hash = %s WHERE id = %s", (new_password_hash, user_id))
+    except Exception as e:
+        print(f"Rehash error: {e}")
+
+async def load_user_permissions(user_id):
+    """返回 (roles, app_ids, assistants)；索引就绪时不访问数据库"""
+    if wsgi.rbac_index.ready:
+        return wsgi.load_user_permissions(user_id)
+    roles = [{'id': r['id'], 'name': r['name']} for r in await fetchall(wsgi.USER_ROLES_SQL, (user_id,))]
+    rows = await fetchall(wsgi.USER_APPS_SQL, (user_id,))
+    return roles, [row['id'] for row in rows], wsgi.format_assistant_rows(rows)
+
+@route('/api/login', ['POST'])
+async def login(request):
+    data = await read_json(request)
+    if not data or not data.get('username') or not data.get('password'):
+        return json_response({'message': 'Invalid request'}, 400)
+
+    try:
+        async with admitted('login'):
+            user = await fetchone(wsgi.LOGIN_USER_SQL, (data['username'],))
+            # 等待进程池的结果会阻塞，放到线程中进行
+            if not user or not await run_in_threadpool(verify_password, user['password_hash'], data['password']):
+                return json_response({'message': 'Invalid username or password'}, 401)
+            if await run_in_threadpool(needs_rehash, user['password_hash']):
+                await upgrade_password_hash(user['id'], data['password'])
+
+            permissions = rbac_version = generation = None
+            if request.query_params.get('embed') == 'permissions':
+                generation = wsgi.rbac_index.generation
+                rbac_version = wsgi.rbac_index.version
+                permissions = await load_user_permissions(user['id'])
+            return json_response(wsgi.login_result(user, permissions, rbac_version, generation))
+    except Overloaded as e:
+        return busy_response(e.retry_after)
+    except HashingBusy:
+        return busy_response()
+    except Exception as e:
+        print(f"Login error: {e}")
+        return json_response({'message': 'Internal server error'}, 500)
+
+@route('/api/reset-password', ['POST'])
+async def reset_password(request):
+    data = await read_json(request)
+    if not data or not data.get('username') or not data.get('email') or not data.get('new_password'):
+        return json_response({'message': 'Missing required fields'}, 400)
+
+    try:
+        async with admitted('reset_password'):
+            user = await fetchone(
+                "SELECT id FROM Login_users WHERE username = %s AND email = %s",
+                (data['username'], data['email'])
+            )
+            if not user:
+                return json_response({'message': 'Username and email do not match'}, 404)
+            new_password_hash = await run_in_threadpool(hash_password, data['new_password'])
+            await execute("UPDATE Login_users SET password_hash = %s WHERE id = %s", (new_password_hash, user['id']))
+            return json_response({'message': 'Password reset successful'})
+    except Overloaded as e:
+        return busy_response(e.retry_after)
+    except HashingBusy:
+        return busy_response()
+    except Exception as e:
+        print(f"Reset password error: {e}")
+        return json_response({'message': 'Internal server error'}, 500)
+
+
+# --- 用户可用助手 ---
+@route('/api/user_assistants', ['GET'])
+async def get_user_assistants(request):
+    user_id = request.query_params.get('user_id')
+    if not user_id:
+        return json_response({'error': 'Missing user_id parameter'}, 400)
+
+    rbac_index = wsgi.rbac_index
+    auth_header = request.headers.get('authorization', '')
+    if auth_header.startswith('Bearer ') and rbac_index.ready:
+        try:
+            claims = wsgi.jwt_cache.decode(auth_header.split(" ")[1])
+        except jwt.InvalidTokenError:
+            claims = None
+        if claims and claims.get('username') == user_id:
+            rbac = wsgi.token_permissions(claims)
+            if rbac is not None:
+                return json_response({'assistants': rbac_index.assistants_for_apps(rbac['apps'])})
+
+    generation = rbac_index.generation
+    cached = wsgi.cached_user_assistants(user_id, generation)
+    if cached is not MISSING:
+        return json_response({'assistants': cached})
+
+    # 索引未就绪，或用户名只在数据库排序规则下才能匹配（如重音差异）时查询数据库
+    assistants_list = rbac_index.assistants_for_username(user_id) if rbac_index.ready else MISSING
+    if assistants_list is MISSING:
+        try:
+            assistants_list = wsgi.format_assistant_rows(await fetchall(wsgi.USERNAME_ASSISTANTS_SQL, (user_id,)))
+        except aiomysql.MySQLError as e:
+            print(f"Database error: {e}")
+            return json_response({'error': 'Internal server error'}, 500)
+    wsgi.store_user_assistants(user_id, assistants_list, generation)
+    return json_response({'assistants': assistants_list})
+
+
+# --- 上传 / 下载 ---
+@route('/upload', ['POST'])
+async def upload_file(request):
+    started = time.perf_counter()
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > wsgi.MAX_CONTENT_LENGTH:
+        return json_response({'error': '文件过大'}, 413)
+
+    # 较大的文件由 Starlette 暂存到磁盘临时文件，写入在线程中进行
+    form = await request.form(max_files=1)
+    try:
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return json_response({'error': '没有找到名为 "file" 的字段'}, 400)
+        if not file.filename:
+            return json_response({'error': '未选择文件'}, 400)
+
+        filename, file_size_bytes, deduplicated, ref_token = await run_in_threadpool(
+            wsgi.content_store.ingest, file.file, wsgi.get_file_ext(file.filename)
+        )
+    finally:
+        await form.close()
+    wsgi.record_upload('upload_file', file_size_bytes, time.perf_counter() - started)
+    if not deduplicated:
+        wsgi.thumbnails.enqueue(filename)
+    return json_response(
+        wsgi.uploaded_file_info(file.filename, filename, file_size_bytes, deduplicated, ref_token), 201
+    )
+
+def valid_filename(filename):
+    return not ('..' in filename or '/' in filename or '\\' in filename)
+
+@route('/files/{filename}', ['GET'])
+async def download_file(request):
+    filename = request.path_params['filename']
+    if not valid_filename(filename):
+        return json_response({'error': 'Not Found'}, 404)
+    # FileResponse 在线程中分块读取文件并按 Range 返回 206
+    store_path = wsgi.content_store.path(filename)
+    if os.path.isfile(store_path):
+        wsgi.content_store.touch(filename)
+        # 文件名即内容哈希，直接用作强 ETag
+        etag = f'"{os.path.splitext(filename)[0]}"'
+        headers = {'ETag': etag, 'Cache-Control': wsgi.FILES_CACHE_CONTROL}
+        if_none_match = request.headers.get('if-none-match', '')
+        if if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]:
+            return Response(status_code=304, headers=headers)
+        return FileResponse(store_path, headers=headers, media_type=wsgi.get_file_mime_type(filename))
+
+    # 兼容改为内容寻址存储之前上传的随机文件名：可缓存，但每次需用 ETag 重新验证
+    legacy_path = os.path.join(wsgi.UPLOAD_FOLDER, filename)
+    if not os.path.isfile(legacy_path):
+        return json_response({'error': 'Not Found'}, 404)
+    return FileResponse(legacy_path, headers={'Cache-Control': 'public, no-cache'},
+                        media_type=wsgi.get_file_mime_type(filename))
+
+
+@route('/files/{filename}', ['DELETE'])
+async def release_file(request):
+    """释放 X-File-Token 对应的一次引用，最后一个引用释放时删除文件"""
+    filename = request.path_params['filename']
+    ref_token = request.headers.get('x-file-token')
+    if not ref_token:
+        return json_response({'error': '缺少 X-File-Token'}, 401)
+    remaining = await run_in_threadpool(wsgi.content_store.release, filename, ref_token)
+    if remaining is None:
+        return json_response({'error': '文件或引用不存在'}, 404)
+    return json_response({'filename': filename, 'references': remaining})
+
+
+# --- 管理端增删改查 ---
+# 与 app.py 中的同名接口一一对应，SQL 构造与缓存 / RBAC 索引的维护方式相同；
+# 导入和导出为批量 / 流式处理，仍由 Flask 应用处理
+@asynccontextmanager
+async def db_cursor():
+    """只读查询：从连接池取一个连接的游标（autocommit，无需提交）"""
+    async with db.acquire() as connection, connection.cursor(aiomysql.DictCursor) as cursor:
+        yield TimedCursor(cursor)
+
+def db_error(e):
+    print(f"Database error: {e}")
+    return json_response({'success': False, 'message': '数据库错误'}, 500)
+
+def int_arg(request, name, default):
+    """与 Flask 的 request.args.get(name, default, type=int) 相同，无法转换时返回默认值"""
+    try:
+        return int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+async def table_total(cursor, table, exact):
+    """与 app.table_counts.total 相同，返回 (total, is_exact)"""
+    if not exact:
+        total = wsgi.table_counts.cached(table)
+        if total is not None:
+            return total, False
+    await cursor.execute(wsgi.table_counts.count_sql(table))
+    total = (await cursor.fetchone())['total']
+    wsgi.table_counts.record(table, total)
+    return total, True
+
+async def usernames_by_roles(cursor, role_ids):
+    query = wsgi.usernames_by_roles_query(role_ids)
+    if query is None:
+        return []
+    await cursor.execute(*query)
+    return [r['username'] for r in await cursor.fetchall()]
+
+async def usernames_by_app(cursor, app_id):
+    await cursor.execute(wsgi.USERNAMES_BY_APP_SQL, (app_id,))
+    return [r['username'] for r in await cursor.fetchall()]
+
+async def role_exists(cursor, role_id):
+    await cursor.execute("SELECT id FROM roles WHERE id = %s", (role_id,))
+    return await cursor.fetchone() is not None
+
+@route('/api/admin/users', ['GET'])
+async def get_users(request):
+    """用户列表，默认按页码分页；传 cursor 时按 (created_at, id) 游标分页"""
+    args = request.query_params
+    page = int_arg(request, 'page', 1)
+    per_page = max(1, int_arg(request, 'per_page', 10))
+
+    try:
+        async with db_cursor() as cursor:
+            if wsgi.cursor_pagination_requested(args):
+                try:
+                    direction, key_values, had_cursor = wsgi.parse_cursor_arg('users', len(wsgi.USERS_SORT_KEYS), args)
+                except InvalidCursor:
+                    return json_response({'success': False, 'message': '无效的分页游标'}, 400)
+
+                await cursor.execute(*wsgi.users_page_query(key_values, direction, per_page + 1))
+                rows, pagination = build_page(
+                    await cursor.fetchall(), per_page, 'users', direction, had_cursor,
+                    key=lambda r: [r['created_at'], r['id']]
+                )
+                pagination['total_estimate'] = wsgi.table_counts.estimate('Login_users')
+            else:
+                total_count, is_exact = await table_total(cursor, 'Login_users', wsgi.exact_count_requested(args))
+                await cursor.execute(*wsgi.users_page_query([], 'next', per_page, (page - 1) * per_page))
+                rows = await cursor.fetchall()
+                pagination = wsgi.page_pagination(page, per_page, total_count, is_exact)
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+    return json_response({
+        'success': True,
+        'data': {
+            'users': [wsgi.format_user_row(row) for row in rows],
+            'pagination': pagination
+        }
+    })
+
+@route('/api/admin/users', ['POST'])
+async def create_user(request):
+    data = await read_json(request) or {}
+    username = data.get('username')
+    real_name = data.get('real_name')
+    email = data.get('email')
+    password = data.get('password', 'DefaultPassword123!')
+    role_ids = wsgi.parse_id_list(data.get('role_ids', []))
+
+    if not all([username, real_name, email]):
+        return json_response({'success': False, 'message': '必填字段不能为空'}, 400)
+    if role_ids is None:
+        return json_response({'success': False, 'message': 'role_ids 必须是角色ID列表'}, 400)
+
+    try:
+        # 先检查用户名/邮箱是否存在，重复提交不必计算哈希、占用哈希队列
+        if await fetchone(wsgi.USER_EXISTS_SQL, (username, email)):
+            return json_response({'success': False, 'message': '用户名或邮箱已存在'}, 400)
+
+        # 哈希计算在进程池中执行，不占用数据库连接
+        password_hash = await run_in_threadpool(hash_password, password)
+
+        async with transaction() as (connection, cursor):
+            # 哈希计算期间可能已有相同用户名/邮箱的用户被创建，插入前再检查一次
+            await cursor.execute(wsgi.USER_EXISTS_SQL, (username, email))
+            if await cursor.fetchone():
+                return json_response({'success': False, 'message': '用户名或邮箱已存在'}, 400)
+
+            await cursor.execute(
+                "INSERT INTO Login_users (username, real_name, email, password_hash) VALUES (%s, %s, %s, %s)",
+                (username, real_name, email, password_hash)
+            )
+            user_id = cursor.lastrowid
+            if role_ids:
+                await cursor.executemany(wsgi.INSERT_USER_ROLES_SQL, [(user_id, r) for r in sorted(role_ids)])
+            await connection.commit()
+    except HashingBusy:
+        return busy_response()
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+    wsgi.rbac_index.put_user(user_id, username, role_ids)
+    wsgi.table_counts.adjust('Login_users', 1)
+    wsgi.invalidate_user_assistants([username])
+    return json_response({
+        'success': True,
+        'message': '创建成功',
+        'data': {'id': user_id, 'username': username, 'role_ids': sorted(role_ids)}
+    }, 201)
+
+@route('/api/admin/users/{user_id:int}', ['PUT'])
+async def update_user(request):
+    user_id = request.path_params['user_id']
+    data = await read_json(request)
+    if not data:
+        return json_response({'success': False, 'message': '请求数据不能为空'}, 400)
+
+    # 只允许更新 username, real_name, email
+    allowed_fields = {'username', 'real_name', 'email'}
+    updates = {k: v for k, v in data.items() if k in allowed_fields}
+    if not updates:
+        return json_response({'success': False, 'message': '没有提供有效的更新字段'}, 400)
+
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute("SELECT id, username FROM Login_users WHERE id = %s", (user_id,))
+            existing_user = await cursor.fetchone()
+            if not existing_user:
+                return json_response({'success': False, 'message': '用户不存在'}, 404)
+
+            conflict_sql = ' OR '.join(f"{field} = %s AND id != %s" for field in updates)
+            conflict_params = [v for value in updates.values() for v in (value, user_id)]
+            await cursor.execute(f"SELECT id FROM Login_users WHERE {conflict_sql}", conflict_params)
+            if await cursor.fetchone():
+                return json_response({'success': False, 'message': '用户名或邮箱已被其他用户使用'}, 400)
+
+            set_clause = ', '.join(f"{key} = %s" for key in updates)
+            await cursor.execute(
+                f"UPDATE Login_users SET {set_clause} WHERE id = %s", list(updates.values()) + [user_id]
+            )
+            await connection.commit()
+            if cursor.rowcount == 0:
+                return json_response({'success': False, 'message': '用户未找到或未更新'}, 404)
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+
+    if 'username' in updates:
+        wsgi.rbac_index.put_user(user_id, updates['username'])
+    # 用户名是缓存 key，改名后新旧用户名都需要失效
+    wsgi.invalidate_user_assistants({existing_user['username'], updates.get('username', existing_user['username'])})
+    return json_response({'success': True, 'message': '用户信息更新成功'})
+
+@route('/api/admin/users/{user_id:int}', ['DELETE'])
+async def delete_user(request):
+    user_id = request.path_params['user_id']
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute("SELECT id, username FROM Login_users WHERE id = %s", (user_id,))
+            existing_user = await cursor.fetchone()
+            if not existing_user:
+                return json_response({'success': False, 'message': '用户不存在'}, 404)
+
+            await cursor.execute("DELETE FROM Login_users WHERE id = %s", (user_id,))
+            await connection.commit()
+            deleted = cursor.rowcount
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+
+    wsgi.rbac_index.remove_user(user_id)
+    wsgi.table_counts.adjust('Login_users', -deleted)
+    wsgi.invalidate_user_assistants([existing_user['username']])
+    if deleted == 0:
+        return json_response({'success': False, 'message': '删除失败'}, 400)
+    return json_response({'success': True, 'message': '用户删除成功'})
+
+@route('/api/admin/users/{user_id:int}/roles', ['GET'])
+async def get_user_roles(request):
+    user_id = request.path_params['user_id']
+    if wsgi.rbac_index.ready:
+        return json_response({'success': True, 'data': {'roles': wsgi.rbac_index.roles_for_user(user_id)}})
+    try:
+        roles = await fetchall(
+            """
+            SELECT r.id, r.name
+            FROM roles r
+            INNER JOIN user_roles ur ON r.id = ur.role_id
+            WHERE ur.user_id = %s
+            """,
+            (user_id,)
+        )
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+    return json_response({'success': True, 'data': {'roles': roles}})
+
+@route('/api/admin/users/{user_id:int}/roles', ['PUT'])
+async def update_user_roles(request):
+    """只增删与现有角色不同的部分，角色未变化时只需一次查询"""
+    user_id = request.path_params['user_id']
+    data = await read_json(request)
+    role_ids = wsgi.parse_id_list(data.get('role_ids', [])) if data else None
+    if role_ids is None:
+        return json_response({'success': False, 'message': 'role_ids 必须是角色ID列表'}, 400)
+
+    try:
+        async with transaction() as (connection, cursor):
+            # 一次查询同时验证用户存在并取出现有角色
+            await cursor.execute(
+                """
+                SELECT u.username, ur.role_id
+                FROM Login_users u
+                LEFT JOIN user_roles ur ON u.id = ur.user_id
+                WHERE u.id = %s
+                """,
+                (user_id,)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return json_response({'success': False, 'message': '用户不存在'}, 404)
+
+            existing = {r['role_id'] for r in rows if r['role_id'] is not None}
+            added = role_ids - existing
+            removed = existing - role_ids
+            if added or removed:
+                if removed:
+                    await cursor.execute(*wsgi.delete_user_roles_query(user_id, removed))
+                if added:
+                    await cursor.executemany(wsgi.INSERT_USER_ROLES_SQL, [(user_id, r) for r in sorted(added)])
+                await connection.commit()
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+    if added or removed:
+        wsgi.rbac_index.set_user_roles(user_id, role_ids)
+        wsgi.invalidate_user_assistants([rows[0]['username']])
+    return json_response({
+        'success': True,
+        'message': '角色更新成功',
+        'data': {'added': sorted(added), 'removed': sorted(removed)}
+    })
+
+@route('/api/admin/roles', ['GET'])
+async def get_roles(request):
+    """角色列表（分页，传 cursor 时按 id 游标分页）"""
+    args = request.query_params
+    page = int_arg(request, 'page', 1)
+    per_page = max(1, int_arg(request, 'per_page', 10))
+
+    try:
+        async with db_cursor() as cursor:
+            if wsgi.cursor_pagination_requested(args):
+                try:
+                    direction, key_values, had_cursor = wsgi.parse_cursor_arg('roles', 1, args)
+                except InvalidCursor:
+                    return json_response({"success": False, "message": "无效的分页游标"}, 400)
+
+                where_sql, params, order_sql = seek_clause(['id'], key_values, direction, descending=False)
+                await cursor.execute(
+                    f"SELECT id, name, created_at FROM roles WHERE {where_sql} ORDER BY {order_sql} LIMIT %s",
+                    params + [per_page + 1]
+                )
+                roles, pagination = build_page(
+                    await cursor.fetchall(), per_page, 'roles', direction, had_cursor,
+                    key=lambda r: [r['id']]
+                )
+                pagination['total_estimate'] = wsgi.table_counts.estimate('roles')
+            else:
+                total_count, is_exact = await table_total(cursor, 'roles', wsgi.exact_count_requested(args))
+                await cursor.execute(
+                    "SELECT id, name, created_at FROM roles ORDER BY id ASC LIMIT %s OFFSET %s",
+                    (per_page, (page - 1) * per_page)
+                )
+                roles = await cursor.fetchall()
+                pagination = wsgi.page_pagination(page, per_page, total_count, is_exact)
+    except Exception as e:
+        return db_error(e)
+    return json_response({"success": True, "data": {"roles": roles, "pagination": pagination}})
+
+@route('/api/admin/roles', ['POST'])
+async def create_role(request):
+    data = await read_json(request)
+    if not data or not data.get('name'):
+        return json_response({"success": False, "message": "角色名称不能为空"}, 400)
+
+    name = data['name'].strip()
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute("SELECT id FROM roles WHERE name = %s", (name,))
+            if await cursor.fetchone():
+                return json_response({"success": False, "message": "角色名称已存在"}, 400)
+
+            await cursor.execute("INSERT INTO roles (name) VALUES (%s)", (name,))
+            await connection.commit()
+            role_id = cursor.lastrowid
+    except Exception as e:
+        return db_error(e)
+
+    wsgi.rbac_index.put_role(role_id, name)
+    wsgi.table_counts.adjust('roles', 1)
+    return json_response({
+        "success": True,
+        "message": "角色创建成功",
+        "data": {"id": role_id, "name": name, "created_at": datetime.now()}
+    }, 201)
+
+@route('/api/admin/roles/{role_id:int}', ['PUT'])
+async def update_role(request):
+    role_id = request.path_params['role_id']
+    data = await read_json(request)
+    if not data or not data.get('name'):
+        return json_response({"success": False, "message": "角色名称不能为空"}, 400)
+
+    name = data['name'].strip()
+    try:
+        async with transaction() as (connection, cursor):
+            if not await role_exists(cursor, role_id):
+                return json_response({"success": False, "message": "角色不存在"}, 404)
+
+            await cursor.execute("SELECT id FROM roles WHERE name = %s AND id != %s", (name, role_id))
+            if await cursor.fetchone():
+                return json_response({"success": False, "message": "角色名称已存在"}, 400)
+
+            await cursor.execute("UPDATE roles SET name = %s WHERE id = %s", (name, role_id))
+            await connection.commit()
+    except Exception as e:
+        return db_error(e)
+
+    wsgi.rbac_index.put_role(role_id, name)
+    return json_response({"success": True, "message": "角色信息更新成功"})
+
+@route('/api/admin/roles/{role_id:int}', ['DELETE'])
+async def delete_role(request):
+    role_id = request.path_params['role_id']
+    try:
+        async with transaction() as (connection, cursor):
+            if not await role_exists(cursor, role_id):
+                return json_response({"success": False, "message": "角色不存在"}, 404)
+
+            # 级联删除前记录受影响的用户
+            affected_users = await usernames_by_roles(cursor, [role_id])
+            await cursor.execute("DELETE FROM roles WHERE id = %s", (role_id,))
+            await connection.commit()
+    except Exception as e:
+        return db_error(e)
+
+    wsgi.rbac_index.remove_role(role_id)
+    wsgi.table_counts.adjust('roles', -1)
+    wsgi.invalidate_user_assistants(affected_users)
+    return json_response({"success": True, "message": "角色删除成功"})
+
+@route('/api/admin/roles/{role_id:int}/permissions', ['GET'])
+async def get_role_permissions(request):
+    """角色已授权的应用ID列表"""
+    role_id = request.path_params['role_id']
+    rbac_index = wsgi.rbac_index
+    if rbac_index.ready:
+        if not rbac_index.role_exists(role_id):
+            return json_response({"success": False, "message": "角色不存在"}, 404)
+        authorized_apps = rbac_index.apps_for_role(role_id)
+    else:
+        try:
+            async with db_cursor() as cursor:
+                if not await role_exists(cursor, role_id):
+                    return json_response({"success": False, "message": "角色不存在"}, 404)
+                await cursor.execute("SELECT app_id FROM role_apps WHERE role_id = %s", (role_id,))
+                authorized_apps = [r['app_id'] for r in await cursor.fetchall()]
+        except Exception as e:
+            return db_error(e)
+    return json_response({"success": True, "data": {"role_id": role_id, "authorized_app_ids": authorized_apps}})
+
+@route('/api/admin/roles/{role_id:int}/permissions', ['PUT'])
+async def set_role_permissions(request):
+    """按完整的应用ID列表设置角色授权，只增删有差异的部分"""
+    role_id = request.path_params['role_id']
+    data = await read_json(request)
+    app_ids = wsgi.parse_id_list(data.get('app_ids')) if data else None
+    if app_ids is None:
+        return json_response({"success": False, "message": "app_ids 必须是应用ID列表"}, 400)
+
+    affected_users = []
+    try:
+        async with transaction() as (connection, cursor):
+            if not await role_exists(cursor, role_id):
+                return json_response({"success": False, "message": "角色不存在"}, 404)
+
+            await cursor.execute("SELECT app_id FROM role_apps WHERE role_id = %s", (role_id,))
+            existing = {r['app_id'] for r in await cursor.fetchall()}
+
+            added = {(role_id, a) for a in app_ids - existing}
+            removed = {(role_id, a) for a in existing - app_ids}
+            if added or removed:
+                await apply_role_apps(cursor, added, removed)
+                await connection.commit()
+                affected_users = await usernames_by_roles(cursor, [role_id])
+    except Exception as e:
+        return db_error(e)
+
+    if added or removed:
+        wsgi.rbac_index.apply_role_apps(added, removed)
+        wsgi.invalidate_user_assistants(affected_users)
+    return json_response({
+        "success": True,
+        "message": "授权更新成功",
+        "data": {
+            "role_id": role_id,
+            "added": sorted(a for _, a in added),
+            "removed": sorted(a for _, a in removed)
+        }
+    })
+
+async def apply_role_apps(cursor, added, removed):
+    if added:
+        await cursor.executemany(wsgi.INSERT_ROLE_APPS_SQL, sorted(added))
+    if removed:
+        await cursor.execute(*wsgi.delete_role_apps_query(removed))
+
+@route('/api/admin/role_apps', ['POST'])
+async def add_role_permission(request):
+    data = await read_json(request)
+    if not data or not data.get('role_id') or not data.get('app_id'):
+        return json_response({"success": False, "message": "角色ID和应用ID不能为空"}, 400)
+
+    # 先校验再写入：提交后才发现 id 无效会在已修改数据库后返回 500
+    try:
+        role_id = int(data['role_id'])
+        app_id = int(data['app_id'])
+    except (TypeError, ValueError):
+        return json_response({"success": False, "message": "角色ID和应用ID必须是整数"}, 400)
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute(
+                "SELECT id FROM role_apps WHERE role_id = %s AND app_id = %s",
+                (role_id, app_id)
+            )
+            if await cursor.fetchone():
+                return json_response({"success": True, "message": "该授权已存在"})
+
+            await cursor.execute("INSERT INTO role_apps (role_id, app_id) VALUES (%s, %s)", (role_id, app_id))
+            await connection.commit()
+            affected_users = await usernames_by_roles(cursor, [role_id])
+    except Exception as e:
+        return db_error(e)
+
+    wsgi.rbac_index.grant(role_id, app_id)
+    wsgi.invalidate_user_assistants(affected_users)
+    return json_response({"success": True, "message": "授权成功"})
+
+@route('/api/admin/role_apps', ['DELETE'])
+async def remove_role_permission(request):
+    data = await read_json(request)
+    if not data or not data.get('role_id') or not data.get('app_id'):
+        return json_response({"success": False, "message": "角色ID和应用ID不能为空"}, 400)
+
+    try:
+        role_id = int(data['role_id'])
+        app_id = int(data['app_id'])
+    except (TypeError, ValueError):
+        return json_response({"success": False, "message": "角色ID和应用ID必须是整数"}, 400)
+    affected_users = None
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute(
+                "DELETE FROM role_apps WHERE role_id = %s AND app_id = %s",
+                (role_id, app_id)
+            )
+            await connection.commit()
+            if cursor.rowcount:
+                affected_users = await usernames_by_roles(cursor, [role_id])
+    except Exception as e:
+        return db_error(e)
+
+    if affected_users is not None:
+        wsgi.rbac_index.revoke(role_id, app_id)
+        wsgi.invalidate_user_assistants(affected_users)
+    return json_response({"success": True, "message": "取消授权成功"})
+
+@route('/api/admin/role_apps/batch', ['POST'])
+async def batch_role_permissions(request):
+    """批量授权 / 取消授权，在一个事务中完成"""
+    data = await read_json(request)
+    if not data:
+        return json_response({"success": False, "message": "请求数据不能为空"}, 400)
+
+    try:
+        grant = {(int(p['role_id']), int(p['app_id'])) for p in data.get('grant', [])}
+        revoke = {(int(p['role_id']), int(p['app_id'])) for p in data.get('revoke', [])}
+    except (TypeError, ValueError, KeyError):
+        return json_response({"success": False, "message": "grant / revoke 必须是 role_id 和 app_id 组成的列表"}, 400)
+    if grant & revoke:
+        return json_response({"success": False, "message": "同一授权不能同时添加和取消"}, 400)
+
+    role_ids = {r for r, _ in grant | revoke}
+    if not role_ids:
+        return json_response({"success": True, "message": "没有需要更新的授权", "data": {"added": [], "removed": []}})
+
+    affected_users = []
+    try:
+        async with transaction() as (connection, cursor):
+            # 一次查出涉及角色的现有授权，计算实际需要增删的部分
+            placeholders = ', '.join(['%s'] * len(role_ids))
+            await cursor.execute(
+                f"SELECT role_id, app_id FROM role_apps WHERE role_id IN ({placeholders})",
+                sorted(role_ids)
+            )
+            existing = {(r['role_id'], r['app_id']) for r in await cursor.fetchall()}
+
+            added = grant - existing
+            removed = revoke & existing
+            if added or removed:
+                await apply_role_apps(cursor, added, removed)
+                await connection.commit()
+                affected_users = await usernames_by_roles(cursor, {r for r, _ in added | removed})
+    except Exception as e:
+        return db_error(e)
+
+    if added or removed:
+        wsgi.rbac_index.apply_role_apps(added, removed)
+        wsgi.invalidate_user_assistants(affected_users)
+    return json_response({
+        "success": True,
+        "message": "批量授权更新成功",
+        "data": {
+            "added": [{"role_id": r, "app_id": a} for r, a in sorted(added)],
+            "removed": [{"role_id": r, "app_id": a} for r, a in sorted(removed)]
+        }
+    })
+
+@route('/api/admin/assistants', ['GET'])
+async def get_assistants(request):
+    """助手列表，默认按页码分页；传 cursor 时按 (created_at, id) 游标分页"""
+    args = request.query_params
+    page = int_arg(request, 'page', 1)
+    per_page = max(1, int_arg(request, 'per_page', 10))
+
+    try:
+        async with db_cursor() as cursor:
+            if wsgi.cursor_pagination_requested(args):
+                try:
+                    direction, key_values, had_cursor = wsgi.parse_cursor_arg('assistants', 2, args)
+                except InvalidCursor:
+                    return json_response({'success': False, 'message': '无效的分页游标'}, 400)
+
+                where_sql, params, order_sql = seek_clause(['created_at', 'id'], key_values, direction,
+                                                           nullable=wsgi.NULLABLE_SORT_KEYS)
+                await cursor.execute(
+                    f"""
+                    SELECT id, ASSISTANT_ID, name, description, icon_url, in_use, created_at
+                    FROM assistant_info
+                    WHERE {where_sql}
+                    ORDER BY {order_sql}
+                    LIMIT %s
+                    """,
+                    params + [per_page + 1]
+                )
+                assistants, pagination = build_page(
+                    await cursor.fetchall(), per_page, 'assistants', direction, had_cursor,
+                    key=lambda r: [r['created_at'], r['id']]
+                )
+                pagination['total_estimate'] = wsgi.table_counts.estimate('assistant_info')
+            else:
+                total_count, is_exact = await table_total(cursor, 'assistant_info', wsgi.exact_count_requested(args))
+                await cursor.execute(
+                    """
+                    SELECT id, ASSISTANT_ID, name, description, icon_url, in_use, created_at
+                    FROM assistant_info
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s OFFSET %s
+                    """,
+                    (per_page, (page - 1) * per_page)
+                )
+                assistants = await cursor.fetchall()
+                pagination = wsgi.page_pagination(page, per_page, total_count, is_exact)
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+    return json_response({'success': True, 'data': {'assistants': assistants, 'pagination': pagination}})
+
+@route('/api/admin/assistants', ['POST'])
+async def create_assistant(request):
+    data = await read_json(request)
+    if not data or not data.get('ASSISTANT_ID') or not data.get('name'):
+        return json_response({'success': False, 'message': 'ASSISTANT_ID 和名称不能为空'}, 400)
+
+    row = {
+        'ASSISTANT_ID': data['ASSISTANT_ID'],
+        'name': data['name'],
+        'description': data.get('description'),
+        'icon_url': data.get('icon_url'),
+        'in_use': data.get('in_use', 'active'),  # 默认设置为 active
+    }
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute("SELECT id FROM assistant_info WHERE ASSISTANT_ID = %s", (row['ASSISTANT_ID'],))
+            if await cursor.fetchone():
+                return json_response({'success': False, 'message': 'ASSISTANT_ID 已存在'}, 400)
+
+            await cursor.execute(
+                """
+                INSERT INTO assistant_info (ASSISTANT_ID, name, description, icon_url, in_use)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                (row['ASSISTANT_ID'], row['name'], row['description'], row['icon_url'], row['in_use'])
+            )
+            await connection.commit()
+            row['id'] = cursor.lastrowid
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+
+    wsgi.rbac_index.put_assistant(row)
+    wsgi.table_counts.adjust('assistant_info', 1)
+    return json_response({
+        'success': True,
+        'message': '助手创建成功',
+        'data': {
+            'id': row['id'],
+            'ASSISTANT_ID': row['ASSISTANT_ID'],
+            'name': row['name'],
+            'description': row['description'],
+            'icon_url': row['icon_url'],
+            'in_use': row['in_use'],
+            'created_at': datetime.now()
+        }
+    }, 201)
+
+@route('/api/admin/assistants/{assistant_id:int}', ['PUT'])
+async def update_assistant(request):
+    """修改助手信息 (包括更新 in_use 状态)"""
+    assistant_id = request.path_params['assistant_id']
+    data = await read_json(request)
+    if not data:
+        return json_response({'success': False, 'message': '请求数据不能为空'}, 400)
+
+    allowed_fields = {'name', 'description', 'icon_url', 'in_use'}
+    updates = {k: v for k, v in data.items() if k in allowed_fields}
+    if not updates:
+        return json_response({'success': False, 'message': '没有提供有效的更新字段'}, 400)
+
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute("SELECT id FROM assistant_info WHERE id = %s", (assistant_id,))
+            if not await cursor.fetchone():
+                return json_response({'success': False, 'message': '助手不存在'}, 404)
+
+            set_clause = ', '.join(f"{key} = %s" for key in updates)
+            await cursor.execute(
+                f"UPDATE assistant_info SET {set_clause} WHERE id = %s", list(updates.values()) + [assistant_id]
+            )
+            await connection.commit()
+            if cursor.rowcount == 0:
+                return json_response({'success': False, 'message': '助手未找到或未更新'}, 404)
+
+            await cursor.execute(
+                "SELECT id, ASSISTANT_ID, name, description, icon_url, in_use FROM assistant_info WHERE id = %s",
+                (assistant_id,)
+            )
+            row = await cursor.fetchone()
+            affected_users = await usernames_by_app(cursor, assistant_id)
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+
+    if row:
+        wsgi.rbac_index.put_assistant(row)
+    wsgi.invalidate_user_assistants(affected_users)
+    return json_response({'success': True, 'message': '助手信息更新成功'})
+
+@route('/api/admin/assistants/{assistant_id:int}', ['DELETE'])
+async def delete_assistant(request):
+    assistant_id = request.path_params['assistant_id']
+    try:
+        async with transaction() as (connection, cursor):
+            await cursor.execute("SELECT id FROM assistant_info WHERE id = %s", (assistant_id,))
+            if not await cursor.fetchone():
+                return json_response({'success': False, 'message': '助手不存在'}, 404)
+
+            # 级联删除前记录受影响的用户
+            affected_users = await usernames_by_app(cursor, assistant_id)
+            await cursor.execute("DELETE FROM assistant_info WHERE id = %s", (assistant_id,))
+            await connection.commit()
+            deleted = cursor.rowcount
+    except aiomysql.MySQLError as e:
+        return db_error(e)
+
+    wsgi.rbac_index.remove_assistant(assistant_id)
+    wsgi.table_counts.adjust('assistant_info', -deleted)
+    wsgi.invalidate_user_assistants(affected_users)
+    if deleted == 0:
+        return json_response({'success': False, 'message': '删除失败'}, 400)
+    return json_response({'success': True, 'message': '助手删除成功'})
+
+
+# --- 应用 ---
+@asynccontextmanager
+async def lifespan(_):
+    global db
+    # 与 serve.py 相同：启动时预热 RBAC 索引和表计数，再启动后台线程
+    await run_in_threadpool(wsgi.create_app, True)
+    wsgi.start_background_tasks()
+    db = await create_db_pool()
+    try:
+        yield
+    finally:
+        db.close()
+        await db.wait_closed()
+
+# 未匹配上面异步路由的请求交给 Flask 应用，在线程池中执行
+app = Router(routes=routes, default=WSGIMiddleware(wsgi.app), lifespan=lifespan)
+
+
+def main():
+    if uvicorn is None:
+        print("未安装 uvicorn：pip install uvicorn，或使用其他 ASGI 服务器运行 asgi_app:app")
+        return
+    host, _, port = os.getenv('server_bind', '0.0.0.0:5000').rpartition(':')
+    workers = int(os.getenv('server_workers', os.cpu_count() or 1))
+    # 与 serve.py 相同：各 worker 平分密码哈希进程，worker 进程启动时继承该环境变量
+    share_hash_workers(workers)
+    uvicorn.run(
+        'asgi_app:app',
+        host=host or '0.0.0.0',
+        port=int(port),
+        workers=workers,
+        backlog=int(os.getenv('server_backlog', 2048)),
+        timeout_keep_alive=int(os.getenv('server_keepalive', 5)),
+        access_log=bool(os.getenv('server_access_log')),
+    )
+
+
+if __name__ == '__main__':
+    main()
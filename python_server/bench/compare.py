@@ -0,0 +1,72 @@
+"""
+比较两次基准测试结果
+
+    python bench/compare.py base.json new.json               # 打印对比表
+    python bench/compare.py base.json new.json --fail-over 10  # p95 变慢超过 10% 时退出码为 1
+
+延迟列为 新/旧 的变化百分比（负数表示变快），吞吐量列为正数表示提升。
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def fmt_change(value):
+    return '   n/a' if value is None else f'{value:+6.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较两次 run.py 的结果')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--fail-over', type=float, default=None,
+                        help='任一请求的 p95 变慢超过该百分比时返回退出码 1')
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    print(f"base: {base['meta'].get('git_revision')}  new: {new['meta'].get('git_revision')}")
+    if base['meta'].get('dataset') != new['meta'].get('dataset') or \
+            base['meta'].get('concurrency') != new['meta'].get('concurrency'):
+        print("警告：两次测试的数据量或并发数不同，结果不可直接比较")
+
+    header = f"{'scenario / request':<48} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>9}  p95(new)"
+    print(header)
+    print('-' * len(header))
+    regressions = []
+    for scenario, result in new['scenarios'].items():
+        base_requests = base['scenarios'].get(scenario, {}).get('requests', {})
+        for request_name, stats in result['requests'].items():
+            old = base_requests.get(request_name)
+            label = f"{scenario} / {request_name}"
+            if old is None:
+                print(f"{label:<48} {'(new)':>9}")
+                continue
+            latency, old_latency = stats['latency_ms'], old['latency_ms']
+            p95_change = change(old_latency['p95'], latency['p95'])
+            print(f"{label:<48} {fmt_change(change(old_latency['p50'], latency['p50'])):>9} "
+                  f"{fmt_change(p95_change):>9} {fmt_change(change(old_latency['p99'], latency['p99'])):>9} "
+                  f"{fmt_change(change(old['throughput_rps'], stats['throughput_rps'])):>9}  {latency['p95']}ms")
+            if args.fail_over is not None and p95_change is not None and p95_change > args.fail_over:
+                regressions.append((label, p95_change))
+
+    if regressions:
+        print(f"\np95 变慢超过 {args.fail_over}%：")
+        for label, value in regressions:
+            print(f"  {label}: {value:+.1f}%")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+接口基准测试
+
+    cd python_server
+    python bench/seed.py --reset && python serve.py &
+    python bench/run.py --concurrency 16 --duration 10 --output bench/results/$(git rev-parse --short HEAD).json
+    python bench/compare.py bench/results/<旧版本>.json bench/results/<新版本>.json
+
+依次运行各场景：每个场景先预热 --warmup 秒（不计入结果），再以 --concurrency 个线程
+持续请求 --duration 秒。每个线程使用一个 keep-alive 连接，与浏览器经 Next.js 代理的访问方式接近。
+结果按请求类型统计次数、错误数、状态码、吞吐量与 p50 / p95 / p99 延迟，输出为 JSON。
+
+只依赖标准库。--users / --roles / --assistants 需与 seed.py 写入的数据量一致，
+--seed 相同时各次运行的请求序列相同。upload / download 场景不访问数据库，
+没有 MySQL 时也可以单独运行：--scenarios upload,download。
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+DEFAULT_PASSWORD = 'Bench-Password-123'
+
+
+class Recorder:
+    """单个线程的统计，结束后合并，记录时不需要加锁"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.enabled = True
+
+    def record(self, name, status, seconds):
+        if self.enabled:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status] += 1
+
+
+class Client:
+    def __init__(self, base_url, recorder, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.recorder = recorder
+        self.connection = None
+
+    def call(self, name, method, path, json_body=None, body=None, headers=None):
+        """发送请求并记录耗时，返回 (status, 响应体)；连接错误时 status 为 0"""
+        headers = dict(headers or {})
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, data = 0, b''
+        self.recorder.record(name, status, time.perf_counter() - started)
+        return status, data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def json_data(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {}
+
+
+def multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+# --- 场景：每次调用执行一次完整操作，可以包含多个请求，各请求分别计时 ---
+
+class Scenarios:
+    def __init__(self, args):
+        self.args = args
+        self.files = []  # 预先上传的文件路径，供 download 场景使用
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def unique(self, prefix):
+        with self._lock:
+            self._seq += 1
+            return f"{prefix}_{os.getpid()}_{self._seq}_{uuid.uuid4().hex[:6]}"
+
+    def username(self, rng):
+        return f"bench_user_{rng.randint(1, self.args.users):06d}"
+
+    def login(self, client, rng):
+        client.call('login', 'POST', '/api/login',
+                    json_body={'username': self.username(rng), 'password': self.args.password})
+
+    def login_embed(self, client, rng):
+        client.call('login_embed_permissions', 'POST', '/api/login?embed=permissions',
+                    json_body={'username': self.username(rng), 'password': self.args.password})
+
+    def user_assistants(self, client, rng):
+        client.call('user_assistants', 'GET', f'/api/user_assistants?user_id={self.username(rng)}')
+
+    def admin_lists(self, client, rng):
+        # 前若干页最常被访问，也覆盖少量深分页
+        page = rng.randint(1, 50) if rng.random() < 0.9 else rng.randint(1, max(self.args.users // 20, 1))
+        client.call('admin_users_page', 'GET', f'/api/admin/users?page={page}&per_page=20')
+        client.call('admin_users_cursor', 'GET', '/api/admin/users?cursor=&per_page=20')
+        client.call('admin_roles', 'GET', f'/api/admin/roles?page={rng.randint(1, 50)}&per_page=20')
+        client.call('admin_assistants', 'GET', f'/api/admin/assistants?page={rng.randint(1, 25)}&per_page=20')
+        client.call('admin_role_permissions', 'GET',
+                    f'/api/admin/roles/{rng.randint(1, self.args.roles)}/permissions')
+        client.call('admin_user_roles', 'GET', f'/api/admin/users/{rng.randint(1, self.args.users)}/roles')
+
+    def role_crud(self, client, rng):
+        status, data = client.call('admin_role_create', 'POST', '/api/admin/roles',
+                                   json_body={'name': self.unique('bench_role')})
+        role_id = json_data(data).get('data', {}).get('id') if status == 201 else None
+        if role_id is None:
+            return
+        client.call('admin_role_update', 'PUT', f'/api/admin/roles/{role_id}',
+                    json_body={'name': self.unique('bench_role')})
+        grant = {'role_id': role_id, 'app_id': rng.randint(1, self.args.assistants)}
+        client.call('admin_role_app_grant', 'POST', '/api/admin/role_apps', json_body=grant)
+        client.call('admin_role_app_revoke', 'DELETE', '/api/admin/role_apps', json_body=grant)
+        client.call('admin_role_delete', 'DELETE', f'/api/admin/roles/{role_id}')
+
+    def user_crud(self, client, rng):
+        username = self.unique('bench_new')
+        status, data = client.call('admin_user_create', 'POST', '/api/admin/users', json_body={
+            'username': username,
+            'real_name': '基准测试',
+            'email': f'{username}@example.com',
+            'password': self.args.password,
+            'role_ids': [rng.randint(1, self.args.roles)],
+        })
+        user_id = json_data(data).get('data', {}).get('id') if status == 201 else None
+        if user_id is None:
+            return
+        client.call('admin_user_update', 'PUT', f'/api/admin/users/{user_id}',
+                    json_body={'real_name': '基准测试（已修改）'})
+        client.call('admin_user_roles_update', 'PUT', f'/api/admin/users/{user_id}/roles',
+                    json_body={'role_ids': [rng.randint(1, self.args.roles) for _ in range(2)]})
+        client.call('admin_user_delete', 'DELETE', f'/api/admin/users/{user_id}')
+
+    def assistant_crud(self, client, rng):
+        status, data = client.call('admin_assistant_create', 'POST', '/api/admin/assistants', json_body={
+            'ASSISTANT_ID': self.unique('bench-asst'),
+            'name': '基准测试助手',
+            'description': '临时创建',
+            'in_use': 'active',
+        })
+        assistant_id = json_data(data).get('data', {}).get('id') if status == 201 else None
+        if assistant_id is None:
+            return
+        client.call('admin_assistant_update', 'PUT', f'/api/admin/assistants/{assistant_id}',
+                    json_body={'in_use': 'inactive'})
+        client.call('admin_assistant_delete', 'DELETE', f'/api/admin/assistants/{assistant_id}')
+
+    def upload(self, client, rng):
+        # 每次内容不同，测量真实写入而不是去重路径
+        body, headers = multipart('file', 'bench.bin', os.urandom(self.args.upload_size))
+        client.call('upload', 'POST', '/upload', body=body, headers=headers)
+
+    def download(self, client, rng):
+        path = rng.choice(self.files)
+        client.call('download', 'GET', path)
+        client.call('download_range', 'GET', path, headers={'Range': 'bytes=0-65535'})
+
+    def prepare_download(self, base_url):
+        """上传一批文件供下载场景使用"""
+        client = Client(base_url, Recorder())
+        for _ in range(self.args.download_files):
+            body, headers = multipart('file', 'bench.bin', os.urandom(self.args.upload_size))
+            status, data = client.call('prepare', 'POST', '/upload', body=body, headers=headers)
+            url = json_data(data).get('url') if status == 201 else None
+            if url:
+                self.files.append(urlsplit(url).path)
+        client.close()
+        if not self.files:
+            raise RuntimeError('无法上传用于下载测试的文件')
+
+
+SCENARIOS = ['login', 'login_embed', 'user_assistants', 'admin_lists',
+             'role_crud', 'user_crud', 'assistant_crud', 'upload', 'download']
+
+
+def run_scenario(name, scenarios, args):
+    step = getattr(scenarios, name)
+    recorders = [Recorder() for _ in range(args.concurrency)]
+    warmup_end = time.monotonic() + args.warmup
+    end = warmup_end + args.duration
+    measured_start = {}
+
+    def worker(index):
+        rng = random.Random(f"{args.seed}-{name}-{index}")
+        recorder = recorders[index]
+        client = Client(args.base_url, recorder, timeout=args.timeout)
+        recorder.enabled = False
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= end:
+                    break
+                if not recorder.enabled and now >= warmup_end:
+                    recorder.enabled = True
+                    measured_start.setdefault(index, now)
+                step(client, rng)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - min(measured_start.values(), default=warmup_end)
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    for recorder in recorders:
+        for request_name, values in recorder.latencies.items():
+            latencies[request_name].extend(values)
+            statuses[request_name].update(recorder.statuses[request_name])
+    return {
+        'wall_s': round(wall, 3),
+        'requests': {
+            request_name: summarize(values, statuses[request_name], wall)
+            for request_name, values in sorted(latencies.items())
+        },
+    }
+
+
+def percentile(sorted_values, p):
+    """最近秩法"""
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(values, statuses, wall):
+    values = sorted(values)
+    errors = sum(count for status, count in statuses.items() if status == 0 or status >= 500)
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    return {
+        'count': len(values),
+        'errors': errors,
+        'status': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(values) / wall, 2) if wall > 0 else 0.0,
+        'latency_ms': {
+            'min': ms(values[0]) if values else 0.0,
+            'mean': ms(sum(values) / len(values)) if values else 0.0,
+            'p50': ms(percentile(values, 50)),
+            'p95': ms(percentile(values, 95)),
+            'p99': ms(percentile(values, 99)),
+            'max': ms(values[-1]) if values else 0.0,
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='接口基准测试，结果输出为 JSON')
+    parser.add_argument('--base-url', default=os.getenv('bench_base_url', 'http://127.0.0.1:5000'))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"逗号分隔，可选：{', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='每个场景的测量时长（秒）')
+    parser.add_argument('--warmup', type=float, default=2, help='每个场景的预热时长（秒）')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--users', type=int, default=100_000, help='与 seed.py 一致')
+    parser.add_argument('--roles', type=int, default=1_000, help='与 seed.py 一致')
+    parser.add_argument('--assistants', type=int, default=500, help='与 seed.py 一致')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='与 seed.py 一致')
+    parser.add_argument('--upload-size', type=int, default=256 * 1024, help='上传文件大小（字节）')
+    parser.add_argument('--download-files', type=int, default=20, help='下载场景使用的文件数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='结果文件路径，默认输出到标准输出')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"未知场景：{', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    scenarios = Scenarios(args)
+    if 'download' in names:
+        scenarios.prepare_download(args.base_url)
+
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'seed': args.seed,
+            'dataset': {'users': args.users, 'roles': args.roles, 'assistants': args.assistants},
+            'upload_size': args.upload_size,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'scenarios': {},
+    }
+    for name in names:
+        print(f"运行场景 {name} ...", file=sys.stderr)
+        result = run_scenario(name, scenarios, args)
+        report['scenarios'][name] = result
+        for request_name, stats in result['requests'].items():
+            latency = stats['latency_ms']
+            print(f"  {request_name}: {stats['throughput_rps']} req/s, p50 {latency['p50']}ms, "
+                  f"p95 {latency['p95']}ms, p99 {latency['p99']}ms, 错误 {stats['errors']}", file=sys.stderr)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
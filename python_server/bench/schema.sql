@@ -0,0 +1,53 @@
+-- 基准测试用表结构，与 app.py 中的查询保持一致；由 seed.py 执行
+-- 删除角色 / 用户 / 助手时关联表由外键级联清理
+
+CREATE TABLE IF NOT EXISTS Login_users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(64) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    real_name VARCHAR(64),
+    email VARCHAR(128),
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_username (username),
+    UNIQUE KEY uk_email (email),
+    KEY idx_created_at (created_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS roles (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(64) NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_name (name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS assistant_info (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    ASSISTANT_ID VARCHAR(64) NOT NULL,
+    name VARCHAR(128) NOT NULL,
+    description TEXT,
+    icon_url VARCHAR(512),
+    in_use VARCHAR(16) NOT NULL DEFAULT 'active',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_assistant_id (ASSISTANT_ID),
+    KEY idx_created_at (created_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_roles (
+    user_id INT NOT NULL,
+    role_id INT NOT NULL,
+    PRIMARY KEY (user_id, role_id),
+    KEY idx_role_id (role_id),
+    CONSTRAINT fk_user_roles_user FOREIGN KEY (user_id) REFERENCES Login_users (id) ON DELETE CASCADE,
+    CONSTRAINT fk_user_roles_role FOREIGN KEY (role_id) REFERENCES roles (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 与生产库一致带自增 id：授权接口以 SELECT id FROM role_apps 判断授权是否已存在
+CREATE TABLE IF NOT EXISTS role_apps (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    role_id INT NOT NULL,
+    app_id INT NOT NULL,
+    UNIQUE KEY uk_role_app (role_id, app_id),
+    KEY idx_app_id (app_id),
+    CONSTRAINT fk_role_apps_role FOREIGN KEY (role_id) REFERENCES roles (id) ON DELETE CASCADE,
+    CONSTRAINT fk_role_apps_app FOREIGN KEY (app_id) REFERENCES assistant_info (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
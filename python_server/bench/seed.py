@@ -0,0 +1,149 @@
+"""
+基准测试数据
+
+    cd python_server
+    python bench/seed.py --reset                 # 10 万用户、1000 角色、500 助手
+    python bench/seed.py --reset --users 10000   # 较小的数据量
+
+连接参数与 app.py 相同（mysql_host / mysql_port / mysql_user / mysql_pwd / db_name），
+应指向专用的本地 MySQL 兼容数据库（MySQL、MariaDB、TiDB 等），--reset 会删除并重建表。
+相同的 --seed 生成完全相同的数据，不同版本之间的测试结果才有可比性。
+所有用户的密码均为 --password，run.py 使用相同的默认值登录。
+数据写入后需重启服务，RBAC 索引和表计数才会重新加载。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import get_db_connection  # noqa: E402
+from hashing import hash_password  # noqa: E402
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+TABLES = ['role_apps', 'user_roles', 'assistant_info', 'roles', 'Login_users']
+DEFAULT_PASSWORD = 'Bench-Password-123'
+# 创建时间分布在该时间点之前的两年内，固定起点保证可重复
+EPOCH = datetime(2024, 1, 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='写入基准测试数据')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--roles', type=int, default=1_000)
+    parser.add_argument('--assistants', type=int, default=500)
+    parser.add_argument('--apps-per-role', type=int, default=100,
+                        help='每个角色授权的助手数，默认 1000 × 100 = 10 万条 role_apps')
+    parser.add_argument('--max-roles-per-user', type=int, default=3)
+    parser.add_argument('--inactive-ratio', type=float, default=0.1, help='停用助手的比例')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--reset', action='store_true', help='删除并重建所有表')
+    return parser.parse_args()
+
+
+def run_schema(cursor, reset):
+    if reset:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        statements = [s.strip() for s in f.read().split(';')]
+    for statement in statements:
+        lines = [line for line in statement.splitlines() if not line.strip().startswith('--')]
+        if any(line.strip() for line in lines):
+            cursor.execute('\n'.join(lines))
+
+
+def insert_batches(connection, cursor, sql, rows, batch_size, label):
+    started = time.perf_counter()
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cursor.executemany(sql, batch)
+            connection.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        connection.commit()
+        total += len(batch)
+    print(f"{label}: {total} 行，耗时 {time.perf_counter() - started:.1f}s")
+    return total
+
+
+def created_at(rng):
+    return EPOCH - timedelta(seconds=rng.randrange(2 * 365 * 24 * 3600))
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    # 所有用户共用一个哈希，避免为 10 万个用户逐个计算
+    password_hash = hash_password(args.password)
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run_schema(cursor, args.reset)
+            connection.commit()
+            cursor.execute("SELECT COUNT(*) AS n FROM Login_users")
+            if cursor.fetchone()['n']:
+                print("表中已有数据，使用 --reset 重建后再写入")
+                return 1
+
+            insert_batches(connection, cursor,
+                           "INSERT INTO roles (id, name, created_at) VALUES (%s, %s, %s)",
+                           ((i, f"bench_role_{i:04d}", created_at(rng)) for i in range(1, args.roles + 1)),
+                           args.batch_size, 'roles')
+
+            insert_batches(connection, cursor,
+                           "INSERT INTO assistant_info (id, ASSISTANT_ID, name, description, icon_url, in_use, created_at) "
+                           "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                           ((i, f"bench-assistant-{i:04d}", f"基准测试助手 {i}",
+                             f"用于基准测试的助手 {i}，" + "描述文字" * rng.randint(5, 40),
+                             f"https://example.com/icons/{i}.png",
+                             'inactive' if rng.random() < args.inactive_ratio else 'active',
+                             created_at(rng))
+                            for i in range(1, args.assistants + 1)),
+                           args.batch_size, 'assistant_info')
+
+            insert_batches(connection, cursor,
+                           "INSERT INTO Login_users (id, username, password_hash, real_name, email, created_at) "
+                           "VALUES (%s, %s, %s, %s, %s, %s)",
+                           ((i, f"bench_user_{i:06d}", password_hash, f"测试用户{i}",
+                             f"bench_user_{i:06d}@example.com", created_at(rng))
+                            for i in range(1, args.users + 1)),
+                           args.batch_size, 'Login_users')
+
+            apps_per_role = min(args.apps_per_role, args.assistants)
+            insert_batches(connection, cursor,
+                           "INSERT INTO role_apps (role_id, app_id) VALUES (%s, %s)",
+                           ((role_id, app_id) for role_id in range(1, args.roles + 1)
+                            for app_id in sorted(rng.sample(range(1, args.assistants + 1), apps_per_role))),
+                           args.batch_size, 'role_apps')
+
+            max_roles = min(args.max_roles_per_user, args.roles)
+            insert_batches(connection, cursor,
+                           "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
+                           ((user_id, role_id) for user_id in range(1, args.users + 1)
+                            for role_id in sorted(rng.sample(range(1, args.roles + 1), rng.randint(1, max_roles)))),
+                           args.batch_size, 'user_roles')
+
+            cursor.execute("ANALYZE TABLE Login_users, roles, assistant_info, user_roles, role_apps")
+            cursor.fetchall()
+    finally:
+        connection.close()
+    print("完成。重启服务后运行 python bench/run.py")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+进程内 TTL + LRU 缓存，可选 Redis 共享后端（多 worker 共享同一份缓存与失效）
+
+另有各 worker 共享的写入代数计数器：写入方提交后加一，其他 worker 发现代数变化时
+丢弃自己进程内的派生数据（RBAC 索引、进程内缓存）
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows：只能单进程运行，使用进程内计数
+    fcntl = None
+
+try:
+    import redis
+except ImportError:  # 可选依赖：未安装时只使用进程内缓存
+    redis = None
+
+MISSING = object()
+
+
+class TTLCache:
+    """线程安全的 LRU 缓存，每个条目在 ttl 秒后过期"""
+
+    shared = False  # 只在本进程内可见，其他 worker 的失效不会到达
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        """命中返回缓存值，未命中或已过期返回 MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self._misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        """ttl 为该条目的过期秒数，缺省使用缓存默认值"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self._invalidations += 1
+
+    def delete(self, key):
+        self.delete_many((key,))
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': 'memory',
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
+
+
+class RedisTTLCache:
+    """与 TTLCache 接口一致的 Redis 后端，值以 JSON 存储，LRU 由 Redis 的 maxmemory 策略负责"""
+
+    shared = True
+
+    def __init__(self, url, namespace, ttl=300.0):
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+        self._prefix = f"agent-chat:{namespace}:"
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+
+    def get(self, key):
+        try:
+            raw = self._client.get(self._prefix + key)
+        except redis.RedisError:
+            raw = None
+            with self._lock:
+                self._errors += 1
+        with self._lock:
+            if raw is None:
+                self._misses += 1
+                return MISSING
+            self._hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        try:
+            ex = max(1, int(self.ttl if ttl is None else ttl))
+            self._client.set(self._prefix + key, json.dumps(value), ex=ex)
+        except redis.RedisError:
+            with self._lock:
+                self._errors += 1
+
+    def delete_many(self, keys):
+        keys = [self._prefix + k for k in keys]
+        if not keys:
+            return
+        try:
+            self._client.delete(*keys)
+        except redis.RedisError:
+            with self._lock:
+                self._errors += 1
+
+    def delete(self, key):
+        self.delete_many((key,))
+
+    def clear(self):
+        try:
+            batch = []
+            for key in self._client.scan_iter(match=self._prefix + '*', count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self._client.delete(*batch)
+                    batch = []
+            if batch:
+                self._client.delete(*batch)
+        except redis.RedisError:
+            with self._lock:
+                self._errors += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': 'redis',
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'errors': self._errors,
+            }
+
+
+def make_cache(namespace, maxsize=1024, ttl=300.0, redis_url=None):
+    """配置了 redis_url 且安装了 redis 时返回共享缓存，否则返回进程内缓存"""
+    if redis_url and redis is not None:
+        return RedisTTLCache(redis_url, namespace, ttl=ttl)
+    if redis_url:
+        print("未安装 redis 包，cache_redis_url 被忽略，使用进程内缓存")
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+class LocalGeneration:
+    """进程内的写入代数，只适用于单进程部署"""
+
+    scope = 'process'
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        return self._value
+
+    def incr(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+class FileGeneration:
+    """
+    同一主机上所有进程共享的写入代数：文件开头 8 字节的计数，
+    读取是一次 pread，加一时持有 lockf 记录锁（按进程加锁，fork 出的 worker 之间同样互斥）；
+    gunicorn / uvicorn 的 worker 无论 fork 还是 spawn 启动都能看到彼此的写入
+    """
+
+    scope = 'host'
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _read(self):
+        data = os.pread(self._fd, 8, 0)
+        return int.from_bytes(data, 'little') if len(data) == 8 else 0
+
+    def get(self):
+        """读取失败时返回 None，调用方应视为已过期"""
+        try:
+            return self._read()
+        except OSError:
+            return None
+
+    def incr(self):
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                value = self._read() + 1
+                os.pwrite(self._fd, value.to_bytes(8, 'little'), 0)
+                return value
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        except OSError as e:
+            print(f"Generation counter error: {e}")
+            return None
+
+
+class RedisGeneration:
+    """保存在 Redis 中的写入代数，多台主机上的 worker 共享"""
+
+    scope = 'redis'
+
+    def __init__(self, url, namespace):
+        self._client = redis.Redis.from_url(url)
+        self._key = f"agent-chat:{namespace}:generation"
+
+    def get(self):
+        try:
+            return int(self._client.get(self._key) or 0)
+        except redis.RedisError:
+            return None
+
+    def incr(self):
+        try:
+            return self._client.incr(self._key)
+        except redis.RedisError as e:
+            print(f"Generation counter error: {e}")
+            return None
+
+
+def make_generation(namespace, path, redis_url=None):
+    """
+    配置了 redis_url 且安装了 redis 时在 Redis 中计数（可跨主机），
+    否则使用 path 文件在同一主机的进程间共享；不支持文件锁的平台只在进程内计数
+    """
+    if redis_url and redis is not None:
+        return RedisGeneration(redis_url, namespace)
+    if fcntl is not None:
+        return FileGeneration(path)
+    return LocalGeneration()
@@ -0,0 +1,195 @@
+"""
+分块、可续传上传
+
+协议：init 创建会话 → 按偏移量逐块 PUT → complete 合并完成。
+每个分块直接从请求体流式写入磁盘上的 .part 文件，不在内存中整体缓冲；
+分块带 SHA-256 校验，校验失败时截断回分块起点。
+连接中断后客户端查询会话的当前偏移量，从该位置继续上传。
+会话状态保存在磁盘上的 JSON 文件中，多个 worker 进程共享。
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有 flock，只依赖偏移量检查
+    fcntl = None
+
+COPY_BUFFER = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+class UploadSessions:
+    def __init__(self, root, max_size, chunk_size, session_ttl=24 * 3600):
+        self.root = root
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.session_ttl = session_ttl
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, upload_id):
+        # upload_id 来自 URL，只接受 init 生成的 32 位十六进制串
+        if len(upload_id) != 32 or any(c not in '0123456789abcdef' for c in upload_id):
+            raise UploadError('上传会话不存在', 404)
+        base = os.path.join(self.root, upload_id)
+        return base + '.json', base + '.part'
+
+    def _load(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError('上传会话不存在', 404)
+        return meta, meta_path, part_path
+
+    @staticmethod
+    def _save(meta, meta_path):
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    @contextmanager
+    def _locked(self, part_path):
+        """同一会话同时只允许一个请求写入（跨进程），拿不到锁说明已有分块在上传"""
+        with open(part_path, 'r+b') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadError('该上传会话正在写入其他分块', 409)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def init(self, filename, size, sha256=None):
+        if size < 0 or size > self.max_size:
+            raise UploadError(f'文件大小超出限制（最大 {self.max_size} 字节）', 413)
+        self.sweep()
+        upload_id = uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'offset': 0,
+            'created_at': time.time(),
+        }
+        self._save(meta, meta_path)
+        return self._public(meta)
+
+    def _public(self, meta):
+        return {
+            'upload_id': meta['upload_id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': meta['offset'],
+            'chunk_size': self.chunk_size,
+        }
+
+    def status(self, upload_id):
+        meta, _, _ = self._load(upload_id)
+        return self._public(meta)
+
+    def write_chunk(self, upload_id, offset, stream, length, checksum=None):
+        """
+        把 stream 中的 length 字节写到 offset 处，返回新的偏移量
+        offset 必须等于已接收的字节数，否则抛出 409 并附带当前偏移量用于续传
+        """
+        meta, meta_path, part_path = self._load(upload_id)
+        if length > self.chunk_size:
+            raise UploadError(f'分块大小超出限制（最大 {self.chunk_size} 字节）', 413)
+        if offset + length > meta['size']:
+            raise UploadError('分块超出文件声明的大小', 400)
+
+        with self._locked(part_path) as f:
+            # 拿到锁后重新读取，防止与刚结束的另一请求竞争
+            meta, _, _ = self._load(upload_id)
+            if offset != meta['offset']:
+                raise UploadError('偏移量与已接收的数据不一致', 409, offset=meta['offset'])
+
+            digest = hashlib.sha256()
+            f.seek(offset)
+            remaining = length
+            try:
+                while remaining > 0:
+                    data = stream.read(min(COPY_BUFFER, remaining))
+                    if not data:
+                        raise UploadError('分块数据不完整', 400, offset=offset)
+                    f.write(data)
+                    digest.update(data)
+                    remaining -= len(data)
+                if checksum and digest.hexdigest() != checksum.lower():
+                    raise UploadError('分块校验和不匹配', 422, offset=offset)
+            except Exception:
+                # 丢弃不完整或校验失败的分块，保持 .part 文件与 offset 一致
+                f.truncate(offset)
+                raise
+            f.truncate(offset + length)
+            f.flush()
+            os.fsync(f.fileno())
+
+            meta['offset'] = offset + length
+            self._save(meta, meta_path)
+        return meta['offset']
+
+    def complete(self, upload_id, commit):
+        """
+        校验完整性后结束会话，调用 commit(part_path) 把 .part 文件移入存储，
+        返回 (会话信息, commit 的返回值)
+        """
+        meta, meta_path, part_path = self._load(upload_id)
+        with self._locked(part_path):
+            meta, _, _ = self._load(upload_id)
+            if meta['offset'] != meta['size']:
+                raise UploadError('文件尚未上传完整', 409, offset=meta['offset'])
+            if meta['sha256']:
+                digest = hashlib.sha256()
+                with open(part_path, 'rb') as f:
+                    for data in iter(lambda: f.read(COPY_BUFFER), b''):
+                        digest.update(data)
+                if digest.hexdigest() != meta['sha256']:
+                    raise UploadError('文件校验和不匹配', 422)
+            os.remove(meta_path)
+        return meta, commit(part_path)
+
+    def abort(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        found = False
+        for path in (part_path, meta_path):
+            try:
+                os.remove(path)
+                found = True
+            except FileNotFoundError:
+                pass
+        if not found:
+            raise UploadError('上传会话不存在', 404)
+
+    def sweep(self):
+        """清理超过 session_ttl 未完成的会话"""
+        cutoff = time.time() - self.session_ttl
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,106 @@
+"""
+分页列表的总数缓存
+
+每张表的总数保存在内存中：新增 / 删除接口提交后直接加减，
+后台线程定期用 COUNT(*) 校正。列表接口默认返回估算值，
+只有显式要求时才执行精确计数。
+"""
+import threading
+import time
+
+
+class TableCounts:
+    def __init__(self, connection_factory, tables, refresh_interval=300.0):
+        """
+        connection_factory: 返回连接上下文管理器的函数（如 db_pool.connection）
+        tables: 允许计数的表名（只接受这些固定表名，避免拼接 SQL 注入）
+        """
+        self._connection_factory = connection_factory
+        self.tables = tuple(tables)
+        self.refresh_interval = refresh_interval
+        self._counts = {}
+        self._refreshed_at = {}
+        self._lock = threading.Lock()
+        self._exact_queries = 0
+        self._estimates_served = 0
+        self._thread = None
+
+    def count_sql(self, table):
+        if table not in self.tables:
+            raise ValueError(f"unknown table: {table}")
+        return f"SELECT COUNT(*) as total FROM {table}"
+
+    def record(self, table, total):
+        """保存一次精确计数的结果（异步入口自行执行 count_sql 后调用）"""
+        with self._lock:
+            self._counts[table] = total
+            self._refreshed_at[table] = time.time()
+            self._exact_queries += 1
+
+    def cached(self, table):
+        """返回缓存的估算值，没有时返回 None"""
+        with self._lock:
+            total = self._counts.get(table)
+            if total is not None:
+                self._estimates_served += 1
+            return total
+
+    def _count(self, cursor, table):
+        cursor.execute(self.count_sql(table))
+        total = cursor.fetchone()['total']
+        self.record(table, total)
+        return total
+
+    def total(self, cursor, table, exact=False):
+        """
+        返回 (total, is_exact)
+        exact=True 或尚无缓存值时用传入的游标执行 COUNT(*)
+        """
+        if not exact:
+            total = self.cached(table)
+            if total is not None:
+                return total, False
+        return self._count(cursor, table), True
+
+    def estimate(self, table):
+        """只读缓存值，没有时返回 None"""
+        with self._lock:
+            return self._counts.get(table)
+
+    def adjust(self, table, delta):
+        """写接口提交后调用，delta 为新增（正）或删除（负）的行数"""
+        with self._lock:
+            if table in self._counts:
+                self._counts[table] = max(0, self._counts[table] + delta)
+
+    def refresh(self):
+        with self._connection_factory() as connection, connection.cursor() as cursor:
+            for table in self.tables:
+                self._count(cursor, table)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='table-count-refresher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # 已在 fork 前预加载时，等到下个周期再校正
+        with self._lock:
+            preloaded = len(self._counts) == len(self.tables)
+        if preloaded:
+            time.sleep(self.refresh_interval)
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Table count refresh error: {e}")
+            time.sleep(self.refresh_interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'counts': dict(self._counts),
+                'refreshed_at': dict(self._refreshed_at),
+                'refresh_interval': self.refresh_interval,
+                'exact_queries': self._exact_queries,
+                'estimates_served': self._estimates_served,
+            }
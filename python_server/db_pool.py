@@ -0,0 +1,275 @@
+"""
+线程安全的 MySQL 连接池
+
+- 有界：同时存在的连接数不超过 max_size，借出超时抛出 PoolTimeoutError
+- 健康检查：空闲超过 health_check_interval 的连接在借出前 ping 一次
+- 空闲回收：空闲超过 max_idle_time 的连接会被关闭
+- 最大寿命：存活超过 max_lifetime 的连接在归还时关闭，避免被服务端 wait_timeout 断开
+- fork 安全：子进程丢弃从父进程继承的连接（不发送 QUIT），重新建立自己的连接
+"""
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolTimeoutError(pymysql.err.OperationalError):
+    """在 checkout_timeout 内没有借到连接"""
+
+
+class _PooledConnection:
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=10, min_idle=0, checkout_timeout=5.0,
+                 max_idle_time=300.0, max_lifetime=3600.0, health_check_interval=30.0):
+        """
+        connect: 无参工厂函数，返回一个新的 pymysql 连接
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self.min_idle = min_idle
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._init_state()
+        if hasattr(os, 'register_at_fork'):
+            pool_ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: pool_ref() and pool_ref()._after_fork())
+
+    def _init_state(self):
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # 右端为最近归还的连接（LIFO，保持热连接）
+        self._size = 0        # 已创建且未关闭的连接数（空闲 + 借出）
+        self._waiting = 0
+
+        # 统计
+        self._created = 0
+        self._closed = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _after_fork(self):
+        """
+        子进程中调用：继承的 socket 与父进程共用，只关闭本进程的文件描述符，
+        不能调用 close()（会发送 QUIT 断开父进程的连接）；锁可能在 fork 时被持有，一并重建
+        """
+        for conn in self._idle:
+            try:
+                conn.raw._force_close()
+            except Exception:
+                pass
+        self._init_state()
+
+    # ---------- 借出 / 归还 ----------
+
+    def acquire(self, timeout=None):
+        """借出一个连接，用完必须调用 release()"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        expired = []
+        try:
+            with self._lock:
+                expired = self._pop_expired_locked(started)
+                while True:
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(f"数据库连接池已满，{timeout:.1f}s 内未能获取连接")
+                    self._waiting += 1
+                    try:
+                        self._available.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+        finally:
+            # 关闭连接需要与服务端往返，在锁外进行
+            for victim in expired:
+                try:
+                    victim.raw.close()
+                except Exception:
+                    pass
+
+        try:
+            if conn is None:
+                conn = self._new_connection()
+            elif not self._is_healthy(conn):
+                # 保留连接槽位，直接换一个新连接
+                try:
+                    conn.raw.close()
+                except Exception:
+                    pass
+                with self._lock:
+                    self._closed += 1
+                conn = self._new_connection()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._checkouts += 1
+            self._wait_time_total += waited
+            if waited > self._wait_time_max:
+                self._wait_time_max = waited
+        conn.last_used = time.monotonic()
+        return conn
+
+    def release(self, conn, broken=False):
+        """归还连接；未结束的事务会被回滚，broken=True 时直接关闭"""
+        if not broken:
+            try:
+                if conn.raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    conn.raw.rollback()
+            except Exception:
+                broken = True
+
+        now = time.monotonic()
+        if broken or not conn.raw.open or now - conn.created_at > self.max_lifetime:
+            self._discard(conn)
+            return
+
+        conn.last_used = now
+        with self._lock:
+            self._idle.append(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        借出连接的上下文管理器：
+            with db_pool.connection() as connection:
+                with connection.cursor() as cursor: ...
+        块内抛出异常时自动回滚；退出时连接归还连接池
+        """
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn.raw
+        except pymysql.err.OperationalError:
+            broken = True
+            raise
+        except BaseException:
+            try:
+                conn.raw.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    # ---------- 维护 ----------
+
+    def prefill(self):
+        """预先建立 min_idle 个连接"""
+        while True:
+            with self._lock:
+                if len(self._idle) >= self.min_idle or self._size >= self.max_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            self.release(conn)
+
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接在归还时照常处理）"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'waiting': self._waiting,
+                'created': self._created,
+                'closed': self._closed,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'health_check_failures': self._health_check_failures,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+            }
+
+    # ---------- 内部方法 ----------
+
+    def _new_connection(self):
+        conn = _PooledConnection(self._connect())
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._closed += 1
+            self._available.notify()
+
+    def _is_healthy(self, conn):
+        now = time.monotonic()
+        if now - conn.created_at > self.max_lifetime:
+            return False
+        if now - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            conn.raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._health_check_failures += 1
+            return False
+
+    def _pop_expired_locked(self, now):
+        """
+        取出空闲过久的连接（调用方持有锁），保留至少 min_idle 个；
+        返回的连接已不计入连接数，由调用方在释放锁后关闭
+        """
+        expired = []
+        while len(self._idle) > self.min_idle and now - self._idle[0].last_used > self.max_idle_time:
+            expired.append(self._idle.popleft())
+            self._size -= 1
+            self._closed += 1
+        return expired
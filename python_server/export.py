@@ -0,0 +1,128 @@
+"""
+流式导出（NDJSON / CSV）
+
+使用服务端（无缓冲）游标逐行读取，通过生成器边读边写，
+内存占用与表大小无关；客户端接受 gzip 时按块压缩输出。
+"""
+import csv
+import io
+import zlib
+
+import pymysql
+
+from json_provider import dumps_bytes, encode_default
+
+FLUSH_BYTES = 64 * 1024
+
+
+def _iter_users(cursor):
+    """按用户 id 顺序读取用户与角色的关联结果，相邻行合并为一个用户"""
+    cursor.execute(
+        """
+        SELECT u.id, u.username, u.real_name, u.email, u.created_at,
+            r.id AS role_id, r.name AS role_name
+        FROM Login_users u
+        LEFT JOIN user_roles ur ON u.id = ur.user_id
+        LEFT JOIN roles r ON ur.role_id = r.id
+        ORDER BY u.id
+        """
+    )
+    current = None
+    for row in cursor:
+        if current is None or current['id'] != row['id']:
+            if current is not None:
+                yield current
+            current = {
+                'id': row['id'],
+                'username': row['username'],
+                'real_name': row['real_name'],
+                'email': row['email'],
+                'created_at': row['created_at'],
+                'roles': []
+            }
+        if row['role_id'] is not None:
+            current['roles'].append({'id': row['role_id'], 'name': row['role_name']})
+    if current is not None:
+        yield current
+
+
+def _iter_roles(cursor):
+    cursor.execute("SELECT id, name, created_at FROM roles ORDER BY id")
+    yield from cursor
+
+
+def _iter_assistants(cursor):
+    cursor.execute(
+        "SELECT id, ASSISTANT_ID, name, description, icon_url, in_use, created_at FROM assistant_info ORDER BY id"
+    )
+    yield from cursor
+
+
+EXPORTS = {
+    'users': (_iter_users, ['id', 'username', 'real_name', 'email', 'created_at', 'roles']),
+    'roles': (_iter_roles, ['id', 'name', 'created_at']),
+    'assistants': (_iter_assistants, ['id', 'ASSISTANT_ID', 'name', 'description', 'icon_url', 'in_use', 'created_at']),
+}
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        # 角色列表写成 "1:管理员|2:普通用户"，与用户列表接口的聚合格式一致
+        return '|'.join(f"{r['id']}:{r['name']}" for r in value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    # 日期等类型与 JSON 接口使用相同的格式
+    return encode_default(value)
+
+
+def _encode_rows(records, fmt, columns):
+    """把记录编码为字节块"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue().encode('utf-8-sig')
+        for record in records:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow([_csv_value(record.get(c)) for c in columns])
+            yield buffer.getvalue().encode('utf-8')
+    else:
+        for record in records:
+            yield dumps_bytes(record) + b'\n'
+
+
+def _chunked(pieces, gzip):
+    """合并为约 FLUSH_BYTES 大小的块，按需 gzip 压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            data = b''.join(buffer)
+            buffer, size = [], 0
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = b''.join(buffer)
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def stream_export(connection_factory, kind, fmt, gzip=False):
+    """返回字节块生成器；kind 为 EXPORTS 中的键，fmt 为 ndjson 或 csv"""
+    iter_records, columns = EXPORTS[kind]
+    with connection_factory() as connection:
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            yield from _chunked(_encode_rows(iter_records(cursor), fmt, columns), gzip)
+        except GeneratorExit:
+            # 客户端中断：直接断开连接，避免为丢弃剩余结果而读完整个结果集
+            connection.close()
+            raise
+        cursor.close()
@@ -0,0 +1,387 @@
+"""
+按内容寻址的上传文件存储
+
+上传时边写入边计算 SHA-256，文件以 "<sha256><扩展名>" 命名只存一份，
+同一内容被多次上传时只增加引用计数。文件名由内容决定，内容不会再变化。
+
+每次上传（包括去重和秒传）产生一个引用，并返回该引用的随机令牌；
+令牌只返回给上传者，索引中只保存其哈希。释放引用必须出示令牌，
+只知道文件 URL 的人无法删除文件。
+
+文件按哈希前缀分两级子目录存放（ab/cd/abcd...），单个目录的文件数保持在可控范围。
+元数据索引（大小、类型、引用数、创建 / 最后访问时间）保存在存储目录下的 SQLite 中，
+多个 worker 进程共享。设置 TTL 或磁盘配额时，后台线程以 LRU 顺序清理文件；两者都为 0（默认）时不清理。
+
+清理不看引用数：会话中引用的文件超过 TTL 未被访问，或配额不足时最久未访问，
+同样会被删除，之后其 URL 返回 404。因此开启清理时 /files 不能被永久缓存，
+见 app.py 中的 FILES_CACHE_CONTROL。
+"""
+import hashlib
+import mimetypes
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+
+COPY_BUFFER = 64 * 1024
+INDEX_NAME = '.index.sqlite3'
+# 每个事务最多删除的文件数，避免长时间持有索引写锁
+EVICT_BATCH = 200
+# 上传中断残留的临时文件保留时间
+TMP_MAX_AGE = 3600
+
+
+def _valid_ext(ext):
+    return ext == '' or (ext.startswith('.') and len(ext) <= 16 and ext[1:].isalnum())
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _is_content_name(name):
+    stem = os.path.splitext(name)[0]
+    return len(stem) == 64 and all(c in '0123456789abcdef' for c in stem)
+
+
+class ContentStore:
+    def __init__(self, root, ttl=0, quota_bytes=0, sweep_interval=600.0):
+        """
+        ttl: 超过该秒数未被访问的文件会被删除，0 表示不按时间清理
+        quota_bytes: 存储总大小上限，超出时删除最久未访问的文件，0 表示不限制
+        """
+        self.root = root
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.sweep_interval = sweep_interval
+        self._tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._local = threading.local()
+        self._access_lock = threading.Lock()
+        self._pending_access = {}  # name -> 最后访问时间，由清理线程批量写入索引
+        self._thread = None
+        self._remove_listeners = []
+        self._sweep_stats = {
+            'last_sweep_at': None,
+            'last_sweep_ms': 0.0,
+            'evicted_ttl': 0,
+            'evicted_quota': 0,
+            'freed_bytes': 0,
+            'failures': 0,
+        }
+        with self._db() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    name TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(blobs)")}
+            if 'mime' not in columns:
+                db.execute("ALTER TABLE blobs ADD COLUMN mime TEXT")
+            if 'last_access' not in columns:
+                db.execute("ALTER TABLE blobs ADD COLUMN last_access REAL")
+                db.execute("UPDATE blobs SET last_access = created_at")
+            db.execute("CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access)")
+            # 每个引用一行；引入引用令牌之前的引用只计入 refcount，没有对应的行
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS refs (
+                    token_hash TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS refs_name ON refs (name)")
+        self._migrate_flat_layout()
+
+    def _db(self):
+        """每个线程（及 fork 后的每个进程）使用自己的 SQLite 连接"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(os.path.join(self.root, INDEX_NAME), timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return _Transaction(db)
+
+    def _migrate_flat_layout(self):
+        """把分目录存放之前直接放在根目录下的文件移动到分片目录"""
+        for entry in os.scandir(self.root):
+            if entry.is_file() and _is_content_name(entry.name):
+                target = self.path(entry.name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(entry.path, target)
+
+    @staticmethod
+    def name_for(sha256, ext):
+        return f"{sha256}{ext.lower()}"
+
+    def path(self, name):
+        return os.path.join(self.root, name[0:2], name[2:4], name)
+
+    def ingest(self, stream, ext):
+        """从 stream 读取全部内容入库，返回 (name, size, deduplicated, ref_token)"""
+        ext = ext.lower() if _valid_ext(ext.lower()) else ''
+        tmp_path = os.path.join(self._tmp_dir, uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for data in iter(lambda: stream.read(COPY_BUFFER), b''):
+                    f.write(data)
+                    digest.update(data)
+                    size += len(data)
+            return self._commit(tmp_path, digest.hexdigest(), size, ext)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def ingest_file(self, src_path, ext):
+        """把已在磁盘上的文件（如分块上传的 .part 文件）移入存储，源文件会被移走或删除"""
+        ext = ext.lower() if _valid_ext(ext.lower()) else ''
+        digest = hashlib.sha256()
+        with open(src_path, 'rb') as f:
+            for data in iter(lambda: f.read(COPY_BUFFER), b''):
+                digest.update(data)
+        size = os.path.getsize(src_path)
+        try:
+            return self._commit(src_path, digest.hexdigest(), size, ext)
+        finally:
+            if os.path.exists(src_path):
+                os.remove(src_path)
+
+    def _commit(self, tmp_path, sha256, size, ext):
+        name = self.name_for(sha256, ext)
+        target = self.path(name)
+        now = time.time()
+        with self._db() as db:
+            row = db.execute("SELECT refcount FROM blobs WHERE name = ?", (name,)).fetchone()
+            if row is not None and os.path.exists(target):
+                db.execute(
+                    "UPDATE blobs SET refcount = refcount + 1, last_access = ? WHERE name = ?",
+                    (now, name)
+                )
+                return name, size, True, self._new_ref(db, name, now)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            db.execute(
+                """
+                INSERT INTO blobs (name, sha256, size, refcount, created_at, mime, last_access)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET refcount = refcount + 1, last_access = excluded.last_access
+                """,
+                (name, sha256, size, now, mimetypes.guess_type(name)[0], now)
+            )
+            return name, size, False, self._new_ref(db, name, now)
+
+    @staticmethod
+    def _new_ref(db, name, now):
+        token = secrets.token_urlsafe(24)
+        db.execute("INSERT INTO refs (token_hash, name, created_at) VALUES (?, ?, ?)",
+                   (_token_hash(token), name, now))
+        return token
+
+    def add_ref(self, sha256, ext):
+        """内容已存在时增加一次引用并返回 (name, size, ref_token)，否则返回 None（用于秒传）"""
+        name = self.name_for(sha256.lower(), ext)
+        now = time.time()
+        with self._db() as db:
+            row = db.execute("SELECT size FROM blobs WHERE name = ?", (name,)).fetchone()
+            if row is None or not os.path.exists(self.path(name)):
+                return None
+            db.execute(
+                "UPDATE blobs SET refcount = refcount + 1, last_access = ? WHERE name = ?",
+                (now, name)
+            )
+            return name, row[0], self._new_ref(db, name, now)
+
+    def release(self, name, ref_token):
+        """
+        释放 ref_token 对应的引用，引用数归零时删除文件；返回剩余引用数，
+        文件不存在或令牌不属于该文件（含已释放）时返回 None
+        """
+        if not ref_token:
+            return None
+        with self._db() as db:
+            deleted = db.execute(
+                "DELETE FROM refs WHERE token_hash = ? AND name = ?", (_token_hash(ref_token), name)
+            ).rowcount
+            if not deleted:
+                return None
+            row = db.execute("SELECT refcount FROM blobs WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            if row[0] > 1:
+                db.execute("UPDATE blobs SET refcount = refcount - 1 WHERE name = ?", (name,))
+                return row[0] - 1
+            self._delete_blob(db, name)
+            return 0
+
+    def _delete_blob(self, db, name):
+        db.execute("DELETE FROM blobs WHERE name = ?", (name,))
+        db.execute("DELETE FROM refs WHERE name = ?", (name,))
+        self._remove_file(name)
+
+    def add_remove_listener(self, listener):
+        """注册 listener(name)，文件被删除（引用归零或被清理）后调用，用于清理派生文件"""
+        self._remove_listeners.append(listener)
+        return listener
+
+    def _remove_file(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+        for listener in self._remove_listeners:
+            try:
+                listener(name)
+            except Exception as e:
+                print(f"File store remove listener error: {e}")
+
+    def touch(self, name):
+        """记录一次访问；只写入内存，由清理线程批量更新索引，不阻塞下载请求"""
+        with self._access_lock:
+            self._pending_access[name] = time.time()
+
+    def flush_access(self):
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        if pending:
+            with self._db() as db:
+                db.executemany(
+                    "UPDATE blobs SET last_access = MAX(COALESCE(last_access, 0), ?) WHERE name = ?",
+                    [(ts, name) for name, ts in pending.items()]
+                )
+
+    # ---------- 后台清理 ----------
+
+    def _evict_expired(self, cutoff):
+        """分批删除最后访问早于 cutoff 的文件，返回 (文件数, 字节数)"""
+        count = 0
+        freed = 0
+        while True:
+            with self._db() as db:
+                rows = db.execute(
+                    "SELECT name, size FROM blobs WHERE last_access < ? ORDER BY last_access LIMIT ?",
+                    (cutoff, EVICT_BATCH)
+                ).fetchall()
+                for name, size in rows:
+                    self._delete_blob(db, name)
+            count += len(rows)
+            freed += sum(size for _, size in rows)
+            if len(rows) < EVICT_BATCH:
+                return count, freed
+
+    def _evict_over_quota(self):
+        """总大小超出配额时按最后访问时间从旧到新删除，返回 (文件数, 字节数)"""
+        count = 0
+        freed = 0
+        while True:
+            with self._db() as db:
+                total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+                excess = total - self.quota_bytes
+                if excess <= 0:
+                    return count, freed
+                rows = db.execute(
+                    "SELECT name, size FROM blobs ORDER BY last_access LIMIT ?", (EVICT_BATCH,)
+                ).fetchall()
+                if not rows:
+                    return count, freed
+                for name, size in rows:
+                    self._delete_blob(db, name)
+                    count += 1
+                    freed += size
+                    excess -= size
+                    if excess <= 0:
+                        break
+
+    def _remove_stale_tmp(self):
+        cutoff = time.time() - TMP_MAX_AGE
+        for entry in os.scandir(self._tmp_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def sweep(self):
+        """写入访问时间，删除超过 TTL 未访问的文件，超出配额时按 LRU 删除"""
+        started = time.monotonic()
+        self.flush_access()
+        evicted_ttl = evicted_quota = freed = 0
+        if self.ttl > 0:
+            evicted_ttl, freed_ttl = self._evict_expired(time.time() - self.ttl)
+            freed += freed_ttl
+        if self.quota_bytes > 0:
+            evicted_quota, freed_quota = self._evict_over_quota()
+            freed += freed_quota
+        self._remove_stale_tmp()
+        with self._access_lock:
+            self._sweep_stats['last_sweep_at'] = time.time()
+            self._sweep_stats['last_sweep_ms'] = round((time.monotonic() - started) * 1000, 3)
+            self._sweep_stats['evicted_ttl'] += evicted_ttl
+            self._sweep_stats['evicted_quota'] += evicted_quota
+            self._sweep_stats['freed_bytes'] += freed
+
+    def start(self):
+        """启动后台清理线程，每 sweep_interval 秒执行一次 sweep"""
+        self._thread = threading.Thread(target=self._run, name='file-store-sweeper', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                with self._access_lock:
+                    self._sweep_stats['failures'] += 1
+                print(f"File store sweep error: {e}")
+
+    def stats(self):
+        with self._db() as db:
+            files, refs, stored, referenced = db.execute(
+                """
+                SELECT COUNT(*), COALESCE(SUM(refcount), 0),
+                    COALESCE(SUM(size), 0), COALESCE(SUM(size * refcount), 0)
+                FROM blobs
+                """
+            ).fetchone()
+        with self._access_lock:
+            sweep_stats = dict(self._sweep_stats)
+            pending = len(self._pending_access)
+        return {
+            'files': files,
+            'references': refs,
+            'stored_bytes': stored,
+            # 不去重时需要占用的空间
+            'referenced_bytes': referenced,
+            'ttl': self.ttl,
+            'quota_bytes': self.quota_bytes,
+            'pending_access_updates': pending,
+            **sweep_stats,
+        }
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT，同一文件的引用计数更新跨进程串行"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute('BEGIN IMMEDIATE')
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb):
+        self._db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
@@ -0,0 +1,184 @@
+"""
+密码哈希进程池
+
+generate_password_hash / check_password_hash 是刻意设计的高 CPU 开销操作，
+在请求线程里执行会持有 GIL 阻塞同一 worker 的其他请求，因此交给独立进程计算。
+同时排队的请求数有上限，超过时抛出 HashingBusy，由接口返回 503。
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# 每个进程的哈希进程数；serve.py / asgi_app.py 多 worker 启动时默认设为 CPU 核数 ÷ worker 数
+HASH_WORKERS = int(os.getenv('password_hash_workers', os.cpu_count() or 2))
+# werkzeug 的哈希方法字符串，可调整成本，如 scrypt:16384:8:1 或 pbkdf2:sha256:600000
+HASH_METHOD = os.getenv('password_hash_method', 'scrypt')
+# 同时在进程池中排队 / 执行的请求上限，以及等待名额的最长时间
+MAX_PENDING = int(os.getenv('password_hash_max_pending', HASH_WORKERS * 4))
+QUEUE_TIMEOUT = float(os.getenv('password_hash_queue_timeout', 2))
+
+
+class HashingBusy(Exception):
+    """哈希进程池排队已满"""
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_method_prefix = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    'submitted': 0,
+    'completed': 0,
+    'rejected': 0,
+    'in_flight': 0,
+    'queue_time_total': 0.0,
+    'queue_time_max': 0.0,
+    'exec_time_total': 0.0,
+}
+
+
+def get_executor():
+    """懒加载进程池；fork 后的子进程会创建自己的进程池"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # 在多线程进程里直接 fork 可能死锁，使用 forkserver / spawn 启动子进程
+            method = 'spawn' if sys.platform == 'win32' else 'forkserver'
+            _executor = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS,
+                mp_context=multiprocessing.get_context(method),
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _timed(fn, *args):
+    """在子进程中执行，返回 (结果, 开始时间, 耗时) 用于统计排队时间"""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started
+
+
+def _submit(fn, *args):
+    """占用一个排队名额后提交到进程池，返回交给 _wait 的句柄；等待名额超时抛出 HashingBusy"""
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        with _stats_lock:
+            _stats['rejected'] += 1
+        raise HashingBusy('password hashing queue is full')
+    submitted = time.time()
+    with _stats_lock:
+        _stats['submitted'] += 1
+        _stats['in_flight'] += 1
+    try:
+        return get_executor().submit(_timed, fn, *args), submitted
+    except BaseException:
+        _release_slot()
+        raise
+
+
+def _release_slot():
+    _slots.release()
+    with _stats_lock:
+        _stats['in_flight'] -= 1
+
+
+def _wait(pending):
+    """等待 _submit 提交的任务完成，释放名额并记录排队 / 执行时间"""
+    future, submitted = pending
+    try:
+        result, started, duration = future.result()
+    finally:
+        _release_slot()
+    queued = max(0.0, started - submitted)
+    with _stats_lock:
+        _stats['completed'] += 1
+        _stats['queue_time_total'] += queued
+        _stats['queue_time_max'] = max(_stats['queue_time_max'], queued)
+        _stats['exec_time_total'] += duration
+    return result
+
+
+def _run(fn, *args):
+    return _wait(_submit(fn, *args))
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def _hash_many(passwords, method):
+    return [generate_password_hash(p, method) for p in passwords]
+
+
+def hash_passwords(passwords, chunk_size=8):
+    """
+    并行计算一批密码的哈希（批量导入用），返回顺序与输入一致
+    按小块分波提交，每波最多占满一次进程池，登录等交互请求不会排在整批之后。
+    每块占用一个排队名额，与登录共用 MAX_PENDING 上限和统计；名额不足时抛出 HashingBusy
+    """
+    passwords = list(passwords)
+    chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+    hashes = []
+    for i in range(0, len(chunks), HASH_WORKERS):
+        pending = []
+        try:
+            for chunk in chunks[i:i + HASH_WORKERS]:
+                pending.append(_submit(_hash_many, chunk, HASH_METHOD))
+        finally:
+            # 本波中途被拒时，已提交的块也要等完并释放名额
+            results = _wait_all(pending)
+        for result in results:
+            hashes.extend(result)
+    return hashes
+
+
+def _wait_all(pending):
+    results = []
+    error = None
+    for item in pending:
+        try:
+            results.append(_wait(item))
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return results
+
+
+def needs_rehash(pwhash):
+    """存储的哈希参数与当前配置不一致时返回 True（登录成功后透明升级）"""
+    global _method_prefix
+    if _method_prefix is None:
+        # 用一次哈希得到当前配置展开后的完整参数，如 scrypt:32768:8:1
+        sample = _run(generate_password_hash, '', HASH_METHOD)
+        _method_prefix = sample.split('$', 1)[0]
+    return pwhash.split('$', 1)[0] != _method_prefix
+
+
+def stats():
+    with _stats_lock:
+        completed = _stats['completed']
+        return {
+            'workers': HASH_WORKERS,
+            'method': HASH_METHOD,
+            'max_pending': MAX_PENDING,
+            'in_flight': _stats['in_flight'],
+            'submitted': _stats['submitted'],
+            'completed': completed,
+            'rejected': _stats['rejected'],
+            'queue_time_avg_ms': round(_stats['queue_time_total'] * 1000 / completed, 3) if completed else 0.0,
+            'queue_time_max_ms': round(_stats['queue_time_max'] * 1000, 3),
+            'exec_time_avg_ms': round(_stats['exec_time_total'] * 1000 / completed, 3) if completed else 0.0,
+        }
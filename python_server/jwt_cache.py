@@ -0,0 +1,79 @@
+"""
+JWT 解码结果缓存
+
+同一个 token 在一次会话中会被反复校验；首次完整校验（HMAC 签名 + 声明）后，
+按 token 的 SHA-256 摘要缓存解码出的 claims，直到 exp 为止。
+命中缓存时跳过签名校验，但每次都按 exp 精确判断过期，并执行吊销检查。
+
+缓存在每个 worker 进程内，吊销状态不能只保存在这里：需要吊销 token（如退出登录）时，
+用 add_revocation_check 注册查询共享存储（数据库、Redis）的检查函数。
+"""
+import hashlib
+import threading
+import time
+
+import jwt
+
+from cache import MISSING, TTLCache
+
+
+class TokenRevoked(jwt.InvalidTokenError):
+    pass
+
+
+class JwtCache:
+    def __init__(self, secret, algorithms, maxsize=10000, max_ttl=3600.0):
+        self._secret = secret
+        self._algorithms = algorithms
+        self.max_ttl = max_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=max_ttl)
+        self._revocation_checks = []
+        self._lock = threading.Lock()
+        self._expired = 0
+        self._revoked = 0
+
+    def add_revocation_check(self, check):
+        """注册吊销检查钩子 check(claims) -> bool，返回 True 表示 token 已吊销"""
+        self._revocation_checks.append(check)
+        return check
+
+    def decode(self, token):
+        """返回 claims；过期抛出 jwt.ExpiredSignatureError，无效或已吊销抛出 jwt.InvalidTokenError"""
+        key = self._key(token)
+        claims = self._cache.get(key)
+        if claims is MISSING:
+            claims = jwt.decode(token, self._secret, algorithms=self._algorithms)
+            exp = claims.get('exp')
+            ttl = self.max_ttl if exp is None else min(self.max_ttl, exp - time.time())
+            if ttl > 0:
+                self._cache.set(key, claims, ttl=ttl)
+        elif claims.get('exp') is not None and claims['exp'] <= time.time():
+            # 与 PyJWT 的判定一致：exp <= 当前时间即为过期
+            self._cache.delete(key)
+            with self._lock:
+                self._expired += 1
+            raise jwt.ExpiredSignatureError('Signature has expired')
+
+        if any(check(claims) for check in self._revocation_checks):
+            with self._lock:
+                self._revoked += 1
+            raise TokenRevoked('Token has been revoked')
+        return claims
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def stats(self):
+        cache_stats = self._cache.stats()
+        with self._lock:
+            return {
+                'size': cache_stats['size'],
+                'maxsize': cache_stats['maxsize'],
+                'hits': cache_stats['hits'],
+                'misses': cache_stats['misses'],
+                'hit_rate': cache_stats['hit_rate'],
+                'evictions': cache_stats['evictions'],
+                'expired': self._expired,
+                'revoked': self._revoked,
+            }
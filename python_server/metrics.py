@@ -0,0 +1,363 @@
+"""
+Prometheus 指标
+
+不依赖 prometheus_client：计数器 / 仪表 / 直方图在进程内以字典累加，
+请求 /metrics 时按 Prometheus 文本格式（0.0.4）输出。热路径上每次记录只是一次
+bisect 加一次加锁的字典更新。
+
+多进程部署（gunicorn 多 worker）时设置 directory：各进程定期把自己的数据写入
+<directory>/<pid>.json，输出时合并所有存活进程的数据，无论抓取请求落在哪个 worker
+上结果都相同。worker 退出后，其计数器和直方图被累加到 <directory>/dead_workers.json
+后再删除快照文件（与 prometheus_client 多进程模式相同），worker 重启不会使总数回落；
+仪表（gauge）只反映存活进程，退出进程的值直接丢弃。
+"""
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:  # Windows：只能单进程运行，不需要合并退出进程的数据
+    fcntl = None
+
+# 秒：覆盖 1ms（缓存命中）到 10s（导出、批量上传）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 退出进程的累计数据；文件名不是 pid，不会被当作存活进程的快照
+DEAD_WORKERS_FILE = 'dead_workers.json'
+# 随进程累加的指标类型，退出后保留；gauge 只反映存活进程
+CUMULATIVE_TYPES = ('counter', 'histogram')
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # labels tuple -> value
+
+    def samples(self):
+        with self._lock:
+            return {labels: value for labels, value in self._values.items()}
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def describe(self):
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackGauge(Metric):
+    """输出时调用 func 取值，func 返回 {labels tuple: value}；适合已有 stats() 的组件"""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, func):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def samples(self):
+        try:
+            return dict(self.func())
+        except Exception as e:
+            print(f"Metrics callback error for {self.name}: {e}")
+            return {}
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels, value):
+        # 各桶内计数（非累计），最后一个桶为 +Inf；输出时再累加
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            state['buckets'][index] += 1
+            state['sum'] += value
+
+    def samples(self):
+        with self._lock:
+            return {labels: {'buckets': list(state['buckets']), 'sum': state['sum']}
+                    for labels, state in self._values.items()}
+
+    def describe(self):
+        return {**super().describe(), 'buckets': list(self.buckets)}
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=5.0):
+        """
+        directory: 多进程共享目录，为空时只输出当前进程的数据
+        flush_interval: 写出本进程数据的间隔（秒），即其他 worker 看到的数据最多延迟这么久
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._thread = None
+        self._thread_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            # 预热阶段在 master 中记录的数据不应被每个 worker 各复制一份
+            registry_ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: registry_ref() and registry_ref().reset())
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def callback_gauge(self, name, documentation, labelnames, func):
+        return self.register(CallbackGauge(name, documentation, labelnames, func))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    # ---------- 多进程 ----------
+
+    def snapshot(self):
+        return {
+            metric.name: {
+                **metric.describe(),
+                'samples': [[list(labels), value] for labels, value in metric.samples().items()],
+            }
+            for metric in self._metrics
+        }
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self):
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _other_snapshots(self):
+        pid = os.getpid()
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext != '.json' or not name.isdigit() or int(name) == pid:
+                continue
+            if not _pid_alive(int(name)):
+                self._fold_dead(entry.path)
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        dead = self._dead_totals()
+        if dead:
+            snapshots.append(dead)
+        return snapshots
+
+    def _dead_totals(self):
+        try:
+            with open(os.path.join(self.directory, DEAD_WORKERS_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Metrics dead worker totals error: {e}")
+            return {}
+
+    def _fold_dead(self, path):
+        """
+        把已退出进程的计数器和直方图累加到 dead_workers.json 后删除其快照。
+        多个 worker 可能同时发现同一个退出进程：先把快照改名认领，只有改名成功的进程负责累加，
+        累加本身在文件锁内读改写
+        """
+        claimed = f'{path}.{os.getpid()}.dead'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return
+        try:
+            try:
+                with open(claimed) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                return
+            if fcntl is None:
+                return
+            totals_path = os.path.join(self.directory, DEAD_WORKERS_FILE)
+            with open(os.path.join(self.directory, f'{DEAD_WORKERS_FILE}.lock'), 'a') as lock:
+                fcntl.lockf(lock, fcntl.LOCK_EX)
+                try:
+                    totals = self._dead_totals()
+                    self._accumulate(totals, snapshot)
+                    tmp_path = f'{totals_path}.{os.getpid()}.tmp'
+                    with open(tmp_path, 'w') as f:
+                        json.dump(totals, f)
+                    os.replace(tmp_path, totals_path)
+                finally:
+                    fcntl.lockf(lock, fcntl.LOCK_UN)
+        finally:
+            try:
+                os.remove(claimed)
+            except FileNotFoundError:
+                pass
+
+    def _accumulate(self, totals, snapshot):
+        buckets = {metric.name: list(getattr(metric, 'buckets', [])) for metric in self._metrics}
+        for name, data in snapshot.items():
+            if data.get('type') not in CUMULATIVE_TYPES:
+                continue
+            current = totals.get(name)
+            if current is None or current.get('buckets', []) != data.get('buckets', []):
+                # 桶定义变化时只保留与当前代码一致的一份
+                if current is not None and current.get('buckets', []) == buckets.get(name):
+                    continue
+                totals[name] = {**data, 'samples': []}
+                current = totals[name]
+            merged = {tuple(labels): value for labels, value in current['samples']}
+            for labels, value in data['samples']:
+                _merge(merged, tuple(labels), value)
+            current['samples'] = [[list(labels), value] for labels, value in merged.items()]
+
+    def start(self):
+        """每个进程启动一个写出线程；未配置 directory 时不需要"""
+        if not self.directory or self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Metrics flush error: {e}")
+            time.sleep(self.flush_interval)
+
+    # ---------- 输出 ----------
+
+    def render(self):
+        """Prometheus 文本格式"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            snapshots.extend(self._other_snapshots())
+        lines = []
+        for metric in self._metrics:
+            merged = {}
+            for snapshot in snapshots:
+                data = snapshot.get(metric.name)
+                if data is None or data.get('buckets', []) != list(getattr(metric, 'buckets', [])):
+                    # 其他进程仍是旧版本代码、桶定义不同时跳过，避免合并出错误的数据
+                    continue
+                for labels, value in data['samples']:
+                    _merge(merged, tuple(labels), value)
+            lines.append(f'# HELP {metric.name} {_escape_help(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for labels in sorted(merged, key=lambda l: tuple(map(str, l))):
+                value = merged[labels]
+                if metric.type == 'histogram':
+                    lines.extend(_histogram_lines(metric, labels, value))
+                else:
+                    lines.append(f'{metric.name}{_labels(metric.labelnames, labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(merged, labels, value):
+    current = merged.get(labels)
+    if current is None:
+        merged[labels] = {'buckets': list(value['buckets']), 'sum': value['sum']} if isinstance(value, dict) else value
+    elif isinstance(value, dict):
+        current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+        current['sum'] += value['sum']
+    else:
+        merged[labels] = current + value
+
+
+def _histogram_lines(metric, labels, value):
+    cumulative = 0
+    for bound, count in zip(metric.buckets + (math.inf,), value['buckets']):
+        cumulative += count
+        le = '+Inf' if bound == math.inf else _number(bound)
+        yield f'{metric.name}_bucket{_labels(metric.labelnames + ("le",), labels + (le,))} {cumulative}'
+    yield f'{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(value["sum"])}'
+    yield f'{metric.name}_count{_labels(metric.labelnames, labels)} {cumulative}'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
@@ -0,0 +1,139 @@
+"""
+游标（keyset）分页工具
+
+游标是对 {scope, 方向, 排序键} 的 base64url 编码，对客户端不透明。
+翻页时按排序键做范围查找 (WHERE key < 上一页最后一行)，耗时与页码深度无关。
+
+范围查找需要覆盖全部排序列的索引，否则每页仍要扫描并排序整张表。
+按 (created_at, id) 分页的表在已有数据库上需执行一次：
+
+    ALTER TABLE Login_users ADD INDEX idx_created_at (created_at, id);
+    ALTER TABLE assistant_info ADD INDEX idx_created_at (created_at, id);
+
+（bench/schema.sql 已包含）。可为 NULL 的排序列通过 nullable 声明，
+按 MySQL 的规则把 NULL 视为最小值：降序时排在最后，翻页条件中单独处理 IS NULL。
+"""
+import base64
+import json
+from datetime import datetime
+
+_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.strftime(_DATETIME_FORMAT)}
+    return value
+
+
+def _decode_value(value):
+    """游标来自客户端，只接受 _encode_value 能产生的值，其他类型不能作为查询参数"""
+    if isinstance(value, dict):
+        if set(value) != {'dt'} or not isinstance(value['dt'], str):
+            raise InvalidCursor('invalid datetime key')
+        datetime.strptime(value['dt'], _DATETIME_FORMAT)  # 格式不对时抛出 ValueError
+        return value['dt']  # MySQL 可直接比较该格式的字符串
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+        raise InvalidCursor(f'invalid key type: {type(value).__name__}')
+    return value
+
+
+def encode_cursor(scope, direction, values):
+    payload = {'s': scope, 'd': direction, 'k': [_encode_value(v) for v in values]}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, scope, key_count):
+    """返回 (direction, values)；游标格式不对或不属于该列表时抛出 InvalidCursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        direction = payload['d']
+        values = [_decode_value(v) for v in payload['k']]
+    except InvalidCursor:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if payload.get('s') != scope or direction not in ('next', 'prev') or len(values) != key_count:
+        raise InvalidCursor('cursor does not match this listing')
+    return direction, values
+
+
+def _compare(column, op, value, nullable):
+    """column op value，NULL 视为最小值"""
+    if value is None:
+        # 没有比 NULL 更小的值；比 NULL 大的是所有非 NULL 值
+        return '1 = 0' if op == '<' else f"{column} IS NOT NULL", []
+    if nullable and op == '<':
+        return f"({column} < %s OR {column} IS NULL)", [value]
+    return f"{column} {op} %s", [value]
+
+
+def _equals(column, value):
+    if value is None:
+        return f"{column} IS NULL", []
+    return f"{column} = %s", [value]
+
+
+def seek_clause(columns, values, direction, descending=True, alias='', nullable=()):
+    """
+    生成范围查找条件与排序子句
+    columns: 排序列（最后一列必须唯一，如 id），values: 游标中对应的值
+    nullable: 其中可为 NULL 的列
+    返回 (where_sql, params, order_sql)
+    """
+    prefix = f"{alias}." if alias else ''
+    # 降序列表往后翻取更小的键，往前翻取更大的键
+    backwards = direction == 'prev'
+    op = '<' if descending != backwards else '>'
+    order = 'DESC' if descending != backwards else 'ASC'
+
+    order_sql = ', '.join(f"{prefix}{c} {order}" for c in columns)
+    if not values:
+        return '1 = 1', [], order_sql
+
+    # (a, b) < (x, y)  展开为  a < x OR (a = x AND b < y)，便于走索引
+    conditions = []
+    params = []
+    for i, column in enumerate(columns):
+        parts = [_equals(f"{prefix}{c}", v) for c, v in zip(columns[:i], values[:i])]
+        parts.append(_compare(f"{prefix}{column}", op, values[i], column in nullable))
+        conditions.append('(' + ' AND '.join(sql for sql, _ in parts) + ')')
+        for _, part_params in parts:
+            params.extend(part_params)
+    return '(' + ' OR '.join(conditions) + ')', params, order_sql
+
+
+def build_page(rows, per_page, scope, direction, had_cursor, key):
+    """
+    rows: 按 seek_clause 顺序查询的 per_page + 1 行
+    key: 从行中取排序键列表的函数
+    返回 (page_rows, pagination_info)，page_rows 始终为列表的正常显示顺序
+    """
+    has_more = len(rows) > per_page
+    rows = list(rows[:per_page])
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == 'next':
+            more_after, more_before = has_more, had_cursor
+        else:
+            more_after, more_before = True, has_more
+        if more_after:
+            next_cursor = encode_cursor(scope, 'next', key(rows[-1]))
+        if more_before:
+            prev_cursor = encode_cursor(scope, 'prev', key(rows[0]))
+
+    return rows, {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_more': next_cursor is not None
+    }
@@ -0,0 +1,232 @@
+"""
+请求剖析
+
+两种触发方式，结果相同：
+- 按需：请求携带 X-Profile: <profiler_token>（或 ?_profile=<profiler_token>）时剖析该请求
+- 慢请求采样：配置了阈值时所有请求都在采样范围内，结束时耗时超过阈值才写出，其余丢弃
+
+采样线程每隔 interval 秒读取一次被剖析请求所在线程的调用栈（sys._current_frames），
+不修改被剖析的代码，开销与请求数无关。每个请求写出两个文件：
+- <name>.collapsed：折叠栈（"a;b;c 次数"），可直接交给 flamegraph.pl / speedscope 生成火焰图
+- <name>.json：总耗时、数据库耗时（按语句分类）与其余 Python 耗时的拆分
+
+结果通过 /api/admin/profiles 读取，同样需要携带 profiler_token（X-Profile 或 ?_profile=）。
+"""
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from datetime import datetime
+
+
+class RequestProfile:
+    __slots__ = ('thread_id', 'started', 'forced', 'stacks', 'db_time', 'queries')
+
+    def __init__(self, forced):
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.forced = forced
+        self.stacks = Counter()
+        self.db_time = 0.0
+        self.queries = {}  # 语句分类 -> [次数, 耗时]
+
+
+class Profiler:
+    def __init__(self, directory, token=None, slow_threshold=0.0, interval=0.005, max_files=200):
+        """
+        token: 按需剖析的口令，为空时不允许按需剖析
+        slow_threshold: 慢请求阈值（秒），0 表示不自动采样
+        max_files: 最多保留的剖析结果数，超出时删除最旧的
+        """
+        self.directory = directory
+        self.token = token
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+        self.max_files = max_files
+        self._code_names = {}
+        self._init_state()
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            # 采样线程不会被 fork 继承
+            profiler_ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: profiler_ref() and profiler_ref()._init_state())
+
+    def _init_state(self):
+        self._lock = threading.Lock()
+        self._active = {}  # 线程 id -> RequestProfile
+        self._thread_pid = None
+        self._seq = 0
+        self._stats = {'profiled': 0, 'written': 0, 'discarded': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.slow_threshold > 0
+
+    def requested(self, value):
+        """请求中携带的口令是否正确"""
+        # compare_digest 只接受 ASCII 字符串，按字节比较，请求中的任意字符都不会引发异常
+        return (bool(self.token) and bool(value)
+                and hmac.compare_digest(value.encode('utf-8'), self.token.encode('utf-8')))
+
+    def begin(self, forced=False):
+        """开始剖析当前线程上的请求；未被要求且未开启慢请求采样时返回 None"""
+        if not forced and self.slow_threshold <= 0:
+            return None
+        self._ensure_sampler()
+        profile = RequestProfile(forced)
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            self._stats['profiled'] += 1
+        return profile
+
+    def record_query(self, name, seconds):
+        """由数据库游标调用，累计当前请求的数据库耗时"""
+        profile = self._active.get(threading.get_ident())
+        if profile is None:
+            return
+        profile.db_time += seconds
+        entry = profile.queries.get(name)
+        if entry is None:
+            profile.queries[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def end(self, profile, **info):
+        """
+        结束剖析，返回 (name, summary)；不需要保存时返回 (None, summary)
+        info 为写入结果的请求信息（endpoint、method、path、status 等）
+        """
+        total = time.perf_counter() - profile.started
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+        summary = {
+            **info,
+            'forced': profile.forced,
+            'total_ms': round(total * 1000, 3),
+            'db_ms': round(profile.db_time * 1000, 3),
+            'python_ms': round(max(total - profile.db_time, 0.0) * 1000, 3),
+            'db_queries': sorted(
+                ({'query': name, 'count': count, 'ms': round(seconds * 1000, 3)}
+                 for name, (count, seconds) in profile.queries.items()),
+                key=lambda q: q['ms'], reverse=True
+            ),
+            'samples': sum(profile.stacks.values()),
+            'interval_ms': self.interval * 1000,
+        }
+        if not profile.forced and total < self.slow_threshold:
+            with self._lock:
+                self._stats['discarded'] += 1
+            return None, summary
+        try:
+            name = self._write(profile, summary)
+        except OSError as e:
+            print(f"Profile write error: {e}")
+            return None, summary
+        return name, summary
+
+    def cancel(self, profile):
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+
+    # ---------- 采样 ----------
+
+    def _ensure_sampler(self):
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name='profiler', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    profile.stacks[self._collapse(frame)] += 1
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = self._code_names.get(code)
+            if name is None:
+                name = self._code_names[code] = (
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+            names.append(name)
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    # ---------- 结果文件 ----------
+
+    def _write(self, profile, summary):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        endpoint = ''.join(c if c.isalnum() or c == '_' else '-' for c in str(summary.get('endpoint', 'request')))
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{endpoint}-{int(summary['total_ms'])}ms-{os.getpid()}-{seq}"
+        base = os.path.join(self.directory, name)
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in profile.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.json', 'w') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        with self._lock:
+            self._stats['written'] += 1
+        self._prune()
+        return name
+
+    def _prune(self):
+        summaries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in summaries[:max(len(summaries) - self.max_files, 0)]:
+            stem = entry.path[:-len('.json')]
+            for path in (stem + '.json', stem + '.collapsed'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """已保存的剖析结果摘要，最新的在前"""
+        if not os.path.isdir(self.directory):
+            return []
+        results = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            results.append({'name': entry.name[:-len('.json')], **summary})
+        results.sort(key=lambda r: r['name'], reverse=True)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'on_demand': bool(self.token),
+                'slow_threshold_ms': self.slow_threshold * 1000,
+                'interval_ms': self.interval * 1000,
+                'active': len(self._active),
+                **self._stats,
+            }
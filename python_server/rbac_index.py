@@ -0,0 +1,400 @@
+"""
+内存中的 RBAC 物化索引：用户 → 角色 → 应用
+
+启动时从 MySQL 全量加载，管理端写接口在提交后原地增量更新，
+后台线程定期与数据库全量对账，以捕获绕过 API 的修改。
+增量更新在写锁内原地修改各个 dict，其中的集合值都是 frozenset，只会整体替换、
+不会被修改。读路径只做单次 dict 查找并遍历取到的 frozenset，在 GIL 下
+不会看到修改到一半的集合，因此无需加锁；需要遍历 dict 的操作都在写锁内进行。
+全量加载则构建新的快照后整体替换。
+
+用户名按 MySQL _ci 排序规则的主要行为归一化（忽略大小写和末尾空格）后作为键，
+与 WHERE username = %s 的匹配结果一致；重音等其他差异无法在内存中完全复现，
+查不到时由调用方回退到 SQL 查询。
+
+version 是当前授权关系（用户-角色、角色-应用、可用助手）的摘要，
+由数据内容决定而与加载顺序无关，多个 worker 数据一致时版本号相同，
+可写入 JWT 判断 token 中携带的权限是否仍然有效。摘要是各条关系哈希的异或，
+全量加载时计算一次，增量更新时只异或增删的关系。
+
+多 worker 部署时，各进程有各自的索引，增量更新只发生在处理写请求的那个进程。
+写入后把共享的写入代数（cache.make_generation）加一；其他进程读取时发现代数
+与自己加载时不同，就判定索引已过期：ready 为 False（调用方回退到 SQL），
+并唤醒后台线程立即重新加载，而不是等到下一次定期对账。
+
+代数保存在共享文件或 Redis 中，逐次读取会让每个请求多一次 pread / Redis GET。
+generation_check_interval 内复用上次读取的代数：代价是其他进程的写入最多晚这么久
+才被发现，期间本进程仍按旧索引回答；本进程自己的写入立即生效。
+其他进程的任何写入都会触发一次全量重新加载（而不是同步增量）：授权写入是低频的
+管理操作，全量加载在后台线程中进行、频率受 min_reload_interval 限制，期间读取回退到 SQL；
+同步增量需要一份所有进程共享的变更日志，不值得为此引入。
+"""
+import hashlib
+import threading
+import time
+
+from cache import MISSING, LocalGeneration
+
+
+class _Snapshot:
+    __slots__ = ('user_ids', 'usernames', 'user_roles', 'roles', 'role_apps', 'assistants', 'digest')
+
+    def __init__(self):
+        self.user_ids = {}    # ci_key(username) -> user_id
+        self.usernames = {}   # user_id -> username
+        self.user_roles = {}  # user_id -> frozenset(role_id)
+        self.roles = {}       # role_id -> name
+        self.role_apps = {}   # role_id -> frozenset(app_id)
+        self.assistants = {}  # app_id -> 前端需要的助手信息（仅 in_use 为 ACTIVE 的助手）
+        self.digest = 0       # 授权关系摘要，见 _digest
+
+
+def ci_key(value):
+    """
+    与 utf8mb4_general_ci 等 PAD SPACE 的 _ci 排序规则一致：不区分大小写，忽略末尾空格；
+    用于在内存中按数据库的规则比较用户名、邮箱
+    """
+    return str(value).rstrip(' ').casefold()
+
+
+def _is_active(in_use):
+    return str(in_use or '').upper() == 'ACTIVE'
+
+
+def _fact_hash(*fact):
+    return int.from_bytes(hashlib.blake2b(repr(fact).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _digest(state):
+    """对每条授权关系取 64 位哈希后异或，结果与遍历顺序无关，可随增删逐条更新"""
+    value = 0
+    for user_id, role_ids in state.user_roles.items():
+        for role_id in role_ids:
+            value ^= _fact_hash('ur', user_id, role_id)
+    for role_id, app_ids in state.role_apps.items():
+        for app_id in app_ids:
+            value ^= _fact_hash('ra', role_id, app_id)
+    for app_id in state.assistants:
+        value ^= _fact_hash('a', app_id)
+    return value
+
+
+# 以下函数在写锁内修改快照，同时异或增删的关系以维护 digest
+
+def _set_user_roles(state, user_id, role_ids):
+    new = frozenset(role_ids)
+    for role_id in state.user_roles.get(user_id, frozenset()) ^ new:
+        state.digest ^= _fact_hash('ur', user_id, role_id)
+    state.user_roles[user_id] = new
+
+
+def _set_role_apps(state, role_id, app_ids):
+    new = frozenset(app_ids)
+    for app_id in state.role_apps.get(role_id, frozenset()) ^ new:
+        state.digest ^= _fact_hash('ra', role_id, app_id)
+    state.role_apps[role_id] = new
+
+
+def _set_assistant(state, app_id, entry):
+    """entry 为 None 时移除（停用或删除）"""
+    if (app_id in state.assistants) != (entry is not None):
+        state.digest ^= _fact_hash('a', app_id)
+    if entry is None:
+        state.assistants.pop(app_id, None)
+    else:
+        state.assistants[app_id] = entry
+
+
+def _assistant_entry(row):
+    return {
+        "ASSISTANT_ID": row['ASSISTANT_ID'],
+        "name": row['name'],
+        "description": row['description'],
+        "icon_url": row['icon_url']
+    }
+
+
+class RbacIndex:
+    def __init__(self, connection_factory, reconcile_interval=60.0, generation=None, min_reload_interval=1.0,
+                 generation_check_interval=0.0):
+        """
+        connection_factory: 返回连接上下文管理器的函数（如 db_pool.connection）
+        generation: 各 worker 共享的写入代数（cache.make_generation），缺省只在进程内计数
+        min_reload_interval: 因其他进程写入而重新加载的最小间隔，期间读取回退到 SQL
+        generation_check_interval: 复用上次读取的共享代数的秒数，0 表示每次读取
+        """
+        self._connection_factory = connection_factory
+        self.reconcile_interval = reconcile_interval
+        self.min_reload_interval = min_reload_interval
+        self._generation = generation if generation is not None else LocalGeneration()
+        self._seen = None  # 当前快照对应的写入代数
+        self.generation_check_interval = generation_check_interval
+        self._checked = (float('-inf'), None)  # (monotonic 时间, 当时读到的共享代数)
+        self._reload = threading.Event()
+        self._state = None
+        self._write_lock = threading.Lock()
+        self._mutations = 0
+        self._loaded_at = None
+        self._load_duration = 0.0
+        self._load_failures = 0
+        self._thread = None
+
+    @property
+    def ready(self):
+        """已加载且没有其他进程尚未同步的写入；为 False 时调用方回退到 SQL"""
+        seen = self._seen
+        if self._state is None:
+            return False
+        if seen is not None and self._current_generation() == seen:
+            return True
+        self._reload.set()
+        return False
+
+    @property
+    def generation(self):
+        """当前的共享写入代数，读取失败时为 None"""
+        return self._current_generation()
+
+    def _current_generation(self):
+        checked_at, value = self._checked
+        now = time.monotonic()
+        if now - checked_at < self.generation_check_interval:
+            return value
+        value = self._generation.get()
+        self._checked = (now, value)
+        return value
+
+    # ---------- 加载 / 对账 ----------
+
+    def load(self, attempts=3):
+        """全量加载；加载期间有增量写入时重试，避免覆盖更新的数据"""
+        for _ in range(attempts):
+            mutations_before = self._mutations
+            # 先取代数再读库：读库期间其他进程的写入会让代数前进，下次读取时再次重新加载
+            generation = self._generation.get()
+            self._checked = (time.monotonic(), generation)
+            started = time.monotonic()
+            state = self._fetch()
+            with self._write_lock:
+                if self._mutations != mutations_before:
+                    continue
+                self._state = state
+                self._seen = generation
+                self._loaded_at = time.time()
+                self._load_duration = time.monotonic() - started
+                return True
+        return False
+
+    def _fetch(self):
+        state = _Snapshot()
+        with self._connection_factory() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT id, username FROM Login_users")
+            for row in cursor.fetchall():
+                state.user_ids[ci_key(row['username'])] = row['id']
+                state.usernames[row['id']] = row['username']
+
+            cursor.execute("SELECT id, name FROM roles")
+            for row in cursor.fetchall():
+                state.roles[row['id']] = row['name']
+
+            user_roles = {}
+            cursor.execute("SELECT user_id, role_id FROM user_roles")
+            for row in cursor.fetchall():
+                user_roles.setdefault(row['user_id'], set()).add(row['role_id'])
+            state.user_roles = {k: frozenset(v) for k, v in user_roles.items()}
+
+            role_apps = {}
+            cursor.execute("SELECT role_id, app_id FROM role_apps")
+            for row in cursor.fetchall():
+                role_apps.setdefault(row['role_id'], set()).add(row['app_id'])
+            state.role_apps = {k: frozenset(v) for k, v in role_apps.items()}
+
+            cursor.execute(
+                'SELECT id, ASSISTANT_ID, name, description, icon_url FROM assistant_info WHERE in_use="ACTIVE"'
+            )
+            for row in cursor.fetchall():
+                state.assistants[row['id']] = _assistant_entry(row)
+        state.digest = _digest(state)
+        return state
+
+    def start(self):
+        """启动后台线程：未加载时立即加载一次，之后按 reconcile_interval 定期对账"""
+        self._thread = threading.Thread(target=self._run, name='rbac-index-reconciler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # 已在 fork 前预加载（子进程共享父进程的数据）时，等到下个周期或发现过期时再加载
+        if self._state is not None:
+            self._reload.wait(self.reconcile_interval)
+        while True:
+            self._reload.clear()
+            try:
+                self.load()
+            except Exception as e:
+                self._load_failures += 1
+                print(f"RBAC index load error: {e}")
+            # 其他进程持续写入时限制重新加载的频率
+            time.sleep(self.min_reload_interval)
+            self._reload.wait(max(self.reconcile_interval - self.min_reload_interval, 0))
+
+    # ---------- 查询 ----------
+
+    def assistants_for_username(self, username):
+        """
+        返回用户可用的助手列表（按助手 id 排序），没有时返回 None；
+        索引中找不到该用户名时返回 MISSING，由调用方回退到 SQL 查询
+        """
+        state = self._state
+        user_id = state.user_ids.get(ci_key(username))
+        if user_id is None:
+            return MISSING
+        app_ids = set()
+        for role_id in state.user_roles.get(user_id, ()):
+            app_ids.update(state.role_apps.get(role_id, ()))
+        assistants = [state.assistants[a] for a in sorted(app_ids) if a in state.assistants]
+        return assistants or None
+
+    @property
+    def version(self):
+        """授权关系版本号，索引未就绪或已过期时为 None"""
+        if not self.ready:
+            return None
+        return format(self._state.digest, '016x')
+
+    def app_ids_for_user(self, user_id):
+        state = self._state
+        app_ids = set()
+        for role_id in state.user_roles.get(user_id, ()):
+            app_ids.update(state.role_apps.get(role_id, ()))
+        return sorted(a for a in app_ids if a in state.assistants)
+
+    def assistants_for_apps(self, app_ids):
+        """按应用 id 返回可用助手（已停用的跳过），没有时返回 None"""
+        state = self._state
+        assistants = [state.assistants[a] for a in sorted(app_ids) if a in state.assistants]
+        return assistants or None
+
+    def roles_for_user(self, user_id):
+        state = self._state
+        return [
+            {'id': role_id, 'name': state.roles[role_id]}
+            for role_id in sorted(state.user_roles.get(user_id, ()))
+            if role_id in state.roles
+        ]
+
+    def role_exists(self, role_id):
+        return role_id in self._state.roles
+
+    def apps_for_role(self, role_id):
+        return sorted(self._state.role_apps.get(role_id, ()))
+
+    # ---------- 增量维护（在数据库提交后调用） ----------
+
+    def _mutate(self, fn):
+        with self._write_lock:
+            self._mutations += 1
+            if self._state is not None:
+                fn(self._state)
+            # 通知其他进程；期间没有其他进程写入时，本进程的索引仍是最新的
+            generation = self._generation.incr()
+            self._checked = (time.monotonic(), generation)
+            if generation is not None and self._seen is not None and generation == self._seen + 1:
+                self._seen = generation
+
+    def put_user(self, user_id, username, role_ids=None):
+        def apply(state):
+            old = state.usernames.get(user_id)
+            if old is not None:
+                state.user_ids.pop(ci_key(old), None)
+            state.usernames[user_id] = username
+            state.user_ids[ci_key(username)] = user_id
+            if role_ids is not None:
+                _set_user_roles(state, user_id, role_ids)
+        self._mutate(apply)
+
+    def remove_user(self, user_id):
+        def apply(state):
+            username = state.usernames.pop(user_id, None)
+            if username is not None:
+                state.user_ids.pop(ci_key(username), None)
+            _set_user_roles(state, user_id, ())
+            state.user_roles.pop(user_id, None)
+        self._mutate(apply)
+
+    def set_user_roles(self, user_id, role_ids):
+        def apply(state):
+            _set_user_roles(state, user_id, role_ids)
+        self._mutate(apply)
+
+    def put_role(self, role_id, name):
+        def apply(state):
+            state.roles[role_id] = name
+        self._mutate(apply)
+
+    def remove_role(self, role_id):
+        def apply(state):
+            state.roles.pop(role_id, None)
+            _set_role_apps(state, role_id, ())
+            state.role_apps.pop(role_id, None)
+            for user_id, role_ids in list(state.user_roles.items()):
+                if role_id in role_ids:
+                    _set_user_roles(state, user_id, role_ids - {role_id})
+        self._mutate(apply)
+
+    def grant(self, role_id, app_id):
+        def apply(state):
+            _set_role_apps(state, role_id, state.role_apps.get(role_id, frozenset()) | {app_id})
+        self._mutate(apply)
+
+    def revoke(self, role_id, app_id):
+        def apply(state):
+            if role_id in state.role_apps:
+                _set_role_apps(state, role_id, state.role_apps[role_id] - {app_id})
+        self._mutate(apply)
+
+    def apply_role_apps(self, added, removed):
+        """批量授权变更，added / removed 为 (role_id, app_id) 集合"""
+        def apply(state):
+            changes = {}
+            for role_id, app_id in added:
+                changes.setdefault(role_id, [set(), set()])[0].add(app_id)
+            for role_id, app_id in removed:
+                changes.setdefault(role_id, [set(), set()])[1].add(app_id)
+            for role_id, (plus, minus) in changes.items():
+                _set_role_apps(state, role_id, (state.role_apps.get(role_id, frozenset()) | plus) - minus)
+        self._mutate(apply)
+
+    def put_assistant(self, row):
+        """row 至少包含 id, ASSISTANT_ID, name, description, icon_url, in_use"""
+        def apply(state):
+            _set_assistant(state, row['id'], _assistant_entry(row) if _is_active(row['in_use']) else None)
+        self._mutate(apply)
+
+    def remove_assistant(self, app_id):
+        def apply(state):
+            _set_assistant(state, app_id, None)
+            for role_id, app_ids in list(state.role_apps.items()):
+                if app_id in app_ids:
+                    _set_role_apps(state, role_id, app_ids - {app_id})
+        self._mutate(apply)
+
+    def stats(self):
+        state = self._state
+        if state is None:
+            return {'ready': False, 'load_failures': self._load_failures}
+        return {
+            'ready': self.ready,
+            'generation': self._seen,
+            'generation_scope': self._generation.scope,
+            'generation_check_interval': self.generation_check_interval,
+            'users': len(state.usernames),
+            'roles': len(state.roles),
+            'user_role_links': sum(len(v) for v in list(state.user_roles.values())),
+            'role_app_links': sum(len(v) for v in list(state.role_apps.values())),
+            'active_assistants': len(state.assistants),
+            'version': self.version,
+            'loaded_at': self._loaded_at,
+            'load_duration_ms': round(self._load_duration * 1000, 3),
+            'load_failures': self._load_failures,
+            'reconcile_interval': self.reconcile_interval,
+        }
@@ -0,0 +1,99 @@
+"""
+生产环境启动入口
+
+    python serve.py                      # 默认 worker 数 = CPU 核数
+    server_workers=8 server_threads=4 python serve.py
+
+使用 gunicorn 多进程（gthread worker）运行 app：
+- master 中先导入应用并预热（RBAC 索引、表计数），再 fork 出 worker，
+  worker 以写时复制方式共享预热数据；连接池、线程池等在 fork 后由各自的 fork 钩子重建
+- SIGHUP：按新配置平滑重启所有 worker；SIGTERM：停止接收新连接，
+  等待处理中的请求完成（最长 server_graceful_timeout 秒）后退出
+- 每个 worker 处理 server_max_requests 个请求后自动替换，防止内存缓慢增长
+- 各 worker 的 RBAC 索引和进程内缓存通过共享的写入代数（rbac_generation_file，
+  配置 cache_redis_url 时为 Redis）发现其他 worker 的写入，过期期间回退到 SQL；
+  代数每 rbac_generation_check_interval 秒读取一次，其他 worker 的写入最多晚这么久生效
+- 每个 worker 有自己的密码哈希进程池（hashing.py），未设置 password_hash_workers 时
+  按 CPU 核数 ÷ worker 数分配（至少 1 个），所有 worker 的哈希进程合计约等于核数，
+  排队上限 password_hash_max_pending 同样按每个 worker 计算
+
+未安装 gunicorn（如 Windows）时退回单进程多线程的 Werkzeug 服务器。
+"""
+import os
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # 可选依赖：未安装时使用 Werkzeug 服务器
+    BaseApplication = None
+
+
+def server_options():
+    cpus = os.cpu_count() or 1
+    return {
+        'bind': os.getenv('server_bind', '0.0.0.0:5000'),
+        'workers': int(os.getenv('server_workers', cpus)),
+        'worker_class': 'gthread',
+        'threads': int(os.getenv('server_threads', 4)),
+        # 在 master 中导入应用，worker 共享预热数据
+        'preload_app': True,
+        'keepalive': int(os.getenv('server_keepalive', 5)),
+        'timeout': int(os.getenv('server_timeout', 60)),
+        'graceful_timeout': int(os.getenv('server_graceful_timeout', 30)),
+        'max_requests': int(os.getenv('server_max_requests', 10000)),
+        # 避免所有 worker 同时重启
+        'max_requests_jitter': int(os.getenv('server_max_requests_jitter', 500)),
+        'backlog': int(os.getenv('server_backlog', 2048)),
+        'accesslog': os.getenv('server_access_log') or None,
+        'errorlog': '-',
+        'post_fork': post_fork,
+    }
+
+
+def share_hash_workers(workers):
+    """
+    在导入应用前调用：按 worker 数平分 CPU 核数作为每个 worker 的密码哈希进程数，
+    避免 N 个 worker 各自启动 N 个哈希进程；显式设置的 password_hash_workers 优先
+    """
+    per_worker = max(1, (os.cpu_count() or 1) // max(1, workers))
+    os.environ.setdefault('password_hash_workers', str(per_worker))
+    return int(os.environ['password_hash_workers'])
+
+
+def post_fork(server, worker):
+    """worker 启动后立即启动后台线程，而不是等到第一个请求"""
+    import app as app_module
+    app_module.start_background_tasks()
+
+
+if BaseApplication is not None:
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None and key in self.cfg.settings:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            return create_app(warm=True)
+
+
+def main():
+    options = server_options()
+    if BaseApplication is not None:
+        share_hash_workers(options['workers'])
+        Server(options).run()
+        return
+
+    print("未安装 gunicorn，使用单进程 Werkzeug 服务器（仅适合开发和小规模部署）")
+    from app import create_app
+    app = create_app(warm=True)
+    host, _, port = options['bind'].rpartition(':')
+    app.run(host=host or '0.0.0.0', port=int(port), debug=False, threaded=True, use_reloader=False)
+
+
+if __name__ == '__main__':
+    main()
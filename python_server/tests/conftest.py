@@ -0,0 +1,16 @@
+"""
+测试配置：在导入 app 之前把文件存储等目录指向临时目录，
+测试不需要 MySQL，涉及数据库的部分使用内存中的假连接
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix='agent_chat_tests_')
+os.environ.setdefault('upload_store_dir', os.path.join(_tmp, 'store'))
+os.environ.setdefault('profiler_dir', os.path.join(_tmp, 'profiles'))
+os.environ.setdefault('password_hash_workers', '2')
+os.environ.setdefault('rbac_generation_file', os.path.join(_tmp, 'rbac_generation'))
+os.environ.setdefault('JWT_SECRET_KEY', 'agent-chat-tests-jwt-secret-key-0123456789')
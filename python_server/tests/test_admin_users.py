@@ -0,0 +1,141 @@
+import os
+from contextlib import contextmanager
+
+import pytest
+
+import app
+
+
+class FakeCursor:
+    """按顺序返回预设的查询结果，执行的语句记录在 connection.statements 中"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, sql, args=()):
+        self.connection.statements.append((' '.join(sql.split()), args))
+        self._rows = list(self.connection.results.pop(0)) if self.connection.results else []
+        self.rowcount = len(self._rows) or 1
+        self.lastrowid = 42
+
+    def executemany(self, sql, args):
+        self.connection.statements.append((' '.join(sql.split()), list(args)))
+        self.rowcount = len(args)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakePool:
+    def __init__(self, *results):
+        self.conn = FakeConnection(results)
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # 不启动后台线程（它们会连接真实数据库）
+    monkeypatch.setattr(app, '_background_pid', os.getpid())
+    return app.app.test_client()
+
+
+def use_db(monkeypatch, *results):
+    pool = FakePool(*results)
+    monkeypatch.setattr(app, 'db_pool', pool)
+    return pool.conn
+
+
+def test_duplicate_user_is_rejected_before_hashing(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'id': 1}])
+    monkeypatch.setattr(app, 'hash_password', lambda password: pytest.fail('hashed a duplicate'))
+    response = client.post('/api/admin/users', json={
+        'username': 'alice', 'real_name': 'A', 'email': 'alice@example.com', 'password': 'secret'
+    })
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '用户名或邮箱已存在'
+    assert connection.statements == [(app.USER_EXISTS_SQL, ('alice', 'alice@example.com'))]
+
+
+def test_create_user_hashes_between_existence_checks(client, monkeypatch):
+    connection = use_db(monkeypatch)
+    calls = []
+    monkeypatch.setattr(app, 'hash_password', lambda password: calls.append(len(connection.statements)) or 'h')
+    monkeypatch.setattr(app.table_counts, '_counts', {})
+    response = client.post('/api/admin/users', json={
+        'username': 'bob', 'real_name': 'B', 'email': 'bob@example.com', 'password': 'secret'
+    })
+    assert response.status_code == 201
+    # 哈希在第一次检查之后、插入事务之前计算
+    assert calls == [1]
+    assert [sql.split(' (')[0] for sql, _ in connection.statements] == [
+        app.USER_EXISTS_SQL, app.USER_EXISTS_SQL, 'INSERT INTO Login_users'
+    ]
+    assert connection.commits == 1
+
+
+def test_update_user_roles_writes_only_the_difference(client, monkeypatch):
+    connection = use_db(monkeypatch, [
+        {'username': 'alice', 'role_id': 1}, {'username': 'alice', 'role_id': 2}
+    ])
+    response = client.put('/api/admin/users/7/roles', json={'role_ids': [2, 3, 4]})
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {'added': [3, 4], 'removed': [1]}
+    assert connection.statements[1] == ('DELETE FROM user_roles WHERE user_id = %s AND role_id IN (%s)', [7, 1])
+    assert connection.statements[2] == (app.INSERT_USER_ROLES_SQL, [(7, 3), (7, 4)])
+    assert len(connection.statements) == 3 and connection.commits == 1
+
+
+def test_unchanged_user_roles_cost_a_single_read(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'username': 'alice', 'role_id': 2}])
+    response = client.put('/api/admin/users/7/roles', json={'role_ids': [2]})
+    assert response.get_json()['data'] == {'added': [], 'removed': []}
+    assert len(connection.statements) == 1 and connection.commits == 0
+
+    # 用户存在但没有任何角色时 LEFT JOIN 返回一行 role_id 为 NULL
+    connection = use_db(monkeypatch, [{'username': 'alice', 'role_id': None}])
+    assert client.put('/api/admin/users/7/roles', json={'role_ids': []}).get_json()['data'] == {'added': [], 'removed': []}
+
+    use_db(monkeypatch, [])
+    assert client.put('/api/admin/users/7/roles', json={'role_ids': [1]}).status_code == 404
+
+
+def test_create_user_inserts_roles_in_one_statement(client, monkeypatch):
+    connection = use_db(monkeypatch)
+    monkeypatch.setattr(app, 'hash_password', lambda password: 'h')
+    monkeypatch.setattr(app.table_counts, '_counts', {})
+    response = client.post('/api/admin/users', json={
+        'username': 'carol', 'real_name': 'C', 'email': 'carol@example.com', 'password': 'secret',
+        'role_ids': [3, 1, 3],
+    })
+    assert response.status_code == 201
+    assert response.get_json()['data']['role_ids'] == [1, 3]
+    assert connection.statements[-1] == (app.INSERT_USER_ROLES_SQL, [(42, 1), (42, 3)])
+    assert connection.commits == 1
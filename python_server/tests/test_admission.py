@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionLimiter, AsyncAdmissionLimiter, Overloaded
+
+
+def test_sync_limiter_rejects_when_queue_is_full():
+    limiter = AdmissionLimiter('t', max_concurrent=1, max_queue=0)
+    limiter.acquire()
+    with pytest.raises(Overloaded):
+        limiter.acquire()
+    limiter.release()
+    assert limiter.stats()['rejected_queue_full'] == 1
+
+
+def test_async_limiter_hands_slot_to_first_waiter():
+    async def scenario():
+        limiter = AsyncAdmissionLimiter('t', max_concurrent=1, max_queue=2, queue_timeout=1.0)
+        order = []
+
+        async def worker(name, hold):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        await asyncio.gather(worker('a', 0.05), worker('b', 0), worker('c', 0))
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ['a', 'b', 'c']
+    assert stats['active'] == 0 and stats['queue_depth'] == 0
+    assert stats['admitted'] == 3 and stats['queue_depth_peak'] == 2
+
+
+def test_async_limiter_rejects_full_queue_and_timeout():
+    async def scenario():
+        limiter = AsyncAdmissionLimiter('t', max_concurrent=1, max_queue=1, queue_timeout=0.05)
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        with pytest.raises(Overloaded):
+            await waiting
+        limiter.release()
+        # 超时的等待者不会占住名额
+        await asyncio.wait_for(limiter.acquire(), 0.1)
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['rejected_queue_full'] == 1 and stats['rejected_timeout'] == 1
+    assert stats['active'] == 0
+
+
+def test_cancelled_waiter_returns_its_slot():
+    async def scenario():
+        limiter = AsyncAdmissionLimiter('t', max_concurrent=1, max_queue=2, queue_timeout=1.0)
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        # 名额已转给等待者，但它在恢复运行前被取消
+        limiter.release()
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.wait_for(limiter.acquire(), 0.1)
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['active'] == 0 and stats['queue_depth'] == 0
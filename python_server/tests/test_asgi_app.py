@@ -0,0 +1,159 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiomysql')
+pytest.importorskip('httpx')
+
+from starlette.testclient import TestClient  # noqa: E402
+
+import app as wsgi  # noqa: E402
+import asgi_app  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    async def execute(self, sql, args=()):
+        self.connection.statements.append((' '.join(sql.split()), args))
+        self._rows = list(self.connection.results.pop(0)) if self.connection.results else []
+        self.rowcount = len(self._rows) or 1
+        self.lastrowid = 42
+
+    async def executemany(self, sql, args):
+        self.connection.statements.append((' '.join(sql.split()), list(args)))
+        self.rowcount = len(args)
+
+    async def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    async def fetchall(self):
+        return self._rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+        self.in_transaction = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, *_):
+        return FakeCursor(self)
+
+    async def begin(self):
+        self.in_transaction = True
+
+    async def commit(self):
+        self.in_transaction = False
+        self.commits += 1
+
+    async def rollback(self):
+        self.in_transaction = False
+        self.rollbacks += 1
+
+    def get_transaction_status(self):
+        return self.in_transaction
+
+
+class FakePool:
+    def __init__(self, *results):
+        self.connection = FakeConnection(results)
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+
+@pytest.fixture
+def client():
+    # 不运行 lifespan，避免连接真实数据库
+    return TestClient(asgi_app.app)
+
+
+def use_db(monkeypatch, *results):
+    pool = FakePool(*results)
+    monkeypatch.setattr(asgi_app, 'db', pool)
+    return pool.connection
+
+
+def test_preflight_lists_every_method_on_the_path(client):
+    response = client.options('/api/admin/roles', headers={
+        'Origin': 'http://localhost:3000', 'Access-Control-Request-Method': 'POST'
+    })
+    assert response.status_code == 204
+    assert response.headers['access-control-allow-methods'] == 'GET, POST'
+
+
+def test_create_role_commits_and_updates_counts(client, monkeypatch):
+    connection = use_db(monkeypatch, [])
+    monkeypatch.setattr(wsgi.table_counts, '_counts', {'roles': 5})
+    response = client.post('/api/admin/roles', json={'name': ' editors '})
+    assert response.status_code == 201
+    body = response.json()
+    assert body['success'] and body['data']['id'] == 42 and body['data']['name'] == 'editors'
+    assert connection.commits == 1
+    assert [sql for sql, _ in connection.statements] == [
+        'SELECT id FROM roles WHERE name = %s', 'INSERT INTO roles (name) VALUES (%s)'
+    ]
+    assert wsgi.table_counts.estimate('roles') == 6
+
+
+def test_early_return_rolls_back_open_transaction(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'id': 7}])
+    response = client.post('/api/admin/roles', json={'name': 'taken'})
+    assert response.status_code == 400 and response.json()['message'] == '角色名称已存在'
+    assert connection.commits == 0 and connection.rollbacks == 1
+
+
+def test_update_user_roles_applies_only_the_difference(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'username': 'alice', 'role_id': 1}, {'username': 'alice', 'role_id': 2}])
+    response = client.put('/api/admin/users/9/roles', json={'role_ids': [2, 3]})
+    assert response.status_code == 200
+    assert response.json()['data'] == {'added': [3], 'removed': [1]}
+    statements = connection.statements[1:]
+    assert statements[0] == ('DELETE FROM user_roles WHERE user_id = %s AND role_id IN (%s)', [9, 1])
+    assert statements[1] == (wsgi.INSERT_USER_ROLES_SQL, [(9, 3)])
+    assert connection.commits == 1
+
+
+def test_invalid_cursor_is_rejected(client, monkeypatch):
+    use_db(monkeypatch)
+    response = client.get('/api/admin/users', params={'cursor': 'garbage'})
+    assert response.status_code == 400
+    assert response.json() == {'success': False, 'message': '无效的分页游标'}
+
+
+def test_login_uses_async_limiter():
+    assert isinstance(wsgi.admission_limiters['login'], asgi_app.AsyncAdmissionLimiter)
+    assert asgi_app.admission_limiters['login'] is wsgi.admission_limiters['login']
+
+
+def test_duplicate_user_is_rejected_before_hashing(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'id': 1}])
+    monkeypatch.setattr(asgi_app, 'hash_password', lambda password: pytest.fail('hashed a duplicate'))
+    response = client.post('/api/admin/users', json={
+        'username': 'alice', 'real_name': 'A', 'email': 'alice@example.com', 'password': 'secret'
+    })
+    assert response.status_code == 400 and response.json()['message'] == '用户名或邮箱已存在'
+    assert connection.statements == [(wsgi.USER_EXISTS_SQL, ('alice', 'alice@example.com'))]
+
+
+@pytest.mark.parametrize('method', ['POST', 'DELETE'])
+def test_role_app_ids_are_validated_before_writing(client, monkeypatch, method):
+    connection = use_db(monkeypatch)
+    response = client.request(method, '/api/admin/role_apps', json={'role_id': 'admin', 'app_id': 3})
+    assert response.status_code == 400
+    assert connection.statements == [] and connection.commits == 0
@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from chunked_upload import UploadError, UploadSessions
+
+CONTENT = b'0123456789' * 3
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(str(tmp_path / 'sessions'), max_size=1024, chunk_size=10)
+
+
+def put(sessions, upload_id, offset, data, checksum=None):
+    return sessions.write_chunk(upload_id, offset, io.BytesIO(data), len(data), checksum)
+
+
+def test_resume_from_reported_offset(sessions):
+    upload_id = sessions.init('a.bin', len(CONTENT), hashlib.sha256(CONTENT).hexdigest())['upload_id']
+    assert put(sessions, upload_id, 0, CONTENT[:10]) == 10
+
+    # 客户端重发了旧分块：409 并附带服务端的偏移量
+    with pytest.raises(UploadError) as exc:
+        put(sessions, upload_id, 0, CONTENT[:10])
+    assert exc.value.status == 409 and exc.value.offset == 10
+
+    # 中断的分块被截断回起点，状态仍是 10
+    with pytest.raises(UploadError):
+        sessions.write_chunk(upload_id, 10, io.BytesIO(CONTENT[10:15]), 10)
+    assert sessions.status(upload_id)['offset'] == 10
+
+    offset = sessions.status(upload_id)['offset']
+    while offset < len(CONTENT):
+        offset = put(sessions, upload_id, offset, CONTENT[offset:offset + 10])
+
+    committed = {}
+
+    def commit(part_path):
+        with open(part_path, 'rb') as f:
+            committed['data'] = f.read()
+        return 'stored'
+
+    meta, result = sessions.complete(upload_id, commit)
+    assert result == 'stored' and committed['data'] == CONTENT
+    assert meta['filename'] == 'a.bin'
+    with pytest.raises(UploadError) as exc:
+        sessions.status(upload_id)
+    assert exc.value.status == 404
+
+
+def test_bad_chunk_checksum_is_rejected_and_discarded(sessions):
+    upload_id = sessions.init('b.bin', 10)['upload_id']
+    with pytest.raises(UploadError) as exc:
+        put(sessions, upload_id, 0, b'x' * 10, checksum='0' * 64)
+    assert exc.value.status == 422
+    assert sessions.status(upload_id)['offset'] == 0
+    assert put(sessions, upload_id, 0, b'x' * 10, checksum=hashlib.sha256(b'x' * 10).hexdigest()) == 10
+
+
+def test_incomplete_or_corrupt_upload_cannot_complete(sessions):
+    upload_id = sessions.init('c.bin', 20, hashlib.sha256(b'y' * 20).hexdigest())['upload_id']
+    put(sessions, upload_id, 0, b'y' * 10)
+    with pytest.raises(UploadError) as exc:
+        sessions.complete(upload_id, lambda path: None)
+    assert exc.value.status == 409 and exc.value.offset == 10
+
+    put(sessions, upload_id, 10, b'z' * 10)
+    with pytest.raises(UploadError) as exc:
+        sessions.complete(upload_id, lambda path: None)
+    assert exc.value.status == 422
+
+
+def test_limits_and_abort(sessions):
+    with pytest.raises(UploadError) as exc:
+        sessions.init('big.bin', 2048)
+    assert exc.value.status == 413
+    upload_id = sessions.init('d.bin', 30)['upload_id']
+    with pytest.raises(UploadError) as exc:
+        put(sessions, upload_id, 0, b'x' * 11)
+    assert exc.value.status == 413
+    sessions.abort(upload_id)
+    assert not os.listdir(sessions.root)
+    with pytest.raises(UploadError):
+        sessions.status('../../etc/passwd')
@@ -0,0 +1,66 @@
+import pytest
+
+import app
+from counts import TableCounts
+from test_admin_users import FakePool, client, use_db  # noqa: F401
+
+
+def test_first_total_counts_then_serves_estimates():
+    pool = FakePool([{'total': 120}], [{'total': 7}])
+    counts = TableCounts(pool.connection, ['roles', 'Login_users'])
+    with pool.connection() as connection, connection.cursor() as cursor:
+        assert counts.total(cursor, 'roles') == (120, True)
+        assert counts.total(cursor, 'roles') == (120, False)
+
+        counts.adjust('roles', 3)
+        counts.adjust('roles', -200)
+        # 计数不会小于 0；没有缓存的表不做加减
+        assert counts.estimate('roles') == 0
+        counts.adjust('Login_users', 5)
+        assert counts.estimate('Login_users') is None
+
+        assert counts.total(cursor, 'roles', exact=True) == (7, True)
+    assert [sql for sql, _ in pool.conn.statements] == ['SELECT COUNT(*) as total FROM roles'] * 2
+    stats = counts.stats()
+    assert stats['exact_queries'] == 2 and stats['estimates_served'] == 1
+
+
+def test_unknown_table_is_rejected():
+    counts = TableCounts(None, ['roles'])
+    with pytest.raises(ValueError):
+        counts.count_sql('roles; DROP TABLE roles')
+
+
+def test_refresh_counts_every_table():
+    pool = FakePool([{'total': 3}], [{'total': 4}])
+    counts = TableCounts(pool.connection, ['roles', 'Login_users'])
+    counts.refresh()
+    assert counts.stats()['counts'] == {'roles': 3, 'Login_users': 4}
+
+
+ROLE_ROWS = [{'id': 1, 'name': 'admin', 'created_at': None}]
+
+
+def test_roles_page_uses_the_cached_total_unless_exact_is_requested(client, monkeypatch):
+    monkeypatch.setattr(app, 'table_counts', TableCounts(None, ['roles']))
+    app.table_counts.record('roles', 41)
+
+    connection = use_db(monkeypatch, ROLE_ROWS)
+    pagination = client.get('/api/admin/roles?page=1&per_page=20').get_json()['data']['pagination']
+    assert pagination['total'] == 41 and pagination['pages'] == 3 and not pagination['total_exact']
+    assert not any('COUNT' in sql for sql, _ in connection.statements)
+
+    connection = use_db(monkeypatch, [{'total': 40}], ROLE_ROWS)
+    pagination = client.get('/api/admin/roles?page=1&per_page=20&exact_count=1').get_json()['data']['pagination']
+    assert pagination['total'] == 40 and pagination['total_exact']
+    assert connection.statements[0][0] == 'SELECT COUNT(*) as total FROM roles'
+    # 精确计数的结果更新缓存
+    assert app.table_counts.estimate('roles') == 40
+
+
+def test_creating_a_role_adjusts_the_cached_total(client, monkeypatch):
+    monkeypatch.setattr(app, 'table_counts', TableCounts(None, ['roles']))
+    app.table_counts.record('roles', 41)
+    use_db(monkeypatch)
+    assert client.post('/api/admin/roles', json={'name': 'auditor'}).status_code == 201
+    assert app.table_counts.estimate('roles') == 42
@@ -0,0 +1,122 @@
+import threading
+
+import pymysql
+import pytest
+from pymysql.constants import SERVER_STATUS
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeRaw:
+    def __init__(self):
+        self.open = True
+        self.server_status = 0
+        self.rollbacks = 0
+        self.pings = 0
+        self.ping_error = None
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.ping_error:
+            raise self.ping_error
+
+    def close(self):
+        self.open = False
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        created.append(FakeRaw())
+        return created[-1]
+    return ConnectionPool(connect, **kwargs), created
+
+
+def test_reuses_most_recently_returned_connection():
+    pool, created = make_pool(max_size=2)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    assert pool.acquire().raw is b.raw
+    assert len(created) == 2
+
+
+def test_checkout_times_out_when_pool_is_exhausted():
+    pool, _ = make_pool(max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+    # 归还后等待中的线程能借到连接
+    threading.Timer(0.02, pool.release, (held,)).start()
+    assert pool.acquire(timeout=1).raw is held.raw
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool, created = make_pool()
+    with pool.connection() as raw:
+        raw.server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    assert created[0].rollbacks == 1
+    assert pool.stats()['idle'] == 1
+
+
+def test_operational_error_discards_connection():
+    pool, created = make_pool()
+    with pytest.raises(pymysql.err.OperationalError):
+        with pool.connection():
+            raise pymysql.err.OperationalError(2013, 'Lost connection')
+    assert not created[0].open
+    stats = pool.stats()
+    assert stats['size'] == 0 and stats['closed'] == 1
+
+
+def test_failed_health_check_replaces_connection():
+    pool, created = make_pool(health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    created[0].ping_error = pymysql.err.OperationalError(2006, 'gone away')
+    replacement = pool.acquire()
+    assert replacement.raw is created[1]
+    stats = pool.stats()
+    assert stats['health_check_failures'] == 1 and stats['size'] == 1
+
+
+def test_expired_connection_is_closed_on_release():
+    pool, created = make_pool(max_lifetime=0)
+    pool.release(pool.acquire())
+    assert not created[0].open
+    assert pool.stats()['idle'] == 0
+
+
+def test_prefill_opens_min_idle_connections():
+    pool, created = make_pool(max_size=5, min_idle=3)
+    pool.prefill()
+    assert len(created) == 3
+    stats = pool.stats()
+    assert stats['idle'] == 3 and stats['size'] == 3
+    # 已满足 min_idle 时不再建连
+    pool.prefill()
+    assert len(created) == 3
+
+
+def test_idle_connections_are_closed_outside_the_lock():
+    pool, created = make_pool(max_size=3, max_idle_time=0)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+
+    lock_held = []
+    for raw in created:
+        raw.close = lambda raw=raw: (lock_held.append(pool._lock.locked()), setattr(raw, 'open', False))
+    conn = pool.acquire()
+    # 两个空闲连接都已过期：关闭后新建一个
+    assert lock_held == [False, False]
+    assert conn.raw is created[2]
+    stats = pool.stats()
+    assert stats['size'] == 1 and stats['closed'] == 2
@@ -0,0 +1,143 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+from contextlib import contextmanager
+
+import pytest
+
+import app
+import export
+
+CREATED_AT = datetime.datetime(2024, 1, 2, 3, 4, 5)
+USER_ROWS = [
+    {'id': 1, 'username': 'alice', 'real_name': '爱丽丝', 'email': 'a@example.com', 'created_at': CREATED_AT,
+     'role_id': 1, 'role_name': '管理员'},
+    {'id': 1, 'username': 'alice', 'real_name': '爱丽丝', 'email': 'a@example.com', 'created_at': CREATED_AT,
+     'role_id': 2, 'role_name': '普通用户'},
+    {'id': 2, 'username': 'bob', 'real_name': 'Bob, Jr.', 'email': None, 'created_at': None,
+     'role_id': None, 'role_name': None},
+]
+
+
+class FakeSSCursor:
+    """服务端游标：只能迭代一次，记录读取了多少行"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def execute(self, sql):
+        self.connection.statements.append(' '.join(sql.split()))
+
+    def __iter__(self):
+        for row in self.connection.rows:
+            self.connection.read += 1
+            yield row
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.read = 0
+        self.closed = False
+        self.cursor_class = None
+
+    def cursor(self, cursor_class=None):
+        self.cursor_class = cursor_class
+        return FakeSSCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def connection_factory(rows):
+    connection = FakeConnection(rows)
+
+    @contextmanager
+    def factory():
+        yield connection
+    return factory, connection
+
+
+def export_bytes(rows, kind='users', fmt='ndjson', gzip=False):
+    factory, connection = connection_factory(rows)
+    return b''.join(export.stream_export(factory, kind, fmt, gzip=gzip)), connection
+
+
+def test_users_ndjson_groups_roles_per_user():
+    data, connection = export_bytes(USER_ROWS)
+    assert connection.cursor_class is export.pymysql.cursors.SSDictCursor
+    records = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+    assert records == [
+        {'id': 1, 'username': 'alice', 'real_name': '爱丽丝', 'email': 'a@example.com',
+         'created_at': '2024-01-02T03:04:05',
+         'roles': [{'id': 1, 'name': '管理员'}, {'id': 2, 'name': '普通用户'}]},
+        {'id': 2, 'username': 'bob', 'real_name': 'Bob, Jr.', 'email': None, 'created_at': None, 'roles': []},
+    ]
+
+
+def test_users_csv_has_bom_header_and_joined_roles():
+    data, _ = export_bytes(USER_ROWS, fmt='csv')
+    # BOM 让 Excel 以 UTF-8 打开
+    assert data.startswith(b'\xef\xbb\xbf')
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+    assert rows == [
+        ['id', 'username', 'real_name', 'email', 'created_at', 'roles'],
+        ['1', 'alice', '爱丽丝', 'a@example.com', '2024-01-02T03:04:05', '1:管理员|2:普通用户'],
+        ['2', 'bob', 'Bob, Jr.', '', '', ''],
+    ]
+
+
+def test_gzip_output_decompresses_to_the_plain_export():
+    rows = [{'id': i, 'name': f'role_{i}', 'created_at': CREATED_AT} for i in range(1, 500)]
+    plain, _ = export_bytes(rows, kind='roles')
+    compressed, _ = export_bytes(rows, kind='roles', gzip=True)
+    assert gzip.decompress(compressed) == plain
+    assert len(compressed) < len(plain)
+
+
+def test_rows_are_streamed_in_chunks(monkeypatch):
+    monkeypatch.setattr(export, 'FLUSH_BYTES', 256)
+    rows = [{'id': i, 'name': f'role_{i}', 'created_at': CREATED_AT} for i in range(1, 1000)]
+    factory, connection = connection_factory(rows)
+    chunks = export.stream_export(factory, 'roles', 'ndjson')
+    first = next(chunks)
+    # 第一块发出时只读取了很少的行
+    assert 256 <= len(first) < 512
+    assert connection.read < 10
+
+    # 客户端中断时直接断开连接，不读完剩余结果
+    chunks.close()
+    assert connection.closed and connection.read < 10
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, '_background_pid', os.getpid())
+    return app.app.test_client()
+
+
+def test_export_route(client, monkeypatch):
+    factory, _ = connection_factory(USER_ROWS)
+    monkeypatch.setattr(app.db_pool, 'connection', factory)
+
+    response = client.get('/api/admin/export/users?format=csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="users-')
+    assert 'Content-Encoding' not in response.headers
+
+    response = client.get('/api/admin/export/users', headers={'Accept-Encoding': 'gzip'})
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(response.data).splitlines()) == 2
+
+    assert client.get('/api/admin/export/passwords').status_code == 404
+    assert client.get('/api/admin/export/users?format=xml').status_code == 400
@@ -0,0 +1,90 @@
+import io
+import os
+
+import pytest
+
+from file_store import ContentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / 'store'))
+
+
+def test_ingest_deduplicates_and_shards(store):
+    name, size, deduplicated, token = store.ingest(io.BytesIO(b'hello'), '.TXT')
+    assert size == 5 and not deduplicated and token
+    assert name.endswith('.txt')
+    assert store.path(name) == os.path.join(store.root, name[0:2], name[2:4], name)
+    assert os.path.exists(store.path(name))
+
+    again, _, deduplicated, other_token = store.ingest(io.BytesIO(b'hello'), '.txt')
+    assert again == name and deduplicated and other_token != token
+    assert store.stats()['references'] == 2
+
+
+def test_release_requires_the_reference_token(store):
+    name, _, _, first = store.ingest(io.BytesIO(b'shared'), '.bin')
+    _, _, _, second = store.ingest(io.BytesIO(b'shared'), '.bin')
+
+    assert store.release(name, None) is None
+    assert store.release(name, 'not-a-token') is None
+    assert store.release(name, first) == 1
+    # 同一令牌只能释放一次
+    assert store.release(name, first) is None
+    assert os.path.exists(store.path(name))
+
+    assert store.release(name, second) == 0
+    assert not os.path.exists(store.path(name))
+
+
+def test_token_is_bound_to_its_file(store):
+    name_a, _, _, token_a = store.ingest(io.BytesIO(b'a'), '')
+    name_b, _, _, _ = store.ingest(io.BytesIO(b'b'), '')
+    assert store.release(name_b, token_a) is None
+    assert store.release(name_a, token_a) == 0
+
+
+def test_add_ref_returns_new_token(store):
+    name, size, _, token = store.ingest(io.BytesIO(b'instant'), '.pdf')
+    sha256 = os.path.splitext(name)[0]
+    assert store.add_ref('0' * 64, '.pdf') is None
+    ref_name, ref_size, ref_token = store.add_ref(sha256, '.pdf')
+    assert (ref_name, ref_size) == (name, size) and ref_token != token
+    assert store.release(name, ref_token) == 1
+
+
+def test_remove_listener_runs_on_last_release(store):
+    removed = []
+    store.add_remove_listener(removed.append)
+    name, _, _, token = store.ingest(io.BytesIO(b'thumb'), '.png')
+    store.release(name, token)
+    assert removed == [name]
+
+
+def test_ttl_eviction_uses_last_access(tmp_path):
+    store = ContentStore(str(tmp_path / 'ttl'), ttl=60)
+    old, _, _, _ = store.ingest(io.BytesIO(b'old'), '')
+    fresh, _, _, _ = store.ingest(io.BytesIO(b'fresh'), '')
+    with store._db() as db:
+        db.execute("UPDATE blobs SET last_access = 0")
+    store.touch(fresh)
+
+    store.sweep()
+    assert not os.path.exists(store.path(old))
+    assert os.path.exists(store.path(fresh))
+    assert store.stats()['evicted_ttl'] == 1
+
+
+def test_quota_eviction_removes_least_recently_used(tmp_path):
+    store = ContentStore(str(tmp_path / 'quota'), quota_bytes=10)
+    names = []
+    for i, content in enumerate([b'aaaa', b'bbbb', b'cccc']):
+        name, _, _, _ = store.ingest(io.BytesIO(content), '')
+        with store._db() as db:
+            db.execute("UPDATE blobs SET last_access = ? WHERE name = ?", (i, name))
+        names.append(name)
+
+    store.sweep()
+    assert [os.path.exists(store.path(n)) for n in names] == [False, True, True]
+    assert store.stats()['stored_bytes'] == 8
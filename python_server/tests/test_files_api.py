@@ -0,0 +1,69 @@
+import io
+
+import app
+
+
+def upload(client, content=b'attachment'):
+    response = client.post('/upload', data={'file': (io.BytesIO(content), 'a.txt')})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_delete_requires_reference_token():
+    client = app.app.test_client()
+    info = upload(client, b'delete-me')
+    filename = info['url'].rsplit('/', 1)[1]
+
+    assert client.delete(f'/files/{filename}').status_code == 401
+    assert client.delete(f'/files/{filename}', headers={'X-File-Token': 'guess'}).status_code == 404
+    assert client.get(f'/files/{filename}').status_code == 200
+
+    response = client.delete(f'/files/{filename}', headers={'X-File-Token': info['ref_token']})
+    assert response.status_code == 200 and response.get_json()['references'] == 0
+    assert client.get(f'/files/{filename}').status_code == 404
+
+
+def test_shared_url_cannot_remove_other_references():
+    client = app.app.test_client()
+    mine = upload(client, b'shared-content')
+    theirs = upload(client, b'shared-content')
+    filename = mine['url'].rsplit('/', 1)[1]
+
+    assert client.delete(f'/files/{filename}', headers={'X-File-Token': mine['ref_token']}).status_code == 200
+    assert client.delete(f'/files/{filename}', headers={'X-File-Token': mine['ref_token']}).status_code == 404
+    assert client.get(f'/files/{filename}').status_code == 200
+    assert theirs['ref_token'] != mine['ref_token']
+
+
+def test_batch_upload_keeps_request_order():
+    client = app.app.test_client()
+    response = client.post('/upload/batch', data={
+        'files': [(io.BytesIO(b'first'), 'a.txt'), (io.BytesIO(b'second'), 'b.txt')]
+    })
+    assert response.status_code == 201
+    body = response.get_json()
+    assert [f['filename'] for f in body['files']] == ['a.txt', 'b.txt']
+    assert body['succeeded'] == 2
+
+
+def test_oversized_request_returns_json_413():
+    client = app.app.test_client()
+    big = io.BytesIO(b'0' * (app.MAX_CONTENT_LENGTH + 1))
+    response = client.post('/upload/batch', data={'files': [(big, 'big.bin'), (io.BytesIO(b'x'), 'x.txt')]})
+    assert response.status_code == 413
+    assert 'error' in response.get_json()
+
+
+def test_files_are_immutable_by_default():
+    client = app.app.test_client()
+    info = upload(client, b'cache-policy')
+    response = client.get(info['url'][info['url'].index('/files/'):])
+    # 默认不清理上传文件，内容寻址的 URL 可以永久缓存
+    assert app.content_store.ttl == 0 and app.content_store.quota_bytes == 0
+    assert response.headers['Cache-Control'] == f'public, max-age={365 * 24 * 3600}, immutable'
+
+
+def test_files_are_not_immutable_when_eviction_is_enabled():
+    assert app.files_cache_control(3600, 0) == (3600, 'public, max-age=3600')
+    assert app.files_cache_control(0, 10 ** 9) == (24 * 3600, f'public, max-age={24 * 3600}')
+    assert app.files_cache_control(30 * 24 * 3600, 0, max_age=600) == (600, 'public, max-age=600')
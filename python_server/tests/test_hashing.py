@@ -0,0 +1,36 @@
+import threading
+
+import pytest
+
+import hashing
+
+
+def test_hash_and_verify_round_trip():
+    pwhash = hashing.hash_password('secret')
+    assert hashing.verify_password(pwhash, 'secret')
+    assert not hashing.verify_password(pwhash, 'wrong')
+    assert not hashing.needs_rehash(pwhash)
+    assert hashing.needs_rehash('pbkdf2:sha256:1000$salt$hash')
+
+
+def test_hash_passwords_goes_through_the_bounded_queue():
+    before = hashing.stats()['submitted']
+    hashes = hashing.hash_passwords(['a', 'b', 'c'], chunk_size=2)
+    assert len(hashes) == 3
+    assert hashing.verify_password(hashes[2], 'c')
+    # 两个块各占一个名额，加上一次校验
+    assert hashing.stats()['submitted'] - before == 3
+    assert hashing.stats()['in_flight'] == 0
+
+
+def test_hash_passwords_releases_slots_when_rejected(monkeypatch):
+    monkeypatch.setattr(hashing, '_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(hashing, 'QUEUE_TIMEOUT', 0.01)
+    rejected = hashing.stats()['rejected']
+    with pytest.raises(hashing.HashingBusy):
+        hashing.hash_passwords(['a', 'b'], chunk_size=1)
+    stats = hashing.stats()
+    assert stats['rejected'] == rejected + 1
+    assert stats['in_flight'] == 0
+    # 已提交的块完成后名额全部归还
+    assert hashing._slots.acquire(timeout=0)
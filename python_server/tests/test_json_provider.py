@@ -0,0 +1,85 @@
+import base64
+import datetime
+import decimal
+import importlib
+import json
+import sys
+from email.utils import parsedate_to_datetime
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+
+CREATED_AT = datetime.datetime(2024, 3, 5, 14, 7, 9, 123456)
+PRICE = decimal.Decimal('12345678901234567890.0123456789')
+BLOB = b'\x00\xffagent\n'
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def provider(request, monkeypatch):
+    """分别以 orjson 和标准库回退实现创建 provider"""
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+        module = json_provider
+    else:
+        monkeypatch.setitem(sys.modules, 'orjson', None)
+        module = importlib.reload(json_provider)
+    assert module.FastJSONProvider.backend == request.param
+    app = Flask(__name__)
+    app.json = module.FastJSONProvider(app)
+    yield app.json
+    if request.param == 'json':
+        monkeypatch.undo()
+        importlib.reload(json_provider)
+
+
+@pytest.fixture
+def flask_default():
+    app = Flask(__name__)
+    yield DefaultJSONProvider(app)
+
+
+def test_decimal_matches_flask_default(provider, flask_default):
+    payload = {'price': PRICE}
+    assert json.loads(provider.dumps(payload)) == json.loads(flask_default.dumps(payload))
+    assert json.loads(provider.dumps(payload))['price'] == '12345678901234567890.0123456789'
+
+
+def test_datetime_is_the_same_instant_as_flask_default(provider, flask_default):
+    payload = {'created_at': CREATED_AT}
+    encoded = json.loads(provider.dumps(payload))['created_at']
+    assert encoded == '2024-03-05T14:07:09'
+    # Flask 默认输出 RFC 822（"Tue, 05 Mar 2024 14:07:09 GMT"），两者精确到秒表示同一时刻
+    flask_encoded = json.loads(flask_default.dumps(payload))['created_at']
+    assert parsedate_to_datetime(flask_encoded).replace(tzinfo=None) == datetime.datetime.fromisoformat(encoded)
+    assert json.loads(provider.dumps({'day': CREATED_AT.date()})) == {'day': '2024-03-05'}
+
+
+def test_bytes_are_base64_encoded(provider, flask_default):
+    # Flask 默认 provider 无法序列化 bytes
+    with pytest.raises(TypeError):
+        flask_default.dumps({'blob': BLOB})
+    encoded = json.loads(provider.dumps({'blob': BLOB}))['blob']
+    assert base64.b64decode(encoded) == BLOB
+
+
+def test_both_backends_produce_identical_bytes(provider):
+    payload = {'created_at': CREATED_AT, 'price': PRICE, 'blob': BLOB, 'name': '管理员', 'n': [1, None, True]}
+    expected = ('{"created_at":"2024-03-05T14:07:09","price":"12345678901234567890.0123456789",'
+                '"blob":"AP9hZ2VudAo=","name":"管理员","n":[1,null,true]}')
+    assert provider.dumps(payload) == expected
+    assert provider.loads(expected)['name'] == '管理员'
+
+
+def test_response_uses_provider(provider):
+    with provider._app.app_context():
+        response = provider.response({'created_at': CREATED_AT, 'price': PRICE})
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {'created_at': '2024-03-05T14:07:09', 'price': str(PRICE)}
+
+
+def test_unknown_type_raises_type_error(provider):
+    with pytest.raises(TypeError):
+        provider.dumps({'value': object()})
@@ -0,0 +1,61 @@
+import time
+
+import jwt
+import pytest
+
+from jwt_cache import JwtCache, TokenRevoked
+
+SECRET = 'test-secret-for-the-jwt-cache-tests'
+
+
+def make_token(**claims):
+    claims.setdefault('exp', int(time.time()) + 3600)
+    return jwt.encode({'user_id': 1, **claims}, SECRET, algorithm='HS256')
+
+
+def test_repeated_decode_skips_signature_verification(monkeypatch):
+    cache = JwtCache(SECRET, ['HS256'])
+    token = make_token()
+    assert cache.decode(token)['user_id'] == 1
+
+    monkeypatch.setattr(jwt, 'decode', lambda *a, **k: pytest.fail('verified a cached token again'))
+    assert cache.decode(token)['user_id'] == 1
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['size'] == 1
+
+
+def test_invalid_token_is_not_cached():
+    cache = JwtCache(SECRET, ['HS256'])
+    forged = jwt.encode({'user_id': 1, 'exp': int(time.time()) + 3600}, 'another-secret-for-the-jwt-cache-tests', algorithm='HS256')
+    for _ in range(2):
+        with pytest.raises(jwt.InvalidSignatureError):
+            cache.decode(forged)
+    assert cache.stats()['size'] == 0
+
+
+def test_cached_token_expires_exactly_at_exp(monkeypatch):
+    cache = JwtCache(SECRET, ['HS256'])
+    exp = int(time.time()) + 10
+    token = make_token(exp=exp)
+    cache.decode(token)
+
+    monkeypatch.setattr(time, 'time', lambda: exp - 0.5)
+    assert cache.decode(token)['user_id'] == 1
+    monkeypatch.setattr(time, 'time', lambda: exp)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        cache.decode(token)
+    assert cache.stats()['expired'] == 1
+
+
+def test_revocation_check_runs_on_every_decode():
+    cache = JwtCache(SECRET, ['HS256'])
+    revoked_users = set()
+    cache.add_revocation_check(lambda claims: claims['user_id'] in revoked_users)
+    token = make_token()
+    assert cache.decode(token)
+
+    revoked_users.add(1)
+    with pytest.raises(TokenRevoked):
+        cache.decode(token)
+    assert issubclass(TokenRevoked, jwt.InvalidTokenError)
+    assert cache.stats()['revoked'] == 1
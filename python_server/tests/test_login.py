@@ -0,0 +1,72 @@
+import jwt
+import pytest
+
+import app
+from cache import TTLCache
+from test_admin_users import client, use_db  # noqa: F401
+from test_rbac_index import make_index
+
+ALICE = {'id': 1, 'username': 'Alice', 'password_hash': 'h', 'real_name': '爱丽丝', 'email': 'a@example.com'}
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = make_index()
+    monkeypatch.setattr(app, 'rbac_index', index)
+    monkeypatch.setattr(app, 'user_assistants_cache', TTLCache())
+    monkeypatch.setattr(app, 'verify_password', lambda pwhash, password: password == 'secret')
+    monkeypatch.setattr(app, 'needs_rehash', lambda pwhash: False)
+    return index
+
+
+def login(client, monkeypatch, query=''):
+    use_db(monkeypatch, [ALICE])
+    response = client.post(f'/api/login{query}', json={'username': 'Alice', 'password': 'secret'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def claims(token):
+    return jwt.decode(token, app.JWT_SECRET_KEY, algorithms=['HS256'])
+
+
+def test_plain_login_does_not_embed_permissions(client, monkeypatch, index):
+    data = login(client, monkeypatch)
+    assert 'assistants' not in data and 'roles' not in data['user']
+    assert 'rbac' not in claims(data['token'])
+
+
+def test_login_embeds_roles_assistants_and_rbac_claims(client, monkeypatch, index):
+    data = login(client, monkeypatch, '?embed=permissions')
+    assert data['user']['roles'] == [{'id': 10, 'name': 'admin'}]
+    assert [a['ASSISTANT_ID'] for a in data['assistants']] == ['a-100', 'a-101']
+    assert data['rbac_version'] == index.version
+    assert claims(data['token'])['rbac'] == {'v': index.version, 'roles': [10], 'apps': [100, 101]}
+
+
+def test_token_claims_answer_user_assistants_until_permissions_change(client, monkeypatch, index):
+    token = login(client, monkeypatch, '?embed=permissions')['token']
+    app.user_assistants_cache.clear()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    connection = use_db(monkeypatch)
+    response = client.get('/api/user_assistants?user_id=Alice', headers=headers)
+    assert [a['ASSISTANT_ID'] for a in response.get_json()['assistants']] == ['a-100', 'a-101']
+    assert connection.statements == []
+
+    # 授权变化后版本号不同，token 中的应用列表不再使用
+    index.revoke(10, 101)
+    assert app.token_permissions(claims(token)) is None
+    response = client.get('/api/user_assistants?user_id=Alice', headers=headers)
+    assert [a['ASSISTANT_ID'] for a in response.get_json()['assistants']] == ['a-100']
+
+    # 其他用户的 token 不能用来查询
+    other = jwt.encode({**claims(token), 'username': 'bob'}, app.JWT_SECRET_KEY, algorithm='HS256')
+    response = client.get('/api/user_assistants?user_id=Alice', headers={'Authorization': f'Bearer {other}'})
+    assert [a['ASSISTANT_ID'] for a in response.get_json()['assistants']] == ['a-100']
+
+
+def test_wrong_password_is_rejected(client, monkeypatch, index):
+    use_db(monkeypatch, [ALICE])
+    response = client.post('/api/login?embed=permissions', json={'username': 'Alice', 'password': 'nope'})
+    assert response.status_code == 401
@@ -0,0 +1,139 @@
+import json
+import os
+
+import pymysql
+from pymysql.converters import escape_item
+
+import app
+from metrics import Registry
+
+
+class FakeConnection:
+    """只实现游标 mogrify / executemany 用到的接口，执行的语句记录在 queries 中"""
+    encoding = 'utf8'
+    charset = 'utf8mb4'
+    _result = None
+
+    def __init__(self):
+        self.queries = []
+
+    def literal(self, obj):
+        return escape_item(obj, self.charset)
+
+    escape = literal
+
+
+class RecordingCursor(app.InstrumentedCursor):
+    def _query(self, q):
+        self.connection.queries.append(q)
+        self.rowcount = 1
+        return 1
+
+
+def test_query_name_accepts_str_bytes_and_bytearray():
+    assert app.query_name("SELECT id FROM Login_users WHERE id = 1") == 'SELECT Login_users'
+    assert app.query_name(b"update `roles` set name = 'x'") == 'UPDATE roles'
+    assert app.query_name(bytearray(b"INSERT INTO user_roles (user_id, role_id) VALUES (1,2)")) == 'INSERT user_roles'
+    assert app.query_name("SELECT COUNT(*) FROM (SELECT 1) t") == 'SELECT'
+
+
+def test_executemany_through_instrumented_cursor():
+    connection = FakeConnection()
+    cursor = RecordingCursor(connection)
+    rows = [(1, 2), (1, 3), (2, 5)]
+
+    assert cursor.executemany("INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)", rows) == 1
+    # pymysql 把批量 INSERT 合并成一条语句，以 bytearray 交给 execute
+    assert len(connection.queries) == 1
+    assert isinstance(connection.queries[0], (bytes, bytearray))
+
+    samples = app.db_query_duration.samples()
+    assert ('background', 'INSERT user_roles') in samples
+
+    # 非 INSERT 语句逐条执行
+    cursor.executemany("DELETE FROM user_roles WHERE user_id = %s AND role_id = %s", rows)
+    assert len(connection.queries) == 4
+    assert app.db_query_rows.samples()[('background', 'DELETE user_roles')] == 3
+
+
+def test_registry_renders_and_merges_histograms():
+    registry = Registry()
+    latency = registry.histogram('request_seconds', '耗时', ['endpoint'], buckets=[0.1, 1])
+    requests = registry.counter('requests_total', '请求数', ['endpoint'])
+    latency.observe(('login',), 0.05)
+    latency.observe(('login',), 0.5)
+    latency.observe(('login',), 5)
+    requests.inc(('login',))
+    requests.inc(('login',), 2)
+
+    text = registry.render()
+    assert '# TYPE request_seconds histogram' in text
+    assert 'request_seconds_bucket{endpoint="login",le="0.1"} 1' in text
+    assert 'request_seconds_bucket{endpoint="login",le="1"} 2' in text
+    assert 'request_seconds_bucket{endpoint="login",le="+Inf"} 3' in text
+    assert 'request_seconds_count{endpoint="login"} 3' in text
+    assert 'requests_total{endpoint="login"} 3' in text
+
+
+def test_registry_merges_other_process_snapshots(tmp_path):
+    registry = Registry(str(tmp_path))
+    counter = registry.counter('uploads_total', '上传数')
+    counter.inc((), 2)
+    other = registry.snapshot()
+    # 模拟另一个存活进程（当前进程的父进程）写出的数据
+    (tmp_path / f'{os.getppid()}.json').write_text(json.dumps(other))
+    # 已退出进程的快照被移除，计数累加到 dead_workers.json
+    (tmp_path / '999999999.json').write_text(json.dumps(other))
+
+    assert 'uploads_total 6' in registry.render()
+    assert not (tmp_path / '999999999.json').exists()
+
+
+def test_cursor_class_is_dict_cursor():
+    assert issubclass(app.InstrumentedCursor, pymysql.cursors.DictCursor)
+
+
+def test_seed_batches_insert_through_instrumented_cursor():
+    # bench/seed.py 的批量写入路径：executemany 的 bytearray 语句曾导致 query_name 报错
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench'))
+    import seed
+
+    class Connection(FakeConnection):
+        def commit(self):
+            self.commits = getattr(self, 'commits', 0) + 1
+
+    connection = Connection()
+    cursor = RecordingCursor(connection)
+    rows = ((i, f"bench_role_{i:04d}", seed.EPOCH) for i in range(1, 8))
+    total = seed.insert_batches(connection, cursor, "INSERT INTO roles (id, name, created_at) VALUES (%s, %s, %s)",
+                                rows, 3, 'roles')
+    assert total == 7
+    assert len(connection.queries) == connection.commits == 3
+
+
+def test_dead_worker_counters_are_kept_after_its_snapshot_is_removed(tmp_path):
+    registry = Registry(str(tmp_path))
+    uploads = registry.counter('uploads_total', '上传数')
+    latency = registry.histogram('request_seconds', '耗时', buckets=[0.1, 1])
+    in_flight = registry.gauge('in_flight', '处理中')
+    uploads.inc((), 2)
+    latency.observe((), 0.5)
+    in_flight.set((), 7)
+    dead = registry.snapshot()
+    registry.reset()
+
+    (tmp_path / '999999998.json').write_text(json.dumps(dead))
+    (tmp_path / '999999999.json').write_text(json.dumps(dead))
+    text = registry.render()
+    assert not (tmp_path / '999999998.json').exists() and not (tmp_path / '999999999.json').exists()
+    assert 'uploads_total 4' in text
+    assert 'request_seconds_count 2' in text
+    # 退出进程的 gauge 不再输出
+    assert 'in_flight 7' not in text
+
+    # 快照已删除，总数仍然保留，并与存活进程的数据相加
+    uploads.inc()
+    text = registry.render()
+    assert 'uploads_total 5' in text
+    assert 'request_seconds_bucket{le="1"} 2' in text
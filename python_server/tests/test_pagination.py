@@ -0,0 +1,124 @@
+import base64
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from pagination import InvalidCursor, build_page, decode_cursor, encode_cursor, seek_clause
+from test_admin_users import client, use_db  # noqa: F401
+
+SORT_KEYS = ['created_at', 'id']
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    db.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, created_at TEXT)")
+    start = datetime(2024, 1, 1)
+    # 每三行共用一个 created_at，验证第二排序键能区分同一时间的行
+    db.executemany("INSERT INTO users VALUES (?, ?)",
+                   [(i, (start + timedelta(minutes=i // 3)).strftime('%Y-%m-%d %H:%M:%S.%f'))
+                    for i in range(1, 26)])
+    return db
+
+
+def fetch_page(db, token, per_page=10, nullable=()):
+    direction, key_values, had_cursor = ('next', [], False)
+    if token:
+        direction, key_values = decode_cursor(token, 'users', len(SORT_KEYS))
+        had_cursor = True
+    where_sql, params, order_sql = seek_clause(SORT_KEYS, key_values, direction, nullable=nullable)
+    rows = db.execute(
+        f"SELECT id, created_at FROM users WHERE {where_sql} ORDER BY {order_sql} LIMIT ?".replace('%s', '?'),
+        params + [per_page + 1]
+    ).fetchall()
+    return build_page([dict(r) for r in rows], per_page, 'users', direction, had_cursor,
+                      key=lambda r: [r['created_at'], r['id']])
+
+
+def ids(rows):
+    return [r['id'] for r in rows]
+
+
+def test_walks_forward_and_back_without_gaps(db):
+    first, info = fetch_page(db, None)
+    assert ids(first) == list(range(25, 15, -1))
+    assert info['prev_cursor'] is None and info['has_more']
+
+    second, info = fetch_page(db, info['next_cursor'])
+    assert ids(second) == list(range(15, 5, -1))
+
+    last, last_info = fetch_page(db, info['next_cursor'])
+    assert ids(last) == [5, 4, 3, 2, 1]
+    assert last_info['next_cursor'] is None and not last_info['has_more']
+
+    back, back_info = fetch_page(db, last_info['prev_cursor'])
+    assert ids(back) == ids(second)
+    back, back_info = fetch_page(db, back_info['prev_cursor'])
+    assert ids(back) == ids(first)
+    assert back_info['prev_cursor'] is None
+
+
+def test_rows_with_null_created_at_are_paged_last(db):
+    # 与 MySQL 一致，SQLite 降序时 NULL 排在最后
+    db.execute("UPDATE users SET created_at = NULL WHERE id IN (4, 9, 13, 20)")
+    seen, token, pages = [], None, 0
+    while True:
+        rows, info = fetch_page(db, token, per_page=4, nullable=('created_at',))
+        seen.extend(ids(rows))
+        pages += 1
+        token = info['next_cursor']
+        if token is None:
+            break
+    assert seen == [i for i in range(25, 0, -1) if i not in (4, 9, 13, 20)] + [20, 13, 9, 4]
+    assert pages == 7
+
+    # 从全是 NULL 的最后一页往回翻
+    back, back_info = fetch_page(db, info['prev_cursor'], per_page=4, nullable=('created_at',))
+    assert ids(back) == [1, 20, 13, 9]
+    assert back_info['prev_cursor'] is not None
+
+
+def test_cursor_is_scoped_to_its_listing():
+    token = encode_cursor('roles', 'next', [5])
+    assert decode_cursor(token, 'roles', 1) == ('next', [5])
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 'users', 1)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 'roles', 2)
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not-base64!', 'roles', 1)
+
+
+def test_datetime_keys_round_trip_as_comparable_strings():
+    value = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    _, values = decode_cursor(encode_cursor('users', 'prev', [value, 3]), 'users', 2)
+    assert values == ['2024-05-06 07:08:09.123456', 3]
+
+
+def forged_cursor(scope, keys):
+    raw = json.dumps({'s': scope, 'd': 'next', 'k': keys}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+@pytest.mark.parametrize('keys', [
+    [[1, 2], 3],
+    [{'a': 1}, 3],
+    [{'dt': 'yesterday'}, 3],
+    [{'dt': ['2024-01-01 00:00:00.000000']}, 3],
+    [{'dt': '2024-01-01 00:00:00.000000', 'x': 1}, 3],
+    [None, True],
+])
+def test_forged_cursor_values_are_rejected(keys):
+    # 游标由客户端提交，列表、对象等值不能传给数据库驱动
+    with pytest.raises(InvalidCursor):
+        decode_cursor(forged_cursor('users', keys), 'users', 2)
+
+
+def test_forged_cursor_is_a_bad_request(client, monkeypatch):
+    connection = use_db(monkeypatch)
+    response = client.get('/api/admin/users?cursor=' + forged_cursor('users', [[1], 3]))
+    assert response.status_code == 400
+    assert connection.statements == []
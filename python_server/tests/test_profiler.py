@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+
+import app
+from profiler import Profiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    profiler = Profiler(str(tmp_path), token='secret-token', slow_threshold=0.05, interval=0.001)
+    monkeypatch.setattr(app, 'profiler', profiler)
+    return profiler
+
+
+def test_saved_profile_does_not_contain_token(profiler, tmp_path):
+    client = app.app.test_client()
+    response = client.get('/api/admin/stats?_profile=secret-token&x=1')
+    name = response.headers['X-Profile-Id']
+    assert 'Server-Timing' in response.headers
+
+    saved = (tmp_path / f'{name}.json').read_text()
+    assert 'secret-token' not in saved
+    assert json.loads(saved)['path'] == '/api/admin/stats?x=1'
+
+    listing = client.get('/api/admin/profiles', headers={'X-Profile': 'secret-token'}).get_data(as_text=True)
+    assert 'secret-token' not in listing
+
+
+def test_profiles_require_the_profiler_token(profiler):
+    client = app.app.test_client()
+    name = client.get('/api/admin/stats', headers={'X-Profile': 'secret-token'}).headers['X-Profile-Id']
+
+    assert client.get('/api/admin/profiles').status_code == 401
+    assert client.get(f'/api/admin/profiles/{name}').status_code == 401
+    assert client.get('/api/admin/profiles', headers={'X-Profile': 'wrong'}).status_code == 403
+    assert client.get(f'/api/admin/profiles/{name}?_profile=wrong').status_code == 403
+
+    response = client.get(f'/api/admin/profiles/{name}?format=json', headers={'X-Profile': 'secret-token'})
+    assert response.status_code == 200 and response.get_json()['path'] == '/api/admin/stats'
+
+
+def test_profiles_are_unreadable_without_a_configured_token(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'token', None)
+    response = app.app.test_client().get('/api/admin/profiles', headers={'X-Profile': 'anything'})
+    assert response.status_code == 403
+
+
+def test_wrong_token_is_not_profiled(profiler):
+    response = app.app.test_client().get('/api/admin/stats', headers={'X-Profile': 'wrong'})
+    assert 'X-Profile-Id' not in response.headers
+
+
+def test_slow_requests_are_kept_and_fast_ones_discarded(profiler):
+    fast = profiler.begin()
+    assert profiler.end(fast, endpoint='fast')[0] is None
+
+    slow = profiler.begin()
+    profiler.record_query('SELECT Login_users', 0.01)
+    time.sleep(0.06)
+    name, summary = profiler.end(slow, endpoint='slow')
+    assert name is not None
+    assert summary['db_queries'] == [{'query': 'SELECT Login_users', 'count': 1, 'ms': 10.0}]
+    assert summary['python_ms'] >= 40
+    assert profiler.stats()['discarded'] == 1
+
+
+def test_non_ascii_token_is_rejected_without_error(profiler):
+    assert not profiler.requested('é')
+    client = app.app.test_client()
+    response = client.get('/metrics?_profile=%C3%A9')
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+    # 请求头中的非 ASCII 值由 WSGI 按 latin-1 解码，同样不会报错
+    response = client.get('/metrics', headers={'X-Profile': 'é'.encode('utf-8').decode('latin-1')})
+    assert response.status_code == 200
@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+
+import pytest
+
+from cache import MISSING, FileGeneration
+from rbac_index import RbacIndex
+
+TABLES = {
+    'Login_users': [{'id': 1, 'username': 'Alice'}, {'id': 2, 'username': 'bob'}],
+    'roles': [{'id': 10, 'name': 'admin'}, {'id': 11, 'name': 'user'}],
+    'user_roles': [{'user_id': 1, 'role_id': 10}, {'user_id': 2, 'role_id': 11}],
+    'role_apps': [{'role_id': 10, 'app_id': 100}, {'role_id': 10, 'app_id': 101}, {'role_id': 11, 'app_id': 101}],
+    'assistant_info': [
+        {'id': 100, 'ASSISTANT_ID': 'a-100', 'name': 'A', 'description': '', 'icon_url': ''},
+        {'id': 101, 'ASSISTANT_ID': 'a-101', 'name': 'B', 'description': '', 'icon_url': ''},
+    ],
+}
+
+
+class FakeCursor:
+    def __init__(self, tables):
+        self.tables = tables
+        self.rows = []
+
+    def execute(self, sql, args=None):
+        table = sql.split(' FROM ')[1].split()[0]
+        self.rows = list(self.tables[table])
+
+    def fetchall(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def cursor(self):
+        return FakeCursor(self.tables)
+
+
+def make_index(tables=TABLES, generation=None, **kwargs):
+    @contextmanager
+    def connection():
+        yield FakeConnection(tables)
+    index = RbacIndex(connection, generation=generation, **kwargs)
+    assert index.load()
+    return index
+
+
+def ids(assistants):
+    return [a['ASSISTANT_ID'] for a in assistants]
+
+
+def test_username_lookup_follows_ci_collation():
+    index = make_index()
+    assert ids(index.assistants_for_username('Alice')) == ['a-100', 'a-101']
+    assert ids(index.assistants_for_username('alice')) == ['a-100', 'a-101']
+    assert ids(index.assistants_for_username('ALICE  ')) == ['a-100', 'a-101']
+    assert ids(index.assistants_for_username('Bob')) == ['a-101']
+    # 末尾以外的空格和未知用户名不匹配，交给 SQL 判断
+    assert index.assistants_for_username(' alice') is MISSING
+    assert index.assistants_for_username('carol') is MISSING
+
+
+def test_renaming_user_moves_the_normalised_key():
+    index = make_index()
+    index.put_user(1, 'Alicia')
+    assert index.assistants_for_username('alice') is MISSING
+    assert ids(index.assistants_for_username('ALICIA')) == ['a-100', 'a-101']
+    index.remove_user(1)
+    assert index.assistants_for_username('alicia') is MISSING
+
+
+def test_user_without_active_assistants_returns_none():
+    index = make_index()
+    index.put_user(3, 'Dave', [11])
+    index.remove_assistant(101)
+    assert index.assistants_for_username('dave') is None
+
+
+def test_incremental_updates_change_version():
+    index = make_index()
+    version = index.version
+    index.revoke(10, 100)
+    assert index.version != version
+    assert ids(index.assistants_for_username('alice')) == ['a-101']
+    index.grant(10, 100)
+    assert index.version == version
+    assert index.apps_for_role(10) == [100, 101]
+
+
+def test_version_does_not_depend_on_load_order():
+    reordered = {table: list(reversed(rows)) for table, rows in TABLES.items()}
+    assert make_index().version == make_index(reordered).version
+
+
+def test_incremental_digest_matches_full_recompute(monkeypatch):
+    import rbac_index
+    index = make_index()
+    full_digest = rbac_index._digest
+    # 增量维护不应再全量重算
+    monkeypatch.setattr(rbac_index, '_digest', lambda state: pytest.fail('full recompute'))
+    index.put_user(3, 'carol', [10, 11])
+    index.set_user_roles(1, [11])
+    index.apply_role_apps({(11, 100)}, {(10, 101)})
+    index.put_assistant({'id': 102, 'ASSISTANT_ID': 'a-102', 'name': 'C', 'description': '',
+                         'icon_url': '', 'in_use': 'active'})
+    index.put_assistant({'id': 100, 'ASSISTANT_ID': 'a-100', 'name': 'A', 'description': '',
+                         'icon_url': '', 'in_use': 'inactive'})
+    index.remove_assistant(101)
+    index.remove_role(10)
+    index.remove_user(2)
+    version = index.version
+    assert version == format(full_digest(index._state), '016x')
+
+
+def test_write_in_another_worker_marks_index_stale(tmp_path):
+    # 两个 worker 各自打开同一个代数文件
+    path = str(tmp_path / 'generation')
+    writer = make_index(generation=FileGeneration(path))
+    reader = make_index(generation=FileGeneration(path))
+    version = reader.version
+    assert writer.ready and reader.ready
+
+    writer.revoke(10, 100)
+    # 写入方的索引已增量更新，仍可使用；另一个 worker 回退到 SQL，并请求重新加载
+    assert writer.ready
+    assert not reader.ready and reader.version is None
+    assert reader._reload.is_set()
+
+    assert reader.load()
+    assert reader.ready and reader.version == version  # 假数据库中的数据未变
+
+    # 两个 worker 同时写入时，写入方也无法确认自己的索引包含了对方的修改
+    reader.grant(11, 100)
+    writer.grant(10, 100)
+    assert not writer.ready and not reader.ready
+
+
+class CountingGeneration(FileGeneration):
+    def __init__(self, path):
+        super().__init__(path)
+        self.reads = 0
+
+    def get(self):
+        self.reads += 1
+        return super().get()
+
+
+def test_generation_is_read_at_most_once_per_check_interval(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('rbac_index.time.monotonic', lambda: now[0])
+    path = str(tmp_path / 'generation')
+    writer = make_index(generation=FileGeneration(path))
+    reader = make_index(generation=CountingGeneration(path), generation_check_interval=0.5)
+    reads = reader._generation.reads
+
+    for _ in range(100):
+        assert reader.ready and reader.generation is not None
+    assert reader._generation.reads == reads
+
+    # 间隔内其他 worker 的写入还未被发现，间隔过后再读取一次即判定过期
+    writer.revoke(10, 100)
+    assert reader.ready
+    now[0] += 0.5
+    assert not reader.ready
+    assert reader._generation.reads == reads + 1
+
+    # 本进程自己的写入立即反映在缓存的代数中
+    assert reader.load()
+    reader.grant(10, 100)
+    assert reader.ready and reader.generation == writer.generation
+
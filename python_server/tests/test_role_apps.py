@@ -0,0 +1,74 @@
+import app
+from test_admin_users import client, use_db  # noqa: F401
+from test_metrics import FakeConnection, RecordingCursor
+
+
+def statement_heads(connection):
+    return [sql.split(' (')[0].split(' WHERE')[0] for sql, _ in connection.statements]
+
+
+def test_batch_applies_only_the_difference_in_one_transaction(client, monkeypatch):
+    connection = use_db(monkeypatch,
+                        [{'role_id': 1, 'app_id': 10}, {'role_id': 2, 'app_id': 20}],
+                        [{'username': 'alice'}])
+    response = client.post('/api/admin/role_apps/batch', json={
+        'grant': [{'role_id': 1, 'app_id': 10}, {'role_id': 1, 'app_id': 11}],
+        'revoke': [{'role_id': 2, 'app_id': 20}, {'role_id': 3, 'app_id': 30}],
+    })
+    assert response.status_code == 200
+    # 已存在的授权不重复添加，不存在的授权不删除
+    assert response.get_json()['data'] == {
+        'added': [{'role_id': 1, 'app_id': 11}],
+        'removed': [{'role_id': 2, 'app_id': 20}],
+    }
+    assert statement_heads(connection)[:3] == [
+        'SELECT role_id, app_id FROM role_apps',
+        'INSERT IGNORE INTO role_apps',
+        'DELETE FROM role_apps',
+    ]
+    assert connection.statements[0][1] == [1, 2, 3]
+    assert connection.statements[1][1] == [(1, 11)]
+    assert connection.statements[2] == ('DELETE FROM role_apps WHERE (role_id, app_id) IN ((%s, %s))', [2, 20])
+    assert connection.commits == 1
+
+
+def test_batch_without_changes_does_not_write(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'role_id': 1, 'app_id': 10}])
+    response = client.post('/api/admin/role_apps/batch', json={'grant': [{'role_id': 1, 'app_id': 10}]})
+    assert response.get_json()['data'] == {'added': [], 'removed': []}
+    assert len(connection.statements) == 1 and connection.commits == 0
+
+
+def test_batch_rejects_invalid_and_conflicting_pairs(client, monkeypatch):
+    connection = use_db(monkeypatch)
+    pair = {'role_id': 1, 'app_id': 10}
+    assert client.post('/api/admin/role_apps/batch', json={'grant': [pair], 'revoke': [pair]}).status_code == 400
+    assert client.post('/api/admin/role_apps/batch', json={'grant': [{'role_id': 'x'}]}).status_code == 400
+    assert connection.statements == []
+
+
+def test_set_role_permissions_diffs_against_existing_grants(client, monkeypatch):
+    connection = use_db(monkeypatch, [{'id': 5}], [{'app_id': 10}, {'app_id': 11}], [])
+    response = client.put('/api/admin/roles/5/permissions', json={'app_ids': [11, 12, 13]})
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {'role_id': 5, 'added': [12, 13], 'removed': [10]}
+    assert connection.statements[2][1] == [(5, 12), (5, 13)]
+    assert connection.statements[3][1] == [5, 10]
+    assert connection.commits == 1
+
+    assert client.put('/api/admin/roles/5/permissions', json={'app_ids': 'all'}).status_code == 400
+
+
+def test_role_app_inserts_are_sent_as_one_statement():
+    connection = FakeConnection()
+    app.insert_role_apps(RecordingCursor(connection), {(1, 10), (1, 11), (2, 10)})
+    assert len(connection.queries) == 1
+    assert bytes(connection.queries[0]).endswith(b'VALUES (1, 10),(1, 11),(2, 10)')
+
+
+def test_single_role_app_ids_are_validated_before_writing(client, monkeypatch):
+    connection = use_db(monkeypatch)
+    for method in (client.post, client.delete):
+        response = method('/api/admin/role_apps', json={'role_id': 'admin', 'app_id': 3})
+        assert response.status_code == 400
+    assert connection.statements == [] and connection.commits == 0
@@ -0,0 +1,20 @@
+import os
+
+import serve
+
+
+def test_hash_workers_are_shared_between_server_workers(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    monkeypatch.delenv('password_hash_workers', raising=False)
+    assert serve.share_hash_workers(4) == 2
+    assert os.environ['password_hash_workers'] == '2'
+
+    # 每个 worker 至少一个哈希进程
+    monkeypatch.delenv('password_hash_workers')
+    assert serve.share_hash_workers(16) == 1
+
+
+def test_explicit_hash_workers_take_precedence(monkeypatch):
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    monkeypatch.setenv('password_hash_workers', '3')
+    assert serve.share_hash_workers(4) == 3
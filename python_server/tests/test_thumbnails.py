@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import thumbnails
+from thumbnails import ThumbnailService
+
+Image = pytest.importorskip('PIL.Image')
+
+
+class FakeStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+
+@pytest.fixture
+def service(tmp_path):
+    store = FakeStore(str(tmp_path / 'store'))
+    os.makedirs(store.root)
+    return ThumbnailService(store, str(tmp_path / 'thumbs'), sizes=(64, 128), fmt='png', workers=1)
+
+
+def save_image(service, name, size=(400, 200), **kwargs):
+    Image.new('RGB', size, (200, 30, 30)).save(service.store.path(name), **kwargs)
+
+
+def test_image_thumbnail_is_generated_and_cached(service):
+    name = 'ab' * 32 + '.jpg'
+    save_image(service, name, format='JPEG')
+
+    path = service.get(name, 128)
+    assert path == service.path(name, 128)
+    with Image.open(path) as thumb:
+        # 保持宽高比缩放到尺寸内
+        assert thumb.format == 'PNG'
+        assert thumb.size == (128, 64)
+
+    assert service.get(name, 128) == path
+    stats = service.stats()
+    assert stats['generated'] == 1 and stats['generated_on_demand'] == 1 and stats['served_cached'] == 1
+
+
+def test_enqueue_generates_every_size(service):
+    name = 'cd' * 32 + '.png'
+    save_image(service, name, size=(50, 300))
+    service.enqueue(name)
+    service._executor.shutdown(wait=True)
+
+    for size in service.sizes:
+        with Image.open(service.path(name, size)) as thumb:
+            assert max(thumb.size) == min(size, 300)
+    service.discard(name)
+    assert not any(os.path.exists(service.path(name, size)) for size in service.sizes)
+
+
+def test_missing_source_and_unsupported_type(service):
+    assert service.get('ef' * 32 + '.png', 64) is None
+    assert not service.supported('ef' * 32 + '.txt')
+    assert service.snap_size(100) == 128 and service.snap_size(1000) == 128
+
+
+@pytest.mark.skipif(thumbnails.PDFTOPPM is None, reason='需要 poppler 的 pdftoppm')
+def test_pdf_first_page_is_rendered(service):
+    name = '12' * 32 + '.pdf'
+    save_image(service, name, size=(300, 600), format='PDF')
+    with Image.open(service.get(name, 64)) as thumb:
+        assert max(thumb.size) == 64
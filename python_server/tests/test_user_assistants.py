@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import app
+from cache import MISSING, LocalGeneration, TTLCache
+from test_admin_users import client, use_db  # noqa: F401
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    generation = LocalGeneration()
+    monkeypatch.setattr(app.rbac_index, '_generation', generation)
+    # 每次都读取共享代数，模拟检查间隔已过
+    monkeypatch.setattr(app.rbac_index, 'generation_check_interval', 0)
+    monkeypatch.setattr(app, 'user_assistants_cache', TTLCache())
+    monkeypatch.setattr(app, '_user_assistants_cache_generation', None)
+    return generation
+
+
+def test_memory_cache_is_dropped_when_another_worker_writes(generation):
+    current = app.rbac_index.generation
+    app.store_user_assistants('alice', [{'ASSISTANT_ID': 'a-1'}], current)
+    assert app.cached_user_assistants('alice', current) == [{'ASSISTANT_ID': 'a-1'}]
+
+    # 其他 worker 修改授权后，本进程收不到精确失效，整个进程内缓存作废
+    generation.incr()
+    assert app.cached_user_assistants('alice', app.rbac_index.generation) is MISSING
+
+
+def test_result_computed_across_a_write_is_not_cached(generation):
+    before = app.rbac_index.generation
+    generation.incr()
+    app.store_user_assistants('alice', [{'ASSISTANT_ID': 'stale'}], before)
+    assert app.cached_user_assistants('alice', app.rbac_index.generation) is MISSING
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # b 最久未访问，被淘汰
+    assert cache.get('b') is MISSING and cache.get('a') == 1
+
+    now[0] += 10
+    assert cache.get('a') is MISSING
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['hits'] == 2 and stats['misses'] == 2
+
+
+ALICE_ROWS = [{'ASSISTANT_ID': 'a-1', 'name': '助手', 'description': '', 'icon_url': None}]
+
+
+def test_user_assistants_are_served_from_cache_until_a_grant_changes(client, monkeypatch, generation):
+    # 共享缓存（如 Redis）不会因写入代数变化整体清空，只有精确失效
+    monkeypatch.setattr(app.user_assistants_cache, 'shared', True, raising=False)
+    connection = use_db(monkeypatch, ALICE_ROWS)
+    response = client.get('/api/user_assistants?user_id=alice')
+    assert response.status_code == 200
+    assert [a['ASSISTANT_ID'] for a in response.get_json()['assistants']] == ['a-1']
+    app.store_user_assistants('bob', [], app.rbac_index.generation)
+
+    # 第二次请求命中缓存，不访问数据库
+    assert client.get('/api/user_assistants?user_id=alice').get_json() == response.get_json()
+    assert len(connection.statements) == 1
+
+    # 取消角色授权后只使该角色下用户的缓存失效
+    connection = use_db(monkeypatch, [], [{'username': 'alice'}], [])
+    assert client.delete('/api/admin/role_apps', json={'role_id': 10, 'app_id': 100}).status_code == 200
+    assert app.cached_user_assistants('alice', app.rbac_index.generation) is MISSING
+    assert app.cached_user_assistants('bob', app.rbac_index.generation) == []
+    # 没有可用助手时接口返回 null（与原接口一致）
+    assert client.get('/api/user_assistants?user_id=alice').get_json() == {'assistants': None}
+    assert connection.statements[-1][1] == ('alice',)
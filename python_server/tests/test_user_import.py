@@ -0,0 +1,152 @@
+import csv
+import io
+import os
+from contextlib import contextmanager
+
+import pymysql
+import pytest
+
+import app
+from rbac_index import ci_key
+from user_import import UserImporter, iter_rows
+
+
+class FakeDatabase:
+    """Login_users / user_roles，唯一键按 _ci 排序规则比较"""
+
+    def __init__(self, users=()):
+        self.users = []
+        self.user_roles = []
+        for username, email in users:
+            self.insert_user(username, email)
+
+    def insert_user(self, username, email):
+        for user in self.users:
+            if ci_key(user['username']) == ci_key(username) or ci_key(user['email']) == ci_key(email):
+                raise pymysql.err.IntegrityError(1062, f"Duplicate entry '{username}'")
+        self.users.append({'id': len(self.users) + 1, 'username': username, 'email': email})
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, args=()):
+        if sql.startswith('SELECT username, email'):
+            keys = {ci_key(v) for v in args}
+            self.rows = [u for u in self.db.users if ci_key(u['username']) in keys or ci_key(u['email']) in keys]
+        elif sql.startswith('SELECT id, username'):
+            keys = {ci_key(v) for v in args}
+            self.rows = [u for u in self.db.users if ci_key(u['username']) in keys]
+        elif sql.startswith('SELECT id FROM roles'):
+            self.rows = [{'id': 1}, {'id': 2}]
+        else:
+            raise AssertionError(sql)
+
+    def executemany(self, sql, rows):
+        for row in rows:
+            if sql.startswith('INSERT INTO Login_users'):
+                self.db.insert_user(row[0], row[2])
+            else:
+                self.db.user_roles.append(row)
+
+    def fetchall(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def fake_hashes(passwords):
+    return ['hash'] * len(passwords)
+
+
+def run_import(db, body, fmt='jsonl', batch_size=500):
+    importer = UserImporter(db.connection, fake_hashes, [1, 2], batch_size=batch_size)
+    importer.run(iter_rows(io.BytesIO(body.encode('utf-8')), fmt))
+    return importer
+
+
+def statuses(importer):
+    return [(r['line'], r['status']) for r in importer.results]
+
+
+def test_existing_user_in_another_case_is_skipped_not_a_batch_error():
+    db = FakeDatabase([('Alice', 'alice@example.com')])
+    importer = run_import(db, (
+        'username,real_name,email,role_ids\n'
+        'alice,A,other@example.com,1\n'
+        'carol,C,ALICE@example.com,\n'
+        'dave,D,dave@example.com,1|2\n'
+    ), fmt='csv')
+    assert statuses(importer) == [(2, 'skipped'), (3, 'skipped'), (4, 'created')]
+    assert [u['username'] for u in db.users] == ['Alice', 'dave']
+    assert db.user_roles == [(2, 1), (2, 2)]
+
+
+def test_duplicates_within_the_file_follow_the_collation():
+    db = FakeDatabase()
+    importer = run_import(db, '\n'.join([
+        '{"username": "Bob", "real_name": "B", "email": "bob@example.com"}',
+        '{"username": "bob ", "real_name": "B", "email": "bob2@example.com"}',
+        '{"username": "eve", "real_name": "E", "email": "BOB@example.com"}',
+    ]))
+    assert statuses(importer) == [(1, 'created'), (2, 'error'), (3, 'error')]
+    assert importer.results[1]['message'] == '导入文件中用户名或邮箱重复'
+
+
+def test_rows_before_a_parse_error_are_still_imported():
+    db = FakeDatabase()
+    body = 'username,real_name,email\nfrank,F,frank@example.com\n' + 'x' * 200_000 + ',X,x@example.com\n'
+    with pytest.raises(csv.Error):
+        run_import(db, body, fmt='csv')
+    assert [u['username'] for u in db.users] == ['frank']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = FakeDatabase()
+    # 不启动后台线程（它们会连接真实数据库）
+    monkeypatch.setattr(app, '_background_pid', os.getpid())
+    monkeypatch.setattr(app, 'db_pool', db)
+    monkeypatch.setattr(app, 'hash_passwords', fake_hashes)
+    monkeypatch.setattr(app.table_counts, '_counts', {})
+    return app.app.test_client(), db
+
+
+def test_malformed_csv_returns_400_with_partial_results(client):
+    client, db = client
+    body = 'username,real_name,email\nfrank,F,frank@example.com\n' + 'x' * 200_000 + ',X,x@example.com\n'
+    response = client.post('/api/admin/users/import?format=csv', data=body.encode('utf-8'),
+                           content_type='text/csv')
+    assert response.status_code == 400
+    payload = response.get_json()
+    assert payload['success'] is False and payload['message'].startswith('CSV 格式错误')
+    assert payload['data']['summary'] == {'created': 1, 'skipped': 0, 'error': 0}
+    assert [u['username'] for u in db.users] == ['frank']
+
+
+def test_non_utf8_body_returns_400(client):
+    client, _ = client
+    response = client.post('/api/admin/users/import?format=jsonl', data=b'{"username": "\xff"}\n')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '请求体必须是 UTF-8 编码'
@@ -0,0 +1,193 @@
+"""
+图片 / PDF 缩略图
+
+上传完成后把缩略图生成任务提交到后台线程池：图片按固定尺寸缩放，
+PDF 渲染第一页。结果按 "<sha256>_<尺寸>.<格式>" 缓存在磁盘上；
+请求缩略图时任务尚未完成则等待该任务，从未生成过则当场生成。
+
+图片处理依赖 Pillow（已列入 requirements.txt）；PDF 渲染依赖 poppler 的 pdftoppm
+命令行工具，需通过系统包管理器安装（Debian/Ubuntu: apt install poppler-utils，
+macOS: brew install poppler），启动时按 PATH 查找。二者缺少时对应类型不生成缩略图，
+可通过 /api/admin/stats 中 thumbnails.pillow / thumbnails.pdftoppm 确认。
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # 可选依赖：未安装时不生成图片缩略图
+    Image = None
+
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+PDF_EXTS = {'.pdf'}
+PDFTOPPM = shutil.which('pdftoppm')
+PDF_RENDER_TIMEOUT = 30
+
+
+class ThumbnailService:
+    def __init__(self, store, cache_dir, sizes=(128, 256, 512), fmt='webp', workers=2):
+        """
+        store: ContentStore，原始文件通过 store.path(name) 读取
+        sizes: 允许的缩略图边长，请求的尺寸向上取到其中之一，避免缓存无限增长
+        """
+        self.store = store
+        self.cache_dir = cache_dir
+        self.sizes = tuple(sorted(sizes))
+        if Image is None:
+            # 没有 Pillow 时只能生成 PDF 缩略图，直接使用 pdftoppm 输出的 PNG
+            fmt = 'png'
+        elif fmt == 'webp' and not features.check('webp'):
+            fmt = 'jpeg'
+        self.fmt = fmt
+        self.workers = workers
+        self._init_state()
+        os.makedirs(cache_dir, exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            # 线程不会被 fork 继承，子进程需要新的线程池
+            service_ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: service_ref() and service_ref()._init_state())
+
+    def _init_state(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnail')
+        self._lock = threading.Lock()
+        self._inflight = {}  # (name, size) -> Future
+        self._stats = {'generated': 0, 'failed': 0, 'served_cached': 0, 'generated_on_demand': 0}
+
+    @property
+    def ext(self):
+        return '.jpg' if self.fmt == 'jpeg' else f'.{self.fmt}'
+
+    @property
+    def mimetype(self):
+        return f'image/{self.fmt}'
+
+    def supported(self, name):
+        ext = os.path.splitext(name)[1].lower()
+        if ext in IMAGE_EXTS:
+            return Image is not None
+        if ext in PDF_EXTS:
+            return PDFTOPPM is not None
+        return False
+
+    def snap_size(self, size):
+        for allowed in self.sizes:
+            if size <= allowed:
+                return allowed
+        return self.sizes[-1]
+
+    def path(self, name, size):
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.cache_dir, name[0:2], name[2:4], f'{stem}_{size}{self.ext}')
+
+    def enqueue(self, name):
+        """上传完成后调用：为所有尺寸提交后台生成任务"""
+        if not self.supported(name):
+            return
+        for size in self.sizes:
+            self._submit(name, size)
+
+    def _submit(self, name, size):
+        key = (name, size)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._generate, name, size)
+            self._inflight[key] = future
+        # 任务可能已经完成，回调会在当前线程立即执行，因此在锁外注册
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def get(self, name, size):
+        """返回缩略图路径；不支持的类型或生成失败时返回 None"""
+        if not self.supported(name):
+            return None
+        target = self.path(name, size)
+        if os.path.exists(target):
+            with self._lock:
+                self._stats['served_cached'] += 1
+            return target
+        with self._lock:
+            on_demand = (name, size) not in self._inflight
+            if on_demand:
+                self._stats['generated_on_demand'] += 1
+        # 已在队列中则等待该任务，否则立即提交并等待
+        return self._submit(name, size).result()
+
+    def _generate(self, name, size):
+        source = self.store.path(name)
+        target = self.path(name, size)
+        if os.path.exists(target):
+            return target
+        if not os.path.exists(source):
+            return None
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_target = f'{target}.{threading.get_ident()}.tmp'
+        try:
+            if os.path.splitext(name)[1].lower() in PDF_EXTS:
+                self._render_pdf(source, tmp_target, size)
+            else:
+                self._resize_image(source, tmp_target, size)
+            os.replace(tmp_target, target)
+        except Exception as e:
+            print(f"Thumbnail error for {name} ({size}): {e}")
+            with self._lock:
+                self._stats['failed'] += 1
+            return None
+        finally:
+            if os.path.exists(tmp_target):
+                os.remove(tmp_target)
+        with self._lock:
+            self._stats['generated'] += 1
+        return target
+
+    def _resize_image(self, source, target, size):
+        with Image.open(source) as img:
+            # JPEG 解码时直接按目标尺寸降采样，避免解码完整分辨率
+            img.draft('RGB', (size, size))
+            img = ImageOps.exif_transpose(img)
+            if self.fmt == 'jpeg' or img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGB' if self.fmt == 'jpeg' else 'RGBA')
+            img.thumbnail((size, size))
+            img.save(target, format=self.fmt.upper(), quality=80)
+
+    def _render_pdf(self, source, target, size):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            prefix = os.path.join(tmp_dir, 'page')
+            subprocess.run(
+                [PDFTOPPM, '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(size), '-png', source, prefix],
+                check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT
+            )
+            rendered = prefix + '.png'
+            if Image is not None:
+                self._resize_image(rendered, target, size)
+            else:
+                shutil.move(rendered, target)
+
+    def discard(self, name):
+        """原始文件被删除时清理它的所有缩略图"""
+        for size in self.sizes:
+            try:
+                os.remove(self.path(name, size))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'format': self.fmt,
+                'sizes': list(self.sizes),
+                'pillow': Image is not None,
+                'pdftoppm': PDFTOPPM is not None,
+                'queued': len(self._inflight),
+                **self._stats,
+            }
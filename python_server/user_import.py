@@ -0,0 +1,196 @@
+"""
+批量导入用户（CSV / JSONL）
+
+请求体按行流式解析，不整体读入内存；每 batch_size 行为一批：
+批量校验用户名 / 邮箱唯一性 → 进程池并行计算密码哈希 → 单事务多行插入。
+用户名 / 邮箱的唯一键使用 _ci 排序规则，重复判断按 rbac_index.ci_key 归一化后比较，
+与数据库的判定一致（如 Alice 与 alice 视为重复）。
+"""
+import csv
+import io
+import json
+
+import pymysql
+
+from hashing import HashingBusy
+from rbac_index import ci_key
+
+DEFAULT_PASSWORD = 'DefaultPassword123!'
+
+
+def _split_role_ids(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return value
+    return [v for v in str(value).replace(',', '|').split('|') if v.strip()]
+
+
+def iter_rows(stream, fmt):
+    """
+    逐行产出 (行号, 用户 dict 或 None, 解析错误)
+    CSV 表头: username,real_name,email,password,role_ids（role_ids 用 | 分隔）
+    JSONL 每行一个对象，字段相同，role_ids 可以是数组
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for line_no, record in enumerate(reader, start=2):
+            yield line_no, record, None
+    else:
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f'JSON 解析失败: {e}'
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, '每行必须是一个 JSON 对象'
+                continue
+            yield line_no, record, None
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+def _normalize(record):
+    """返回 (user, error)"""
+    username = _text(record.get('username'))
+    real_name = _text(record.get('real_name'))
+    email = _text(record.get('email'))
+    if not all([username, real_name, email]):
+        return None, '必填字段不能为空'
+    try:
+        role_ids = sorted({int(r) for r in _split_role_ids(record.get('role_ids'))})
+    except (TypeError, ValueError):
+        return None, 'role_ids 必须是角色ID列表'
+    return {
+        'username': username,
+        'real_name': real_name,
+        'email': email,
+        'password': _text(record.get('password')) or DEFAULT_PASSWORD,
+        'role_ids': role_ids,
+    }, None
+
+
+class UserImporter:
+    def __init__(self, connection_factory, hash_passwords, valid_role_ids, batch_size=500):
+        self._connection_factory = connection_factory
+        self._hash_passwords = hash_passwords
+        self._valid_role_ids = set(valid_role_ids)
+        self.batch_size = batch_size
+        self._seen_usernames = set()
+        self._seen_emails = set()
+        self.results = []   # 每行的导入结果，按输入顺序
+        self.created = []   # (user_id, username, role_ids)
+
+    def run(self, rows):
+        """
+        rows 为 iter_rows 的输出；请求体解码或 CSV 解析失败时异常照常抛出，
+        此前已读取的行仍会导入，结果保存在 results / created 中
+        """
+        batch = []
+        try:
+            for line_no, record, error in rows:
+                if error is None:
+                    user, error = _normalize(record)
+                if error is None and not set(user['role_ids']) <= self._valid_role_ids:
+                    error = '包含不存在的角色ID'
+                if error is None:
+                    username_key, email_key = ci_key(user['username']), ci_key(user['email'])
+                    if username_key in self._seen_usernames or email_key in self._seen_emails:
+                        error = '导入文件中用户名或邮箱重复'
+                    else:
+                        self._seen_usernames.add(username_key)
+                        self._seen_emails.add(email_key)
+
+                if error is not None:
+                    self.results.append({'line': line_no, 'username': (record or {}).get('username'),
+                                         'status': 'error', 'message': error})
+                    continue
+
+                user['line'] = line_no
+                batch.append(user)
+                if len(batch) >= self.batch_size:
+                    pending, batch = batch, []
+                    self._flush(pending)
+        finally:
+            if batch:
+                self._flush(batch)
+            self.results.sort(key=lambda r: r['line'])
+        return self.results
+
+    def _flush(self, batch):
+        try:
+            with self._connection_factory() as connection, connection.cursor() as cursor:
+                batch = self._drop_existing(cursor, batch)
+            if not batch:
+                return
+
+            # 哈希计算期间不占用数据库连接
+            hashes = self._hash_passwords([u['password'] for u in batch])
+
+            with self._connection_factory() as connection, connection.cursor() as cursor:
+                cursor.executemany(
+                    "INSERT INTO Login_users (username, real_name, email, password_hash) VALUES (%s, %s, %s, %s)",
+                    [(u['username'], u['real_name'], u['email'], h) for u, h in zip(batch, hashes)]
+                )
+
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f"SELECT id, username FROM Login_users WHERE username IN ({placeholders})",
+                    [u['username'] for u in batch]
+                )
+                ids = {ci_key(r['username']): r['id'] for r in cursor.fetchall()}
+
+                role_rows = [(ids[ci_key(u['username'])], role_id) for u in batch for role_id in u['role_ids']]
+                if role_rows:
+                    cursor.executemany(
+                        "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
+                        role_rows
+                    )
+                connection.commit()
+        except pymysql.MySQLError as e:
+            print(f"User import batch error: {e}")
+            for u in batch:
+                self.results.append({'line': u['line'], 'username': u['username'],
+                                     'status': 'error', 'message': '数据库错误，该批次未导入'})
+            return
+        except HashingBusy:
+            # 与登录共用哈希排队上限，繁忙时该批次失败，可稍后重新导入
+            for u in batch:
+                self.results.append({'line': u['line'], 'username': u['username'],
+                                     'status': 'error', 'message': '服务繁忙，该批次未导入'})
+            return
+
+        for u in batch:
+            user_id = ids[ci_key(u['username'])]
+            self.created.append((user_id, u['username'], u['role_ids']))
+            self.results.append({'line': u['line'], 'username': u['username'],
+                                 'status': 'created', 'id': user_id})
+
+    def _drop_existing(self, cursor, batch):
+        """一次查询检查整批用户名 / 邮箱是否已存在，已存在的行记为跳过"""
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(
+            f"SELECT username, email FROM Login_users WHERE username IN ({placeholders}) OR email IN ({placeholders})",
+            [u['username'] for u in batch] + [u['email'] for u in batch]
+        )
+        taken_usernames = set()
+        taken_emails = set()
+        for r in cursor.fetchall():
+            taken_usernames.add(ci_key(r['username']))
+            if r['email'] is not None:
+                taken_emails.add(ci_key(r['email']))
+
+        remaining = []
+        for u in batch:
+            if ci_key(u['username']) in taken_usernames or ci_key(u['email']) in taken_emails:
+                self.results.append({'line': u['line'], 'username': u['username'],
+                                     'status': 'skipped', 'message': '用户名或邮箱已存在'})
+            else:
+                remaining.append(u)
+        return remaining
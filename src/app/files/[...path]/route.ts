@@ -3,35 +3,55 @@ import { NextRequest, NextResponse } from 'next/server';
 // 从环境变量读取后端地址，默认为 http://127.0.0.1:5000
 const TARGET_BASE_URL = (process.env.NEXT_PUBLIC_API_BASE_URL || 'http://127.0.0.1:5000') + '/files';
 
+// 需要透传给后端的请求头：条件请求（304）与断点 / 分段请求（206）
+const FORWARD_REQUEST_HEADERS = ['range', 'if-range', 'if-none-match', 'if-modified-since'];
+
+// 透传给浏览器的响应头，缓存校验相关的头必须保留，浏览器才能发起条件请求
+const FORWARD_RESPONSE_HEADERS = [
+  'content-type',
+  'content-length',
+  'content-range',
+  'content-disposition',
+  'accept-ranges',
+  'etag',
+  'last-modified',
+  'cache-control',
+  'expires',
+];
+
 async function handleProxy(req: NextRequest, { params }: { params: Promise<{ path: string[] }> }) {
   const { path } = await params;
   const pathStr = path.join('/');
   const query = req.nextUrl.search;
   const targetUrl = `${TARGET_BASE_URL}/${pathStr}${query}`;
 
+  const headers = new Headers();
+  for (const name of FORWARD_REQUEST_HEADERS) {
+    const value = req.headers.get(name);
+    if (value) headers.set(name, value);
+  }
+
   try {
     const response = await fetch(targetUrl, {
       method: req.method,
-      headers: {
-         // 对于文件请求，通常不需要传递太多头信息，但保持一致性无害
-      },
+      headers,
       cache: 'no-store'
     });
 
-    if (!response.ok) {
-       // 如果是文件未找到，返回 404
-      if (response.status === 404) {
-          return new NextResponse(null, { status: 404 });
-      }
+    // 200 / 206 / 304 以外的状态（如 404、416）直接返回状态码
+    if (!response.ok && response.status !== 304) {
       return new NextResponse(null, { status: response.status });
     }
 
-    const responseHeaders = new Headers(response.headers);
-    // 确保 Content-Type 正确传递 (如 image/png)
-    
-    const responseBody = await response.arrayBuffer();
+    const responseHeaders = new Headers();
+    for (const name of FORWARD_RESPONSE_HEADERS) {
+      const value = response.headers.get(name);
+      if (value) responseHeaders.set(name, value);
+    }
 
-    return new NextResponse(responseBody, {
+    // 直接转发响应流，不在代理中整体缓冲文件
+    const body = response.status === 304 || req.method === 'HEAD' ? null : response.body;
+    return new NextResponse(body, {
       status: response.status,
       headers: responseHeaders
     });
@@ -47,3 +67,7 @@ async function handleProxy(req: NextRequest, { params }: { params: Promise<{ pat
 export async function GET(req: NextRequest, props: { params: Promise<{ path: string[] }> }) {
   return handleProxy(req, props);
 }
+
+export async function HEAD(req: NextRequest, props: { params: Promise<{ path: string[] }> }) {
+  return handleProxy(req, props);
+}
@@ -1,7 +1,7 @@
 import { useState, useRef, useEffect, ChangeEvent } from "react";
 import { toast } from "sonner";
 import type { Base64ContentBlock } from "@langchain/core/messages";
-import { fileToContentBlock, ContentBlock } from "@/lib/multimodal-utils";
+import { filesToContentBlocks, ContentBlock } from "@/lib/multimodal-utils";
 
 export const SUPPORTED_FILE_TYPES = [
   "image/jpeg",
@@ -85,7 +85,7 @@ export function useFileUpload({
     }
 
     const newBlocks = uniqueFiles.length
-      ? await Promise.all(uniqueFiles.map(fileToContentBlock))
+      ? await filesToContentBlocks(uniqueFiles)
       : [];
     setContentBlocks((prev) => [...prev, ...newBlocks]);
     e.target.value = "";
@@ -145,7 +145,7 @@ export function useFileUpload({
       }
 
       const newBlocks = uniqueFiles.length
-        ? await Promise.all(uniqueFiles.map(fileToContentBlock))
+        ? await filesToContentBlocks(uniqueFiles)
         : [];
       setContentBlocks((prev) => [...prev, ...newBlocks]);
     };
@@ -264,7 +264,7 @@ export function useFileUpload({
       );
     }
     if (uniqueFiles.length > 0) {
-      const newBlocks = await Promise.all(uniqueFiles.map(fileToContentBlock));
+      const newBlocks = await filesToContentBlocks(uniqueFiles);
       setContentBlocks((prev) => [...prev, ...newBlocks]);
     }
   };
@@ -51,37 +51,7 @@ export async function fileToContentBlock(
     }
 
     const result = await response.json();
-    
-    // 从服务器响应中获取文件信息
-    const { file_type, filename, url, size } = result;
-
-    // 根据文件类型返回相应的内容块结构，同时包含 URL 和 Base64 数据
-    if (SUPPORTED_FILE_TYPES.includes(file.type) && file_type.startsWith("image/")) {
-      return {
-        type: "image",
-        mime_type: file_type,
-        url,       // 服务器返回的 URL
-        // data: base64Data, // 保留的 Base64 数据
-        metadata: { 
-          name: filename, // 图片名称
-          size,           // 文件大小
-        },
-      };
-    } else if (SUPPORTED_FILE_TYPES.includes(file.type )) {
-      return {
-        type: "file",
-        mime_type: file_type,
-        url,       // 服务器返回的 URL
-        // data: base64Data, // 保留的 Base64 数据
-        metadata: { 
-          filename, // PDF 文件名
-          size,     // 文件大小
-        },
-      };
-    } else {
-      // 理论上不应该到达这里，因为前面已有类型检查
-      throw new Error(`Unexpected file type after validation: ${file.type}`);
-    }
+    return uploadResultToContentBlock(file, result);
   } catch (error) {
     console.error("Error uploading file:", error);
     toast.error(`Failed to upload file: ${error}`);
@@ -91,6 +61,134 @@ export async function fileToContentBlock(
   }
 }
 
+// 服务器返回的文件信息（/upload 以及 /upload/batch 中的每一项）
+interface UploadResult {
+  file_type: string;
+  filename: string;
+  url: string;
+  size: number;
+  error?: string;
+}
+
+function uploadResultToContentBlock(file: File, result: UploadResult): MixedContentBlock {
+  // 从服务器响应中获取文件信息
+  const { file_type, filename, url, size } = result;
+
+  // 根据文件类型返回相应的内容块结构
+  if (SUPPORTED_FILE_TYPES.includes(file.type) && file_type.startsWith("image/")) {
+    return {
+      type: "image",
+      mime_type: file_type,
+      url,       // 服务器返回的 URL
+      metadata: { 
+        name: filename, // 图片名称
+        size,           // 文件大小
+      },
+    };
+  } else if (SUPPORTED_FILE_TYPES.includes(file.type )) {
+    return {
+      type: "file",
+      mime_type: file_type,
+      url,       // 服务器返回的 URL
+      metadata: { 
+        filename, // PDF 文件名
+        size,     // 文件大小
+      },
+    };
+  } else {
+    // 理论上不应该到达这里，因为前面已有类型检查
+    throw new Error(`Unexpected file type after validation: ${file.type}`);
+  }
+}
+
+// 与后端 MAX_CONTENT_LENGTH（16MB）和 upload_batch_max_files（20）保持一致，
+// 每批预留 1MB 给 multipart 边界和字段头
+const MAX_BATCH_BYTES = 15 * 1024 * 1024;
+const MAX_BATCH_FILES = 20;
+
+// 按总大小和文件数把文件分成多批，单个超过上限的文件单独成批（由 /upload 返回错误）
+function splitIntoBatches(files: File[]): File[][] {
+  const batches: File[][] = [];
+  let current: File[] = [];
+  let currentBytes = 0;
+  for (const file of files) {
+    if (
+      current.length > 0 &&
+      (current.length >= MAX_BATCH_FILES || currentBytes + file.size > MAX_BATCH_BYTES)
+    ) {
+      batches.push(current);
+      current = [];
+      currentBytes = 0;
+    }
+    current.push(file);
+    currentBytes += file.size;
+  }
+  if (current.length > 0) batches.push(current);
+  return batches;
+}
+
+// 逐个通过 /upload 上传，失败的文件已由 fileToContentBlock 提示并被跳过
+async function uploadFilesIndividually(files: File[]): Promise<MixedContentBlock[]> {
+  const results = await Promise.allSettled(files.map((file) => fileToContentBlock(file)));
+  return results.flatMap((r) => (r.status === "fulfilled" ? [r.value] : []));
+}
+
+async function uploadBatch(apiBaseUrl: string, files: File[]): Promise<MixedContentBlock[]> {
+  if (files.length === 1) return uploadFilesIndividually(files);
+
+  const formData = new FormData();
+  files.forEach((file) => formData.append("files", file));
+
+  const response = await fetch(`${apiBaseUrl}/upload/batch`, {
+    method: "POST",
+    body: formData,
+  });
+  // 请求体超过服务器上限（或代理的限制）时改为逐个上传
+  if (response.status === 413) {
+    return uploadFilesIndividually(files);
+  }
+  // 全部失败时状态码为 400，但响应体中仍有每个文件的错误信息
+  const isJson = response.headers.get("content-type")?.includes("application/json");
+  if (!isJson || (!response.ok && response.status !== 400)) {
+    throw new Error(`Server error: ${response.status}`);
+  }
+  const result: { files?: UploadResult[] } = await response.json();
+  if (!result.files) {
+    throw new Error(`Server error: ${response.status}`);
+  }
+
+  const blocks: MixedContentBlock[] = [];
+  result.files.forEach((item, i) => {
+    if (item.error) {
+      toast.error(`Failed to upload file ${files[i].name}: ${item.error}`);
+      return;
+    }
+    blocks.push(uploadResultToContentBlock(files[i], item));
+  });
+  return blocks;
+}
+
+// 多个文件按大小和数量分批通过 /upload/batch 上传，返回成功上传的内容块（顺序与输入一致）
+export async function filesToContentBlocks(
+  files: File[],
+): Promise<MixedContentBlock[]> {
+  if (files.length === 0) return [];
+  if (files.length === 1) return [await fileToContentBlock(files[0])];
+
+  const apiBaseUrl = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:5000';
+
+  try {
+    const batches = await Promise.all(
+      splitIntoBatches(files).map((batch) => uploadBatch(apiBaseUrl, batch)),
+    );
+    return batches.flat();
+  } catch (error) {
+    console.error("Error uploading files:", error);
+    toast.error(`Failed to upload files: ${error}`);
+    return Promise.reject(error);
+  }
+}
+
 // Helper to convert File to base64 string
 export async function fileToBase64(file: File): Promise<string> {
   return new Promise<string>((resolve, reject) => {